@@ -0,0 +1,391 @@
+import atexit
+import json
+import os
+import sqlite3
+import stat
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# A folder listed within this long of its last change may change again in the
+# same mtime tick, so its listing isn't trusted on the next run (as in git)
+RACY_NS = 2_000_000_000
+
+KIND_FILE, KIND_DIR, KIND_OTHER = 0, 1, 2
+
+
+# cache_enabled() once worked out (process-wide, like the settings object)
+_enabled: Optional[bool] = None
+
+
+def _may_set(key: str, env_file: str = ".env") -> bool:
+    """True if the environment or the .env file assigns 'key' (any case)."""
+    if any(name.upper() == key for name in os.environ):
+        return True
+    if not os.path.isfile(env_file):
+        return False
+    # The parser pydantic-settings reads .env with, so both agree on quoting,
+    # comments and 'export' lines
+    from dotenv import dotenv_values
+
+    return any(name.upper() == key for name in dotenv_values(env_file))
+
+
+def cache_enabled() -> bool:
+    """settings.DIR_CACHE, without loading settings when nothing could set it."""
+    # Settings only come from the environment or ./.env, and pydantic-settings
+    # is slow to import: plain scans shouldn't pay for it. A .env that only
+    # holds OPENAI_API_KEY (as the README suggests) doesn't count.
+    global _enabled
+    if _enabled is None:
+        if _may_set("DIR_CACHE"):
+            from max_cli.config import settings
+
+            _enabled = settings.DIR_CACHE
+        else:
+            _enabled = False
+    return _enabled
+
+
+def cache_dir() -> Path:
+    """settings.CACHE_DIR, else $XDG_CACHE_HOME/max, else ~/.cache/max."""
+    from max_cli.config import settings
+
+    if settings.CACHE_DIR:
+        return Path(settings.CACHE_DIR).expanduser()
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "max"
+
+
+class CachedEntry:
+    """
+    Stands in for os.DirEntry when a listing comes from the cache: same
+    name/path/is_dir/is_file/stat, with the stat rebuilt from stored fields.
+    stat() ignores follow_symlinks; the stored one follows links like
+    DirEntry.stat() does by default.
+    """
+
+    __slots__ = ("name", "path", "kind", "_fields")
+
+    def __init__(self, path: str, name: str, kind: int, fields: Tuple[int, ...]):
+        self.name = name
+        self.path = path
+        self.kind = kind
+        self._fields = fields  # (mode, ino, dev, size, mtime_ns)
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return self.kind == KIND_DIR
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return self.kind == KIND_FILE
+
+    def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+        mode, ino, dev, size, ns = self._fields
+        secs = ns // 1_000_000_000
+        t = ns / 1e9
+        # Only the mtime is stored; atime/ctime mirror it
+        return os.stat_result(
+            (mode, ino, dev, 1, 0, 0, size, secs, secs, secs),
+            {"st_atime": t, "st_mtime": t, "st_ctime": t, "st_atime_ns": ns,
+             "st_mtime_ns": ns, "st_ctime_ns": ns},
+        )
+
+
+class DirCache:
+    """
+    Persistent listing cache shared by every folder scan (SQLite, one row per
+    directory entry with its size, mtime and type).
+
+    A folder's cached listing is reused while the folder's own mtime is
+    unchanged, so an unchanged folder costs one stat() instead of a listing
+    plus a stat() per file. Adding, removing or renaming a file (including
+    the temp-file-and-rename most programs use to save) changes the folder
+    mtime; a file rewritten in place does not, and is only seen once its
+    folder changes.
+
+    Entries can carry derived facts (image header, PDF page count) that are
+    dropped whenever the file's size or mtime changes. The least recently
+    used folders are evicted once the database grows past max_bytes.
+    """
+
+    FILE_NAME = "dircache.sqlite"
+    VERSION = 1
+
+    def __init__(self, path: Path, max_bytes: Optional[int] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._used: Dict[int, int] = {}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Scans may run on worker threads; every access holds _lock
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        # Must precede table creation to take effect; lets eviction shrink the file
+        self.db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.VERSION:
+            # Unknown layout: start fresh rather than misread it
+            self.db.executescript(
+                "DROP TABLE IF EXISTS dirs; DROP TABLE IF EXISTS entries;"
+            )
+        self.db.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS dirs (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                used INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS dirs_used ON dirs (used);
+            CREATE TABLE IF NOT EXISTS entries (
+                dir_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                kind INTEGER NOT NULL,
+                mode INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                dev INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                facts TEXT,
+                PRIMARY KEY (dir_id, name)
+            ) WITHOUT ROWID;
+            PRAGMA user_version = {self.VERSION};
+            """
+        )
+
+    # --- 1. Listings ---
+    def listing(self, dir_path: str) -> List[Any]:
+        """
+        The entries of 'dir_path' (os.DirEntry-like), from the cache when
+        the folder is unchanged, else listed, stat'ed and stored.
+        Raises OSError like os.scandir would.
+        """
+        # Stored under the absolute path; entries keep the caller's spelling
+        key = os.path.abspath(dir_path)
+        dir_mtime = os.stat(dir_path).st_mtime_ns
+        with self._lock:
+            row = self.db.execute(
+                "SELECT id, mtime_ns FROM dirs WHERE path = ?", (key,)
+            ).fetchone()
+            if row and row[1] == dir_mtime:
+                self.hits += 1
+                self._used[row[0]] = int(time.time())
+                prefix = os.path.join(dir_path, "")
+                return [
+                    CachedEntry(prefix + entry[0], entry[0], entry[1], entry[2:])
+                    for entry in self.db.execute(
+                        "SELECT name, kind, mode, ino, dev, size, mtime_ns "
+                        "FROM entries WHERE dir_id = ?",
+                        (row[0],),
+                    )
+                ]
+
+        # Miss: list outside the lock (this is the slow part on a network mount)
+        self.misses += 1
+        listed_at = time.time_ns()
+        rows = []
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    st = entry.stat(follow_symlinks=False)  # Dangling link
+                if entry.is_dir(follow_symlinks=False):
+                    kind = KIND_DIR
+                elif stat.S_ISREG(st.st_mode):
+                    kind = KIND_FILE
+                else:
+                    kind = KIND_OTHER
+                fields = (st.st_mode, st.st_ino, st.st_dev, st.st_size, st.st_mtime_ns)
+                rows.append((entry.name, kind, fields))
+
+        # Changed too recently to trust: store it, but re-list next time
+        stored_mtime = dir_mtime if listed_at - dir_mtime > RACY_NS else -1
+        self._store(key, stored_mtime, rows)
+        prefix = os.path.join(dir_path, "")
+        return [
+            CachedEntry(prefix + name, name, kind, fields)
+            for name, kind, fields in rows
+        ]
+
+    def _store(self, dir_path: str, dir_mtime: int, rows: list) -> None:
+        with self._lock:
+            row = self.db.execute(
+                "SELECT id FROM dirs WHERE path = ?", (dir_path,)
+            ).fetchone()
+            kept_facts: Dict[str, Tuple[int, int, str]] = {}
+            if row:
+                dir_id = row[0]
+                # Facts survive a re-list if their file didn't change
+                for name, size, mtime_ns, facts in self.db.execute(
+                    "SELECT name, size, mtime_ns, facts FROM entries "
+                    "WHERE dir_id = ? AND facts IS NOT NULL",
+                    (dir_id,),
+                ):
+                    kept_facts[name] = (size, mtime_ns, facts)
+                self.db.execute("DELETE FROM entries WHERE dir_id = ?", (dir_id,))
+                self.db.execute(
+                    "UPDATE dirs SET mtime_ns = ?, used = ? WHERE id = ?",
+                    (dir_mtime, int(time.time()), dir_id),
+                )
+            else:
+                dir_id = self.db.execute(
+                    "INSERT INTO dirs (path, mtime_ns, used) VALUES (?, ?, ?)",
+                    (dir_path, dir_mtime, int(time.time())),
+                ).lastrowid
+
+            def values():
+                for name, kind, fields in rows:
+                    old = kept_facts.get(name)
+                    facts = old[2] if old and old[:2] == fields[3:] else None
+                    yield (dir_id, name, kind, *fields, facts)
+
+            self.db.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", values()
+            )
+            # Per folder, so other max processes aren't locked out for long
+            self.db.commit()
+
+    # --- 2. Derived facts ---
+    def get_fact(self, path: str, key: str) -> Any:
+        """
+        A fact stored for a listed file, or None. Trusted on the same terms
+        as the listing it belongs to.
+        """
+        dir_path, name = os.path.split(os.path.abspath(path))
+        with self._lock:
+            row = self.db.execute(
+                "SELECT entries.facts FROM entries JOIN dirs ON dirs.id = dir_id "
+                "WHERE dirs.path = ? AND name = ?",
+                (dir_path, name),
+            ).fetchone()
+        if not row or not row[0]:
+            return None
+        return json.loads(row[0]).get(key)
+
+    def put_fact(self, path: str, key: str, value: Any) -> None:
+        """Records a fact for a file; ignored if its folder isn't cached."""
+        dir_path, name = os.path.split(os.path.abspath(path))
+        with self._lock:
+            row = self.db.execute(
+                "SELECT dir_id, facts FROM entries JOIN dirs ON dirs.id = dir_id "
+                "WHERE dirs.path = ? AND name = ?",
+                (dir_path, name),
+            ).fetchone()
+            if not row:
+                return
+            facts = json.loads(row[1]) if row[1] else {}
+            facts[key] = value
+            self.db.execute(
+                "UPDATE entries SET facts = ? WHERE dir_id = ? AND name = ?",
+                (json.dumps(facts), row[0], name),
+            )
+            self.db.commit()
+
+    # --- 3. Housekeeping ---
+    def _used_bytes(self) -> int:
+        pages, free, page_size = (
+            self.db.execute(f"PRAGMA {pragma}").fetchone()[0]
+            for pragma in ("page_count", "freelist_count", "page_size")
+        )
+        return (pages - free) * page_size
+
+    def evict(self, max_bytes: int) -> int:
+        """Drops least recently used folders until under max_bytes."""
+        evicted = 0
+        with self._lock:
+            while self._used_bytes() > max_bytes:
+                # A tenth of the folders per round keeps the size checks few
+                count = self.db.execute("SELECT COUNT(*) FROM dirs").fetchone()[0]
+                if not count:
+                    break
+                oldest = [
+                    dir_id
+                    for (dir_id,) in self.db.execute(
+                        "SELECT id FROM dirs ORDER BY used LIMIT ?",
+                        (max(1, count // 10),),
+                    )
+                ]
+                marks = ",".join("?" * len(oldest))
+                self.db.execute(
+                    f"DELETE FROM entries WHERE dir_id IN ({marks})", oldest
+                )
+                self.db.execute(f"DELETE FROM dirs WHERE id IN ({marks})", oldest)
+                evicted += len(oldest)
+            self.db.commit()
+            if evicted:
+                self.db.execute("PRAGMA incremental_vacuum")
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            dirs, oldest = self.db.execute(
+                "SELECT COUNT(*), MIN(used) FROM dirs"
+            ).fetchone()
+            entries, facts = self.db.execute(
+                "SELECT COUNT(*), COUNT(facts) FROM entries"
+            ).fetchone()
+        size = sum(
+            os.path.getsize(p)
+            for p in (self.path, Path(f"{self.path}-wal"))
+            if os.path.exists(p)
+        )
+        return {
+            "path": str(self.path),
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "dirs": dirs,
+            "entries": entries,
+            "facts": facts,
+            "oldest_use": oldest,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self.db.executescript("DELETE FROM entries; DELETE FROM dirs;")
+            self.db.commit()
+            self.db.execute("VACUUM")
+
+    def close(self) -> None:
+        """Saves last-use times, applies the size cap, and closes."""
+        with self._lock:
+            self.db.executemany(
+                "UPDATE dirs SET used = ? WHERE id = ?",
+                ((used, dir_id) for dir_id, used in self._used.items()),
+            )
+            self._used.clear()
+            self.db.commit()
+        if self.max_bytes:
+            self.evict(self.max_bytes)
+        self.db.close()
+
+    def __enter__(self) -> "DirCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+_shared: Optional[DirCache] = None
+
+
+def shared_dir_cache() -> Optional[DirCache]:
+    """
+    The process-wide cache when settings.DIR_CACHE is on, else None.
+    Opened on first use and closed (with the size cap applied) at exit.
+    """
+    global _shared
+    if _shared is None:
+        if not cache_enabled():
+            return None  # Memoized: later calls don't re-check the settings
+        from max_cli.config import settings
+
+        _shared = DirCache(
+            cache_dir() / DirCache.FILE_NAME, settings.CACHE_MAX_MB * 1024 * 1024
+        )
+        atexit.register(_shared.close)
+    return _shared
@@ -14,3 +14,9 @@ class ValidationError(MaxError):
     """Raised when input arguments are invalid."""
 
     pass
+
+
+class ImageTooLargeError(ValidationError):
+    """Raised when an image exceeds the configured pixel limit."""
+
+    pass
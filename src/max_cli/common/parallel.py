@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from max_cli.common.exceptions import ValidationError
+
+# (index in the task list, result or None, exception or None)
+TaskOutcome = Tuple[int, Any, Optional[BaseException]]
+
+
+def resolve_workers(value: Optional[str]) -> int:
+    """
+    Turns a '--workers' value into a process count.
+    Accepts a positive integer or 'auto' (one worker per CPU core).
+    """
+    if value is None:
+        return 1
+
+    value = str(value).strip().lower()
+    if value == "auto":
+        return os.cpu_count() or 1
+
+    if not value.isdigit() or int(value) < 1:
+        raise ValidationError(
+            f"Invalid worker count '{value}'. Use a positive number or 'auto'."
+        )
+    return int(value)
+
+
+def run_tasks(
+    func: Callable[..., Any],
+    tasks: Iterable[Dict[str, Any]],
+    workers: int = 1,
+    executor_cls: Callable[..., Executor] = ProcessPoolExecutor,
+    max_pending: Optional[int] = None,
+    cost: Optional[Callable[[Dict[str, Any]], int]] = None,
+    budget: Optional[int] = None,
+) -> Iterator[TaskOutcome]:
+    """
+    Runs func(**task) for every task and yields (index, result, error) tuples
+    as soon as each one finishes. 'tasks' may be a lazy iterator; it is only
+    pulled as fast as the workers can keep up.
+
+    With a single worker everything runs inline, in order, with no pool overhead.
+    Otherwise tasks go to a pool and are yielded in completion order; callers use
+    the index to put results back in input order.
+    A failing task never stops the batch: its exception is yielded instead.
+
+    With 'cost' and 'budget', a task is only admitted while the summed cost of
+    the tasks in flight stays within the budget. A task costing more than the
+    whole budget still runs, but alone.
+    """
+    if workers <= 1:
+        for index, kwargs in enumerate(tasks):
+            try:
+                yield index, func(**kwargs), None
+            except Exception as e:
+                yield index, None, e
+        return
+
+    # Keep a bounded window of submitted work so huge folders don't queue
+    # tens of thousands of futures (and their arguments) up front.
+    # Under a budget, submitted == running, so queued work can't hog it.
+    if budget is not None and cost is not None:
+        max_pending = workers
+    else:
+        budget = None
+    max_pending = max_pending or workers * 4
+    task_iter = iter(enumerate(tasks))
+
+    with executor_cls(max_workers=workers) as pool:
+        pending: Dict[Any, Tuple[int, int]] = {}
+        in_flight = 0
+        # The next task, pulled from the iterator but waiting for room
+        held: Optional[Tuple[int, Dict[str, Any], int]] = None
+
+        def submit_next() -> bool:
+            nonlocal held, in_flight
+            if held is None:
+                try:
+                    index, kwargs = next(task_iter)
+                except StopIteration:
+                    return False
+                held = (index, kwargs, cost(kwargs) if budget is not None else 0)
+
+            index, kwargs, task_cost = held
+            if budget is not None and pending and in_flight + task_cost > budget:
+                return False  # Wait until running tasks free some room
+
+            pending[pool.submit(func, **kwargs)] = (index, task_cost)
+            in_flight += task_cost
+            held = None
+            return True
+
+        def fill() -> None:
+            while len(pending) < max_pending and submit_next():
+                pass
+
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, task_cost = pending.pop(future)
+                in_flight -= task_cost
+                error = future.exception()
+                yield index, (None if error else future.result()), error
+            fill()
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from typing import Any, Callable, Iterable, Iterator, List, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class PipelineStats:
+    """Where a pipelined run spent time waiting (seconds)."""
+
+    def __init__(self) -> None:
+        self.read_stall_s = 0.0  # CPU stage waited for the prefetcher
+        self.write_stall_s = 0.0  # CPU stage waited for room in the write queue
+        self.writer_busy_s = 0.0  # Time the writer spent actually writing
+
+    def as_dict(self) -> dict:
+        return {k: round(v, 6) for k, v in vars(self).items()}
+
+
+def prefetch(
+    items: Iterable[T],
+    read: Callable[[T], R],
+    depth: int = 8,
+    threads: int = 4,
+    stats: PipelineStats = None,
+) -> Iterator[R]:
+    """
+    Runs read(item) on a small thread pool, up to 'depth' items ahead of the
+    consumer, and yields the results in input order. While the consumer is
+    busy with one file, the next ones are already coming off the disk.
+    """
+    stats = stats or PipelineStats()
+    item_iter = iter(items)
+    window: deque = deque()
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="max-read") as pool:
+
+        def top_up() -> None:
+            while len(window) < depth:
+                try:
+                    window.append(pool.submit(read, next(item_iter)))
+                except StopIteration:
+                    return
+
+        top_up()
+        while window:
+            future = window.popleft()
+            start = time.perf_counter()
+            result = future.result()
+            stats.read_stall_s += time.perf_counter() - start
+            top_up()
+            yield result
+
+
+class AsyncWriter:
+    """
+    Background writer fed by a bounded queue. The CPU stage hands off
+    finished outputs and moves on; it only blocks when 'depth' writes are
+    already waiting. Failed writes are collected as (key, exception).
+    """
+
+    def __init__(self, depth: int = 8, stats: PipelineStats = None) -> None:
+        self.stats = stats or PipelineStats()
+        self.errors: List[Tuple[Any, BaseException]] = []
+        self._queue: Queue = Queue(maxsize=depth)
+        self._thread = threading.Thread(
+            target=self._run, name="max-write", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, key: Any, func: Callable[..., Any], *args: Any) -> None:
+        start = time.perf_counter()
+        self._queue.put((key, func, args))
+        self.stats.write_stall_s += time.perf_counter() - start
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            key, func, args = job
+            start = time.perf_counter()
+            try:
+                func(*args)
+            except Exception as e:
+                self.errors.append((key, e))
+            self.stats.writer_busy_s += time.perf_counter() - start
+
+    def close(self) -> None:
+        """Waits for every queued write to finish."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self) -> "AsyncWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
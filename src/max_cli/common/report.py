@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional
+
+from max_cli.common.utils import percentile
+
+
+class RunReport:
+    """
+    Streams one JSON record per processed file (NDJSON) and keeps running
+    totals for a final summary record. Each line is flushed as soon as it is
+    written, so dashboards can tail the file while a batch is running.
+    add() is thread-safe, so a background writer may record files too.
+    """
+
+    def __init__(self, stream: Optional[IO[str]] = None, path: Optional[Path] = None):
+        self._owns_stream = stream is None and path is not None
+        self.stream = open(path, "w", encoding="utf-8") if self._owns_stream else stream
+        self.started = time.perf_counter()
+        self.files = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latencies: List[float] = []
+        self.stage_samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        if self.stream is not None:
+            self.stream.write(json.dumps(record) + "\n")
+            self.stream.flush()
+
+    def add(
+        self, file: str, stats: Optional[Dict[str, Any]], error: Any = None
+    ) -> None:
+        """Records one file. Pass the engine's stats dict, or an error."""
+        with self._lock:
+            self._add(file, stats, error)
+
+    def _add(self, file: str, stats: Optional[Dict[str, Any]], error: Any) -> None:
+        if error is not None or stats is None:
+            self.failed += 1
+            self._write({"type": "file", "file": file, "error": str(error)})
+            return
+
+        self.files += 1
+        timings = stats.get("timings", {})
+        total = sum(timings.values())
+        self.bytes_in += stats.get("bytes_in", 0)
+        self.bytes_out += stats.get("bytes_out", 0)
+        self.latencies.append(total)
+        for stage, seconds in timings.items():
+            self.stage_samples.setdefault(stage, []).append(seconds)
+
+        record = {"type": "file", "file": file, "total_s": round(total, 6)}
+        # Keep the numeric fields; the preformatted strings are for humans
+        record.update(
+            {k: v for k, v in stats.items() if k not in ("original_size", "final_size")}
+        )
+        self._write(record)
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals plus latency percentiles, overall and per stage (seconds)."""
+
+        def spread(samples: List[float]) -> Dict[str, float]:
+            if not samples:
+                return {}
+            return {
+                "total": round(sum(samples), 6),
+                "p50": round(percentile(samples, 50), 6),
+                "p95": round(percentile(samples, 95), 6),
+                "max": round(max(samples), 6),
+            }
+
+        saved = self.bytes_in - self.bytes_out
+        return {
+            "type": "summary",
+            "files": self.files,
+            "failed": self.failed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "reduction_pct": (
+                round(saved / self.bytes_in * 100, 1) if self.bytes_in else 0.0
+            ),
+            "wall_s": round(time.perf_counter() - self.started, 6),
+            "latency_s": spread(self.latencies),
+            "stages_s": {
+                stage: spread(samples)
+                for stage, samples in sorted(self.stage_samples.items())
+            },
+        }
+
+    def close(self, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Writes the summary record (plus any 'extra' fields) and returns it."""
+        summary = self.summary()
+        summary.update(extra or {})
+        self._write(summary)
+        if self._owns_stream and self.stream is not None:
+            self.stream.close()
+        return summary
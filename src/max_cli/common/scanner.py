@@ -0,0 +1,97 @@
+import os
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Collection, Iterator, Optional, Sequence
+
+from max_cli.common.exceptions import ResourceNotFoundError
+from max_cli.common.utils import natural_sort_key
+
+if TYPE_CHECKING:
+    from max_cli.common.dir_cache import DirCache
+
+
+def _matches(patterns: Sequence[str], name: str, rel_path: str) -> bool:
+    """A glob matches either the bare name ('*.png') or the relative path."""
+    return any(fnmatch(name, p) or fnmatch(rel_path, p) for p in patterns)
+
+
+def _list_dir(dir_path: str, cache: Optional["DirCache"]) -> Iterator:
+    if cache is not None:
+        yield from cache.listing(dir_path)
+        return
+    with os.scandir(dir_path) as it:
+        yield from it
+
+
+def scan_files(
+    root: Path,
+    recursive: bool = False,
+    extensions: Optional[Collection[str]] = None,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    max_depth: Optional[int] = None,
+    sort_key: Optional[Callable[[str], object]] = natural_sort_key,
+    cache: Optional["DirCache"] = None,
+) -> Iterator[os.DirEntry]:
+    """
+    Lazily yields the files under 'root' as os.DirEntry objects.
+
+    Built on os.scandir, so file/dir checks come from the directory listing
+    itself instead of one stat() call per entry. Entries are yielded while
+    the tree is still being walked; each directory is sorted on its own
+    (by 'sort_key' on the name) so the order is stable between runs.
+
+    - extensions: lowercase suffixes to keep, e.g. {".jpg", ".png"}.
+    - include / exclude: glob patterns matched against the name or the path
+      relative to root. Excluded directories are not descended into.
+    - max_depth: how many folder levels below root to enter (recursive only).
+    - cache: a DirCache to read listings through; unchanged folders are
+      then served without being listed (entries are CachedEntry objects).
+    """
+    if not root.is_dir():
+        raise ResourceNotFoundError(f"Folder '{root}' not found.")
+
+    if not recursive:
+        max_depth = 0
+
+    # Depth-first, with an explicit stack so deep trees can't hit the
+    # recursion limit. Each item is (directory path, relative prefix, depth).
+    stack = [(str(root), "", 0)]
+
+    while stack:
+        dir_path, prefix, depth = stack.pop()
+        try:
+            entries = _list_dir(dir_path, cache)
+            if sort_key:
+                entries = sorted(entries, key=lambda e: sort_key(e.name))
+
+            subdirs = []
+            for entry in entries:
+                rel_path = prefix + entry.name
+
+                if entry.is_dir(follow_symlinks=False):
+                    if (max_depth is None or depth < max_depth) and not (
+                        exclude and _matches(exclude, entry.name, rel_path)
+                    ):
+                        subdirs.append((entry.path, rel_path + "/", depth + 1))
+                    continue
+
+                if not entry.is_file():
+                    continue
+                if extensions is not None:
+                    if os.path.splitext(entry.name)[1].lower() not in extensions:
+                        continue
+                if include and not _matches(include, entry.name, rel_path):
+                    continue
+                if exclude and _matches(exclude, entry.name, rel_path):
+                    continue
+
+                yield entry
+        except PermissionError:
+            if not prefix:
+                raise
+            # Unreadable sub-folders are skipped rather than aborting the scan
+            continue
+
+        # Reverse so the stack pops sub-folders in sorted order
+        stack.extend(reversed(subdirs))
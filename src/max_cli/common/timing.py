@@ -0,0 +1,45 @@
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+try:
+    import resource  # Unix only
+except ImportError:  # pragma: no cover - Windows
+    resource = None  # type: ignore
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class StageTimer:
+    """
+    Accumulates wall-clock time per named stage.
+
+        timer = StageTimer()
+        with timer.stage("decode"):
+            img.load()
+        timer.timings  # {"decode": 0.0123}
+    """
+
+    def __init__(self) -> None:
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    def rounded(self, digits: int = 6) -> Dict[str, float]:
+        """Timings rounded for reports (seconds)."""
+        return {name: round(value, digits) for name, value in self.timings.items()}
@@ -1,4 +1,11 @@
+import math
+import os
 import re
+import shutil
+from pathlib import Path
+from typing import List
+
+from max_cli.common.exceptions import ValidationError
 
 
 def natural_sort_key(s: str):
@@ -10,3 +17,83 @@ def natural_sort_key(s: str):
         int(text) if text.isdigit() else text.lower()
         for text in re.split("([0-9]+)", s)
     ]
+
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile (no numpy needed)."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+_SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(text: str) -> int:
+    """
+    Parses human sizes like '200KB', '1.5M', '2G' or '4096' into bytes.
+    Units are binary (1 KB = 1024 bytes).
+    """
+    match = re.fullmatch(r"\s*([0-9]*\.?[0-9]+)\s*([KMGT]?)(?:I?B)?\s*", text.upper())
+    if not match or float(match.group(1)) <= 0:
+        raise ValidationError(f"Invalid size '{text}'. Use e.g. 200KB, 1.5MB or 2G.")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+def temp_sibling(path: Path) -> Path:
+    """Hidden temp name in the same folder (so os.replace stays atomic)."""
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """
+    Writes 'data' to a temp file next to 'path', then renames it into place.
+    Readers (and interrupted runs) never see a half-written file.
+    """
+    tmp_path = temp_sibling(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Includes Ctrl+C: don't leave the temp file behind
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def copy_file_fast(src: Path, dst: Path) -> str:
+    """
+    Copies file contents inside the kernel where possible: copy_file_range
+    (which can also clone on filesystems that support it), then sendfile,
+    then a plain buffered copy. Returns the method that did the work.
+    'dst' is created or truncated; metadata is left to the caller.
+    """
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+        for method in ("copy_file_range", "sendfile"):
+            func = getattr(os, method, None)
+            if func is None:
+                continue
+            copied = 0
+            try:
+                while copied < size:
+                    if method == "copy_file_range":
+                        sent = func(in_fd, out_fd, size - copied)
+                    else:
+                        sent = func(out_fd, in_fd, copied, size - copied)
+                    if sent == 0:
+                        break  # Source shrank while copying
+                    copied += sent
+            except OSError:
+                if copied:
+                    raise  # Failed mid-way: don't mix methods in one file
+                continue  # Not supported here (e.g. cross-fs on old kernels)
+            if size and not copied:
+                # Some filesystems (procfs, some FUSE) report success but
+                # copy nothing: nothing was written, so try the next method
+                continue
+            return method
+        shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+        return "read/write"
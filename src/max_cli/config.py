@@ -8,6 +8,10 @@ class Settings(BaseSettings):
     # This will load from OS Environment or .env file
     OPENAI_API_KEY: Optional[str] = None
     AI_MODEL: str = "gpt-5-nano"
+    # Opt-in folder listing cache shared by all commands (see 'max cache')
+    DIR_CACHE: bool = False
+    CACHE_DIR: Optional[str] = None  # Default: ~/.cache/max
+    CACHE_MAX_MB: int = 256
 
     class Config:
         env_file = ".env"
@@ -1,7 +1,6 @@
 import json
 import typer
 from typing import Dict, Any 
-from openai import OpenAI
 from max_cli.config import settings
 from max_cli.common.exceptions import MaxError
 
@@ -12,6 +11,9 @@ class AIEngine:
             # We don't raise an error immediately, only if they try to use it
             self.client = None
         else:
+            # The SDK is slow to import; only load it when there's a key to use
+            from openai import OpenAI
+
             self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
     def _extract_command_info(self, name: str, command_info: Any) -> dict:
@@ -0,0 +1,286 @@
+import io
+import json
+import platform
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import fitz  # PyMuPDF
+import PIL
+from PIL import Image, ImageDraw
+
+from max_cli.common.timing import peak_rss_mb
+from max_cli.common.utils import percentile
+from max_cli.core.image_processor import ImageEngine
+from max_cli.core.pdf_engine import PDFEngine
+
+
+def _run_case(
+    kind: str, params: Dict[str, Any], inputs: List[str], out_dir: str, repeat: int
+) -> Dict[str, Any]:
+    """
+    Times one benchmark case. Runs inside a fresh child process so the
+    peak-RSS reading belongs to this case alone.
+    """
+    image_engine = ImageEngine()
+    pdf_engine = PDFEngine()
+    out = Path(out_dir)
+    samples = []
+    units = 0.0
+
+    for _ in range(repeat):
+        units = 0.0
+        start = time.perf_counter()
+
+        if kind == "image":
+            for src in map(Path, inputs):
+                with Image.open(src) as img:
+                    units += img.size[0] * img.size[1] / 1_000_000
+                suffix = ".jpg" if params.get("force_jpeg") else src.suffix
+                target = out / (src.stem + suffix)
+                image_engine.process_single_image(src, target, **params)
+
+        elif kind == "pdf_compress":
+            for src in map(Path, inputs):
+                units += pdf_engine.compress_pdf(src, out / src.name, **params)
+
+        elif kind == "pdf_merge":
+            paths = [Path(p) for p in inputs]
+            pdf_engine.merge_pdfs(paths, out / "merged.pdf")
+            for p in paths:
+                with fitz.open(p) as doc:
+                    units += len(doc)
+
+        samples.append(time.perf_counter() - start)
+
+    return {"samples": samples, "units": units, "peak_rss_mb": peak_rss_mb()}
+
+
+class BenchmarkRunner:
+    """
+    Reproducible speed checks for ImageEngine and PDFEngine.
+    Builds a synthetic corpus offline, times each case over a parameter grid
+    and stores the results as JSON so two runs can be compared.
+    """
+
+    SEED = 1234
+    # name -> (width, height)
+    IMAGE_SIZES = {
+        "small": (640, 480),
+        "medium": (1920, 1080),
+        "large": (4000, 3000),
+    }
+    IMAGE_GRID = {
+        "q85": {"quality": 85},
+        "q75_max1600": {"quality": 75, "max_dim": 1600},
+        "jpeg_half": {"quality": 80, "force_jpeg": True, "scale": 50},
+    }
+    PDF_GRID = {
+        "dpi100": {"dpi": 100, "quality": 70},
+        "dpi150": {"dpi": 150, "quality": 80},
+        "dpi150_w2": {"dpi": 150, "quality": 80, "workers": 2},
+        "smart150": {"dpi": 150, "quality": 80, "mode": "smart"},
+    }
+    PDF_PAGES = 12
+
+    # --- Corpus generation ---
+
+    def _photo(self, rng: random.Random, size) -> Image.Image:
+        """Smooth fractal detail plus seeded sensor-like noise."""
+        w, h = size
+        base = Image.effect_mandelbrot((w, h), (-2.0, -1.2, 0.8, 1.2), 64)
+        mirrored = base.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+        colored = Image.merge("RGB", (base, base.rotate(180), mirrored))
+        noise = Image.frombytes("RGB", (w, h), rng.randbytes(w * h * 3))
+        return Image.blend(colored, noise, 0.12)
+
+    def _screenshot(self, rng: random.Random, size) -> Image.Image:
+        """Flat UI blocks and text: the PNG-friendly case."""
+        img = Image.new("RGB", size, (245, 245, 245))
+        draw = ImageDraw.Draw(img)
+        w, h = size
+        for _ in range(40):
+            x0, y0 = rng.randrange(w), rng.randrange(h)
+            x1, y1 = x0 + rng.randrange(20, w // 3), y0 + rng.randrange(10, h // 6)
+            color = tuple(rng.randrange(256) for _ in range(3))
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+        for line in range(0, h, 18):
+            draw.text((10, line), f"Line {line} lorem ipsum {rng.random():.6f}", fill=0)
+        return img
+
+    def _alpha(self, rng: random.Random, size) -> Image.Image:
+        """RGBA artwork with a soft alpha gradient."""
+        img = self._screenshot(rng, size).convert("RGBA")
+        alpha = Image.linear_gradient("L").resize(size)
+        img.putalpha(alpha)
+        return img
+
+    def _text_pdf(self, rng: random.Random, path: Path) -> None:
+        doc = fitz.open()
+        for page_no in range(self.PDF_PAGES):
+            page = doc.new_page()
+            words = " ".join(f"word{rng.randrange(10_000)}" for _ in range(400))
+            page.insert_textbox(page.rect + (40, 40, -40, -40), f"{page_no}: {words}")
+        doc.save(path, garbage=4, deflate=True, no_new_id=True)
+        doc.close()
+
+    def _scanned_pdf(self, rng: random.Random, path: Path) -> None:
+        doc = fitz.open()
+        for _ in range(self.PDF_PAGES):
+            page = doc.new_page()
+            scan = self._screenshot(rng, (1275, 1650)).convert("L")
+            buffer = io.BytesIO()
+            scan.save(buffer, "JPEG", quality=90)
+            page.insert_image(page.rect, stream=buffer.getvalue())
+        doc.save(path, no_new_id=True)
+        doc.close()
+
+    def build_corpus(self, corpus_dir: Path, sizes: Optional[List[str]] = None) -> Path:
+        """
+        Writes the synthetic corpus. Same seed, same bytes: nothing is
+        downloaded and the files are identical between machines.
+        """
+        corpus_dir.mkdir(parents=True, exist_ok=True)
+        rng = random.Random(self.SEED)
+
+        kinds: Dict[str, Callable[..., Image.Image]] = {
+            "photo": self._photo,
+            "screenshot": self._screenshot,
+            "alpha": self._alpha,
+        }
+        for size_name in sizes or list(self.IMAGE_SIZES):
+            size = self.IMAGE_SIZES[size_name]
+            for kind, factory in kinds.items():
+                img = factory(rng, size)
+                suffix = ".jpg" if kind == "photo" else ".png"
+                img.save(corpus_dir / f"{kind}_{size_name}{suffix}")
+
+        self._text_pdf(rng, corpus_dir / "text.pdf")
+        self._scanned_pdf(rng, corpus_dir / "scanned.pdf")
+        return corpus_dir
+
+    # --- Running ---
+
+    def list_cases(self, corpus_dir: Path) -> Dict[str, Dict[str, Any]]:
+        """Expands the parameter grids into named cases over the corpus."""
+        cases: Dict[str, Dict[str, Any]] = {}
+
+        for image_path in sorted(corpus_dir.glob("*.*")):
+            if image_path.suffix.lower() not in ImageEngine.SUPPORTED_EXTENSIONS:
+                continue
+            for grid_name, params in self.IMAGE_GRID.items():
+                cases[f"image/{image_path.stem}/{grid_name}"] = {
+                    "kind": "image",
+                    "params": params,
+                    "inputs": [str(image_path)],
+                    "unit": "MP/s",
+                }
+
+        pdfs = sorted(corpus_dir.glob("*.pdf"))
+        for pdf_path in pdfs:
+            for grid_name, params in self.PDF_GRID.items():
+                cases[f"pdf_compress/{pdf_path.stem}/{grid_name}"] = {
+                    "kind": "pdf_compress",
+                    "params": params,
+                    "inputs": [str(pdf_path)],
+                    "unit": "pages/s",
+                }
+        if pdfs:
+            cases["pdf_merge/all"] = {
+                "kind": "pdf_merge",
+                "params": {},
+                "inputs": [str(p) for p in pdfs],
+                "unit": "pages/s",
+            }
+        return cases
+
+    def run(
+        self,
+        corpus_dir: Path,
+        out_dir: Path,
+        repeat: int = 5,
+        only: Optional[str] = None,
+        on_case: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Times every case (or those whose name contains 'only').
+        Each case gets its own child process for a clean peak-RSS reading.
+        """
+        out_dir.mkdir(parents=True, exist_ok=True)
+        results: Dict[str, Any] = {}
+
+        for name, case in self.list_cases(corpus_dir).items():
+            if only and only not in name:
+                continue
+
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                raw = pool.submit(
+                    _run_case,
+                    case["kind"],
+                    case["params"],
+                    case["inputs"],
+                    str(out_dir),
+                    repeat,
+                ).result()
+
+            samples = raw["samples"]
+            p50 = percentile(samples, 50)
+            results[name] = {
+                "p50_ms": round(p50 * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "throughput": round(raw["units"] / p50, 2) if p50 else 0.0,
+                "unit": case["unit"],
+                "peak_rss_mb": raw["peak_rss_mb"],
+                "repeat": repeat,
+            }
+            if on_case:
+                on_case(name, results[name])
+
+        return {
+            "meta": {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "pillow": PIL.__version__,
+                "pymupdf": fitz.VersionBind,
+            },
+            "cases": results,
+        }
+
+    # --- Comparing ---
+
+    @staticmethod
+    def save(report: Dict[str, Any], path: Path) -> None:
+        path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    @staticmethod
+    def load(path: Path) -> Dict[str, Any]:
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    @staticmethod
+    def compare(
+        baseline: Dict[str, Any], current: Dict[str, Any], threshold_pct: float = 10.0
+    ) -> List[Dict[str, Any]]:
+        """
+        Compares p50 latency case by case.
+        Returns one row per shared case; 'regressed' is set when the current
+        run is slower than the baseline by more than threshold_pct.
+        """
+        rows = []
+        for name, new in current.get("cases", {}).items():
+            old = baseline.get("cases", {}).get(name)
+            if not old or not old["p50_ms"]:
+                continue
+            change_pct = (new["p50_ms"] / old["p50_ms"] - 1) * 100
+            rows.append(
+                {
+                    "case": name,
+                    "baseline_ms": old["p50_ms"],
+                    "current_ms": new["p50_ms"],
+                    "change_pct": round(change_pct, 1),
+                    "regressed": change_pct > threshold_pct,
+                }
+            )
+        return rows
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from max_cli.common.utils import atomic_write_bytes
+
+# Bytes read from each end of a file for the cheap first-pass hash
+PARTIAL_BYTES = 16 * 1024
+# mmap window for full hashes: bounds address space use on huge files
+FULL_CHUNK = 64 * 1024 * 1024
+
+
+def _digest() -> "hashlib._Hash":
+    # BLAKE2b releases the GIL on large updates, so hashing threads scale
+    return hashlib.blake2b(digest_size=16)
+
+
+def partial_hash(path: str, size: int) -> str:
+    """
+    Hash of the first and last PARTIAL_BYTES of a file. Files no larger
+    than both ends together are hashed whole, so this is their full hash.
+    """
+    digest = _digest()
+    with open(path, "rb", buffering=0) as f:
+        if size <= 2 * PARTIAL_BYTES:
+            digest.update(f.read())
+        else:
+            digest.update(os.pread(f.fileno(), PARTIAL_BYTES, 0))
+            digest.update(os.pread(f.fileno(), PARTIAL_BYTES, size - PARTIAL_BYTES))
+    return digest.hexdigest()
+
+
+def full_hash(path: str) -> str:
+    """Hash of the whole file, read through mmap in FULL_CHUNK windows."""
+    digest = _digest()
+    with open(path, "rb", buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset < size:
+            length = min(FULL_CHUNK, size - offset)
+            try:
+                with mmap.mmap(
+                    f.fileno(), length, access=mmap.ACCESS_READ, offset=offset
+                ) as view:
+                    if hasattr(view, "madvise"):
+                        view.madvise(mmap.MADV_SEQUENTIAL)
+                    digest.update(view)
+            except (OSError, ValueError):
+                # Not mappable (some network/FUSE mounts): plain reads
+                f.seek(offset)
+                digest.update(f.read(length))
+            offset += length
+    return digest.hexdigest()
+
+
+class FileHashCache:
+    """
+    Persistent cache of content hashes, keyed by device + inode. An entry
+    is reused while the inode's size and mtime are unchanged, so a re-run
+    over an unchanged tree reads no file contents at all (and renamed or
+    moved files keep their hashes).
+    """
+
+    FILE_NAME = ".max_fhash.json"
+    VERSION = 1
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> "FileHashCache":
+        """Reads the cache from disk. Missing or corrupt means 'start fresh'."""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return self
+        if data.get("version") == self.VERSION:
+            self.entries = data.get("entries", {})
+        return self
+
+    def save(self, live_keys: Optional[set] = None) -> None:
+        """Writes the cache, keeping only 'live_keys' if given."""
+        if live_keys is not None:
+            self.entries = {k: v for k, v in self.entries.items() if k in live_keys}
+        payload = {"version": self.VERSION, "entries": self.entries}
+        atomic_write_bytes(self.path, json.dumps(payload).encode("utf-8"))
+
+    @staticmethod
+    def key(st_dev: int, st_ino: int) -> str:
+        return f"{st_dev}:{st_ino}"
+
+    def lookup(self, key: str, size: int, mtime_ns: int, kind: str) -> Optional[str]:
+        """The cached 'partial' or 'full' hash if the file is unchanged."""
+        entry = self.entries.get(key)
+        if (
+            entry
+            and entry["size"] == size
+            and entry["mtime_ns"] == mtime_ns
+            and kind in entry
+        ):
+            self.hits += 1
+            return entry[kind]
+        self.misses += 1
+        return None
+
+    def update(self, key: str, size: int, mtime_ns: int, kind: str, value: str) -> None:
+        entry = self.entries.get(key)
+        if not entry or entry["size"] != size or entry["mtime_ns"] != mtime_ns:
+            # New or edited file: any other cached hash is stale too
+            entry = {"size": size, "mtime_ns": mtime_ns}
+            self.entries[key] = entry
+        entry[kind] = value
@@ -1,6 +1,47 @@
+import errno
+import os
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
-from max_cli.common.exceptions import ResourceNotFoundError
+from typing import Callable, List, Dict, Any, Iterator, Optional, Set, Tuple
+from max_cli.common.dir_cache import shared_dir_cache
+from max_cli.common.exceptions import MaxError, ResourceNotFoundError, ValidationError
+from max_cli.common.parallel import run_tasks
+from max_cli.common.scanner import scan_files
+from max_cli.common.utils import copy_file_fast, temp_sibling
+from max_cli.core.file_hashes import (
+    PARTIAL_BYTES,
+    FileHashCache,
+    full_hash,
+    partial_hash,
+)
+from max_cli.core.rename_plan import (
+    RenameAction,
+    RenameJournal,
+    RenameStep,
+    completed_steps,
+    execute_renames,
+    iter_renames,
+    plan_renames,
+    unique_name,
+)
+
+
+try:
+    import fcntl  # Unix only
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+
+# Linux ioctl that makes a file share another's blocks (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+# A scanned file: (path relative to the folder, device, inode, size, mtime_ns)
+FileRecord = Tuple[str, int, int, int, int]
+# A planned move: (source path, target path, size, crosses a device)
+Move = Tuple[str, str, int, bool]
 
 
 class FileOrganizer:
@@ -8,65 +49,573 @@ class FileOrganizer:
     Core logic for organizing and renaming files.
     """
 
+    DEDUPE_ACTIONS = ("report", "delete", "hardlink", "reflink")
+
+    # organize: top-level folder per kind of file (anything else -> "other")
+    TYPE_GROUPS = {
+        "images": {
+            ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tiff", ".tif",
+            ".heic", ".heif", ".dng", ".cr2", ".cr3", ".nef", ".arw", ".raf",
+        },
+        "videos": {".mp4", ".mov", ".m4v", ".avi", ".mkv", ".mts", ".3gp", ".webm"},
+        "audio": {".mp3", ".wav", ".flac", ".aac", ".m4a", ".ogg", ".opus"},
+        "documents": {
+            ".pdf", ".doc", ".docx", ".odt", ".rtf", ".txt", ".md",
+            ".xls", ".xlsx", ".ods", ".csv", ".ppt", ".pptx", ".odp",
+        },
+        "archives": {".zip", ".tar", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar"},
+    }
+    LAYOUT_FIELDS = ("type", "year", "month", "day", "ext")
+
     def scan_directory(self, folder: Path) -> List[Path]:
         """Returns a sorted list of files in the folder (excluding subfolders)."""
+        return [folder / name for name in self._file_names(folder)]
+
+    def _file_names(self, folder: Path) -> List[str]:
+        """Sorted file names in the folder, minus our own journals and caches."""
         if not folder.exists() or not folder.is_dir():
             raise ResourceNotFoundError(f"Folder '{folder}' not found.")
 
-        # Get all files, exclude directories
-        files = [f for f in folder.iterdir() if f.is_file()]
+        # Get all files, exclude directories (type info comes from scandir)
+        names = [
+            entry.name
+            for entry in scan_files(folder, sort_key=None, cache=shared_dir_cache())
+            # .max_* files (rename journal, hash/pHash/PDF indexes) belong to
+            # other commands: renumbering them would orphan their data
+            if not entry.name.startswith(".max_")
+        ]
 
         # Sort alphabetically so the ordering is deterministic
-        files.sort(key=lambda f: f.name.lower())
-        return files
+        names.sort(key=str.lower)
+        return names
+
+    def plan_order(self, folder: Path, start_index: int = 1) -> Dict[str, Any]:
+        """
+        Works out the numbering renames for a folder (1_file.txt,
+        2_file.txt...), skipping files that are already numbered. The batch
+        is ordered by plan_renames, so no rename can overwrite a file.
+        Returns the steps plus counts; nothing on disk changes.
+        """
+        names = self._file_names(folder)
+        existing = set(names)
+        moves = 0
+
+        def numbered() -> Iterator[RenameStep]:
+            # A generator, so plan_renames holds the only copy of the moves
+            nonlocal moves
+            for original_name in names:
+                # 1. Safety Check: Skip if already numbered (e.g., "1_document.pdf")
+                # We check if the bit before the first underscore is a digit
+                parts = original_name.split("_")
+                if len(parts) > 1 and parts[0].isdigit():
+                    continue
+
+                # 2. Construct new name
+                yield original_name, f"{start_index + moves}_{original_name}"
+                moves += 1
+
+        # 3. Plan: unique targets, safe order
+        steps, resolved = plan_renames(numbered(), existing)
+        return {
+            "steps": steps,
+            "total_files": len(names),
+            "moves": moves,
+            "skipped": len(names) - moves,
+            "conflicts": resolved["conflicts"],
+            "cycles": resolved["cycles"],
+            # Cycle-breaking temp names: a file passing through one moves twice
+            "temp_names": {src for src, _ in steps if src not in existing},
+        }
+
+    def iter_order(
+        self, folder: Path, plan: Dict[str, Any], dry_run: bool = False
+    ) -> Iterator[RenameAction]:
+        """
+        Carries out a plan_order plan, yielding a RenameAction per step as
+        it happens ('planned' ones in a dry run). The plan is journaled
+        before anything moves, so an interrupted run can be resumed or
+        undone; consuming only part of the generator is such an interrupt.
+        """
+        steps = plan["steps"]
+        if dry_run:
+            for src, dst in steps:
+                yield RenameAction(src, dst, "planned")
+            return
+
+        journal = RenameJournal(folder)
+        if journal.exists() and not journal.load()[1]:
+            raise MaxError(
+                f"An interrupted rename was found in '{folder}'. "
+                "Run with --resume or --undo first."
+            )
+        journal.write(steps)
+        yield from iter_renames(folder, steps, journal=journal)
+        journal.mark_done()
 
     def order_files(
         self, folder: Path, dry_run: bool = False, start_index: int = 1
     ) -> Dict[str, Any]:
         """
-        Renames files by prepending numbers (1_file.txt, 2_file.txt).
+        Plans and runs a whole numbering batch (see plan_order/iter_order).
         Returns statistics about the operation.
         """
-        files = self.scan_directory(folder)
-        renamed_count = 0
-        skipped_count = 0
-        actions = []  # Log of what happened/would happen
+        plan = self.plan_order(folder, start_index)
+        renamed = plan["moves"] if dry_run else 0
+        failed = 0
+        for action in self.iter_order(folder, plan, dry_run):
+            if action.status == "failed":
+                failed += 1
+            elif action.status == "renamed" and action.src not in plan["temp_names"]:
+                # Temp hops move a file twice; count it once
+                renamed += 1
+        return {
+            "total_files": plan["total_files"],
+            "renamed": renamed,
+            "failed": failed,
+            "skipped": plan["skipped"],
+            "conflicts": plan["conflicts"],
+            "cycles": plan["cycles"],
+        }
 
-        current_index = start_index
+    def resume_order(self, folder: Path) -> Dict[str, int]:
+        """Finishes an interrupted order_files run from its journal."""
+        journal = RenameJournal(folder)
+        steps, finished = journal.load()
+        if finished:
+            return {"renamed": 0, "already_done": len(steps), "failed": 0}
+        counts = execute_renames(folder, steps, mode="resume", journal=journal)
+        journal.mark_done()
+        return counts
+
+    def undo_order(self, folder: Path) -> Dict[str, int]:
+        """
+        Reverts the last order_files run (finished or not) from its journal.
+        Steps that never ran are passed over; the journal is removed after.
+        """
+        journal = RenameJournal(folder)
+        steps, _ = journal.load()
+        # Only what ran is reversed: a cycle that never started looks
+        # exactly like one that finished
+        ran = completed_steps(
+            steps, lambda name: os.path.lexists(folder / name), journal.landings
+        )
+        counts = execute_renames(
+            folder, [(dst, src) for src, dst in reversed(steps[:ran])], mode="undo"
+        )
+        counts["already_done"] += len(steps) - ran  # Never ran: nothing to undo
+        if not counts["failed"]:
+            journal.clear()
+        return counts
 
-        for file_path in files:
-            original_name = file_path.name
+    def find_duplicates(
+        self,
+        folder: Path,
+        recursive: bool = False,
+        min_size: int = 1,
+        workers: int = 8,
+        cache: Optional[FileHashCache] = None,
+        on_progress: Optional[Callable[[str, int, int], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Finds files with identical contents, reading as little as possible:
+        1. Files are bucketed by size; a unique size can't have a duplicate.
+        2. Same-size files get a hash of their first and last few KB.
+        3. Only files that still collide are hashed in full.
+        Hashing runs on a thread pool. Paths that are already hardlinks of
+        each other count as one file; symlinks are skipped (they take no
+        space, and linking or deleting them would change the links, not
+        the data). With a cache, unchanged files are never read again.
 
-            # 1. Safety Check: Skip if already numbered (e.g., "1_document.pdf")
-            # We check if the bit before the first underscore is a digit
-            parts = original_name.split("_")
-            if len(parts) > 1 and parts[0].isdigit():
-                skipped_count += 1
+        Returns the groups (oldest copy first) plus byte counts, so callers
+        can show how much was read and how much can be reclaimed, and the
+        cache keys of every inode scanned ('live_keys', for cache.save).
+        on_progress(phase, done, total) is called per hashed file.
+        """
+        if not folder.is_dir():
+            raise ResourceNotFoundError(f"Folder '{folder}' not found.")
+
+        # --- 1. Scan into size buckets, one record per inode ---
+        prefix = os.path.join(str(folder), "")
+        by_size: Dict[int, Dict[Tuple[int, int], List[FileRecord]]] = {}
+        skip = {FileHashCache.FILE_NAME, RenameJournal.FILE_NAME}
+        live_keys: Set[str] = set()
+        files = bytes_total = 0
+        for entry in scan_files(folder, recursive=recursive, sort_key=None):
+            if entry.name in skip or entry.is_symlink():
+                continue
+            st = entry.stat(follow_symlinks=False)
+            live_keys.add(FileHashCache.key(st.st_dev, st.st_ino))
+            if st.st_size < min_size:
                 continue
+            files += 1
+            bytes_total += st.st_size
+            record = (
+                entry.path[len(prefix):],
+                st.st_dev,
+                st.st_ino,
+                st.st_size,
+                st.st_mtime_ns,
+            )
+            inodes = by_size.setdefault(st.st_size, {})
+            inodes.setdefault((st.st_dev, st.st_ino), []).append(record)
+
+        bytes_read = 0
+
+        def hash_stage(
+            kind: str, candidates: List[FileRecord]
+        ) -> Dict[Tuple[int, int], str]:
+            # Cached hashes first; the rest go to the thread pool
+            nonlocal bytes_read
+            hashes: Dict[Tuple[int, int], str] = {}
+            todo: List[FileRecord] = []
+            for record in candidates:
+                rel, dev, ino, size, mtime_ns = record
+                cached = None
+                if cache is not None:
+                    key = FileHashCache.key(dev, ino)
+                    cached = cache.lookup(key, size, mtime_ns, kind)
+                if cached is None:
+                    todo.append(record)
+                else:
+                    hashes[(dev, ino)] = cached
+
+            tasks = (
+                {"path": prefix + rel, "size": size}
+                if kind == "partial"
+                else {"path": prefix + rel}
+                for rel, _, _, size, _ in todo
+            )
+            func = partial_hash if kind == "partial" else full_hash
+            for done, (index, value, error) in enumerate(
+                run_tasks(func, tasks, workers, executor_cls=ThreadPoolExecutor),
+                start=1,
+            ):
+                _, dev, ino, size, mtime_ns = todo[index]
+                if error is None:
+                    hashes[(dev, ino)] = value
+                    if cache is not None:
+                        key = FileHashCache.key(dev, ino)
+                        cache.update(key, size, mtime_ns, kind, value)
+                    if kind == "full" or size <= 2 * PARTIAL_BYTES:
+                        bytes_read += size
+                    else:
+                        bytes_read += 2 * PARTIAL_BYTES
+                # Unreadable files simply drop out of the comparison
+                if on_progress:
+                    on_progress(kind, done, len(todo))
+            return hashes
 
-            # 2. Construct new name
-            new_name = f"{current_index}_{original_name}"
-            new_path = folder / new_name
+        # --- 2. Head + tail hash for every size shared by 2+ inodes ---
+        candidates = [
+            paths[0]
+            for inodes in by_size.values()
+            if len(inodes) > 1
+            for paths in inodes.values()
+        ]
+        partials = hash_stage("partial", candidates)
+
+        # --- 3. Full hash where (size, partial) still collides ---
+        buckets: Dict[Tuple[int, str], List[FileRecord]] = {}
+        for record in candidates:
+            value = partials.get(record[1:3])
+            if value is not None:
+                buckets.setdefault((record[3], value), []).append(record)
+        suspects = [
+            record
+            for (size, _), group in buckets.items()
+            if len(group) > 1 and size > 2 * PARTIAL_BYTES
+            for record in group
+        ]
+        fulls = hash_stage("full", suspects)
+
+        # --- 4. Groups of identical content, oldest copy first ---
+        groups = []
+        reclaimable = 0
+        for (size, value), group in buckets.items():
+            if len(group) < 2:
+                continue
+            if size > 2 * PARTIAL_BYTES:
+                by_full: Dict[str, List[FileRecord]] = {}
+                for record in group:
+                    if record[1:3] in fulls:
+                        by_full.setdefault(fulls[record[1:3]], []).append(record)
+                matches = [g for g in by_full.values() if len(g) > 1]
+            else:
+                matches = [group]  # The partial hash covered the whole file
 
-            # 3. Perform Rename (or Simulate)
-            if dry_run:
-                actions.append(
-                    f"[DRY RUN] Would rename '{original_name}' -> '{new_name}'"
+            for match in matches:
+                match.sort(key=lambda r: (r[4], len(r[0]), r[0]))
+                groups.append(
+                    {
+                        "size": size,
+                        "files": [r[0] for r in match],
+                        # Other names already hardlinked to each copy
+                        "links": {
+                            r[0]: [p[0] for p in by_size[size][r[1:3]][1:]]
+                            for r in match
+                            if len(by_size[size][r[1:3]]) > 1
+                        },
+                    }
                 )
+                reclaimable += size * (len(match) - 1)
+
+        groups.sort(key=lambda g: -g["size"] * (len(g["files"]) - 1))
+        return {
+            "files": files,
+            "groups": groups,
+            "bytes_total": bytes_total,
+            "bytes_read": bytes_read,
+            "reclaimable": reclaimable,
+            "live_keys": live_keys,
+        }
+
+    def replace_duplicate(self, keep: Path, extra: Path, action: str) -> None:
+        """
+        Deletes 'extra', or swaps it for a hardlink / reflink (copy-on-write
+        clone) of 'keep'. Links are built under a temp name and moved over
+        'extra', so a failure never loses the file.
+        """
+        if action == "delete":
+            extra.unlink()
+            return
+        if action not in ("hardlink", "reflink"):
+            raise ValueError(f"Unknown duplicate action '{action}'.")
+
+        tmp_path = temp_sibling(extra)
+        try:
+            if action == "hardlink":
+                os.link(keep, tmp_path)
             else:
+                if fcntl is None:
+                    raise OSError("Reflinks are not supported on this platform.")
+                with open(keep, "rb") as src, open(tmp_path, "wb") as dst:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                shutil.copystat(extra, tmp_path)
+            os.replace(tmp_path, extra)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def file_type(self, name: str) -> str:
+        """The TYPE_GROUPS folder for a file name ('other' if unknown)."""
+        ext = os.path.splitext(name)[1].lower()
+        for group, extensions in self.TYPE_GROUPS.items():
+            if ext in extensions:
+                return group
+        return "other"
+
+    def plan_organize(
+        self,
+        source: Path,
+        dest: Path,
+        recursive: bool = False,
+        layout: str = "{type}/{year}/{month}",
+        use_exif: bool = True,
+        workers: int = 8,
+    ) -> Dict[str, Any]:
+        """
+        Works out where every file goes before anything moves.
+        The target folder comes from 'layout' ({type}, {year}, {month},
+        {day}, {ext}); dates are the EXIF capture date for photos that have
+        one, the mtime otherwise. Name clashes get a ' (2)' suffix, and each
+        target folder is listed once.
+        Returns the moves, the folders to create, and how many files were
+        already in place.
+        """
+        if not source.is_dir():
+            raise ResourceNotFoundError(f"Folder '{source}' not found.")
+        try:
+            layout.format(**{field: "x" for field in self.LAYOUT_FIELDS})
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValidationError(
+                f"Invalid --layout '{layout}' ({e}). "
+                f"Use {', '.join('{' + f + '}' for f in self.LAYOUT_FIELDS)}."
+            )
+
+        # Device of the destination (or its nearest existing parent)
+        probe = dest.resolve()
+        while not probe.exists():
+            probe = probe.parent
+        dest_dev = probe.stat().st_dev
+
+        # Don't re-sort what a previous run (into a sub-folder) already did
+        exclude = []
+        try:
+            exclude.append(dest.resolve().relative_to(source.resolve()).as_posix())
+        except ValueError:
+            pass
+        if exclude == ["."]:
+            exclude = []  # Organizing in place: files already sorted stay put
+
+        records = []
+        for entry in scan_files(
+            source, recursive=recursive, exclude=exclude, cache=shared_dir_cache()
+        ):
+            if entry.name.startswith(".max_"):
+                continue  # Our own journals and caches
+            st = entry.stat(follow_symlinks=False)
+            records.append((entry.path, entry.name, st))
+
+        # --- 1. Dates: EXIF for photos (header reads on threads), else mtime ---
+        dates: Dict[int, datetime] = {}
+        if use_exif:
+            # Pillow is only needed for EXIF dates
+            from max_cli.core.image_processor import ImageEngine
+
+            engine = ImageEngine()
+            photos = [
+                i
+                for i, (_, name, st) in enumerate(records)
+                if st.st_size
+                and os.path.splitext(name)[1].lower() in engine.SUPPORTED_EXTENSIONS
+            ]
+            tasks = ({"input_path": Path(records[i][0])} for i in photos)
+            for index, taken, _ in run_tasks(
+                engine.capture_date, tasks, workers, executor_cls=ThreadPoolExecutor
+            ):
+                if taken is not None:
+                    dates[photos[index]] = taken
+
+        # --- 2. Targets, with every target folder listed once ---
+        listed: Dict[str, set] = {}
+        folder_ids: Dict[str, Optional[Tuple[int, int]]] = {}
+
+        def folder_id(folder: str) -> Optional[Tuple[int, int]]:
+            # Same folder however it's spelled (relative, absolute, symlinked)
+            if folder not in folder_ids:
                 try:
-                    file_path.rename(new_path)
-                    actions.append(f"Renamed '{original_name}' -> '{new_name}'")
-                except OSError as e:
-                    actions.append(f"[Error] Could not rename '{original_name}': {e}")
+                    st = os.stat(folder)
+                    folder_ids[folder] = (st.st_dev, st.st_ino)
+                except OSError:
+                    folder_ids[folder] = None
+            return folder_ids[folder]
+
+        moves: List[Move] = []
+        in_place = 0
+        for i, (path, name, st) in enumerate(records):
+            when = dates.get(i) or datetime.fromtimestamp(st.st_mtime)
+            folder = os.path.join(
+                str(dest),
+                layout.format(
+                    type=self.file_type(name),
+                    year=f"{when.year:04d}",
+                    month=f"{when.month:02d}",
+                    day=f"{when.day:02d}",
+                    ext=os.path.splitext(name)[1].lower().lstrip(".") or "none",
+                ),
+            )
+            target_id = folder_id(folder)
+            if target_id is not None and target_id == folder_id(os.path.dirname(path)):
+                in_place += 1
+                continue
+            taken = listed.get(folder)
+            if taken is None:
+                try:
+                    taken = set(os.listdir(folder))
+                except FileNotFoundError:
+                    taken = set()
+                listed[folder] = taken
+            if name in taken:
+                name = unique_name(name, taken.__contains__)
+            taken.add(name)
+            moves.append(
+                (path, os.path.join(folder, name), st.st_size, st.st_dev != dest_dev)
+            )
+
+        return {
+            "moves": moves,
+            "folders": sorted(listed),
+            "in_place": in_place,
+        }
+
+    def _move_across(self, src: str, dst: str, checksum: bool = False) -> str:
+        """
+        Moves a file to another device: kernel-side copy to a temp name next
+        to the target, metadata copied, size (or full hash) verified, then
+        renamed into place and the source removed. Returns the copy method.
+        """
+        tmp_path = temp_sibling(Path(dst))
+        try:
+            method = copy_file_fast(Path(src), tmp_path)
+            shutil.copystat(src, tmp_path)
+            if os.stat(tmp_path).st_size != os.stat(src).st_size:
+                raise OSError(f"Copy of '{src}' is incomplete.")
+            if checksum and full_hash(src) != full_hash(str(tmp_path)):
+                raise OSError(f"Copy of '{src}' doesn't match the original.")
+            # The plan picked a free name; don't clobber one that appeared since
+            if os.path.lexists(dst):
+                raise FileExistsError(f"'{dst}' already exists.")
+            os.rename(tmp_path, dst)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        os.unlink(src)
+        return method
+
+    def execute_moves(
+        self,
+        plan: Dict[str, Any],
+        workers: int = 4,
+        checksum: bool = False,
+        on_move: Optional[Callable[[Move, Optional[BaseException]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Carries out a plan_organize plan. Target folders are created once,
+        up front. Moves within a device are plain renames (metadata only,
+        done in order); moves across devices are copies run on a thread
+        pool, since each one waits on I/O.
+        on_move(move, error) is called after every file.
+        """
+        for folder in plan["folders"]:
+            os.makedirs(folder, exist_ok=True)
+
+        counts = {"renamed": 0, "copied": 0, "bytes": 0}
+        methods: Counter = Counter()
+        failures: List[Tuple[str, BaseException]] = []
+        began = time.perf_counter()
+
+        def finish(move: Move, error: Optional[BaseException]) -> None:
+            if error is not None:
+                failures.append((move[0], error))
+            else:
+                counts["bytes"] += move[2]
+            if on_move:
+                on_move(move, error)
+
+        across: List[Move] = []
+        for move in plan["moves"]:
+            if move[3]:
+                across.append(move)
+                continue
+            try:
+                # Same guard as _move_across: rename() would silently replace
+                # a file that took the planned name after planning
+                if os.path.lexists(move[1]):
+                    raise FileExistsError(f"'{move[1]}' already exists.")
+                os.rename(move[0], move[1])
+            except OSError as e:
+                if e.errno == errno.EXDEV:
+                    across.append(move)  # Same st_dev, different mount
                     continue
+                finish(move, e)
+                continue
+            counts["renamed"] += 1
+            finish(move, None)
 
-            renamed_count += 1
-            current_index += 1
+        tasks = (
+            {"src": src, "dst": dst, "checksum": checksum} for src, dst, _, _ in across
+        )
+        for index, method, error in run_tasks(
+            self._move_across, tasks, workers, executor_cls=ThreadPoolExecutor
+        ):
+            if error is None:
+                counts["copied"] += 1
+                methods[method] += 1
+            finish(across[index], error)
 
         return {
-            "total_files": len(files),
-            "renamed": renamed_count,
-            "skipped": skipped_count,
-            "actions": actions,
+            **counts,
+            "failures": failures,
+            "methods": dict(methods),
+            "seconds": time.perf_counter() - began,
         }
@@ -0,0 +1,181 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from max_cli.common.utils import atomic_write_bytes
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance. A radius search only visits
+    children whose edge distance is within [d - radius, d + radius] (triangle
+    inequality), so finding near matches doesn't compare against every hash.
+    Identical hashes share a node.
+    """
+
+    def __init__(self) -> None:
+        # node = [hash, [keys...], {distance: child node}]
+        self.root: Optional[list] = None
+
+    def add(self, value: int, key: Any) -> None:
+        if self.root is None:
+            self.root = [value, [key], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [key], {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[Any, int]]:
+        """All (key, distance) pairs within 'radius' of value."""
+        found: List[Tuple[Any, int]] = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((key, distance) for key in node[1])
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+def find_groups(hashes: Dict[str, int], threshold: int) -> List[List[str]]:
+    """
+    Groups keys whose hashes are within 'threshold' bits of each other,
+    transitively (A~B and B~C puts all three together).
+    Each key is matched against the ones already in the tree, then added,
+    so every pair is looked at once. Returns groups of two or more keys,
+    in first-seen order.
+    """
+    parent: Dict[str, str] = {}
+
+    def find(key: str) -> str:
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]  # Path halving
+            key = parent[key]
+        return key
+
+    tree = BKTree()
+    for key, value in hashes.items():
+        parent[key] = key
+        for other, _ in tree.search(value, threshold):
+            root_a, root_b = find(key), find(other)
+            if root_a != root_b:
+                parent[root_a] = root_b
+        tree.add(value, key)
+
+    groups: Dict[str, List[str]] = {}
+    for key in hashes:
+        groups.setdefault(find(key), []).append(key)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def split_by_keeper(
+    group: List[str], hashes: Dict[str, int], threshold: int
+) -> Tuple[List[str], List[str]]:
+    """
+    Splits a ranked group (keeper first) into the extras within 'threshold'
+    bits of the keeper and the ones further away. Groups are transitive,
+    so along a chain of similar shots the far end can be many thresholds
+    from the keeper: only the near ones are safe to delete or link.
+    """
+    keep, *extras = group
+    near = [e for e in extras if hamming(hashes[keep], hashes[e]) <= threshold]
+    far = [e for e in extras if hamming(hashes[keep], hashes[e]) > threshold]
+    return near, far
+
+
+class PerceptualIndex:
+    """
+    Persistent cache of perceptual hashes, keyed by path relative to the
+    scanned folder. An entry is reused while the file's size and mtime are
+    unchanged, so re-runs only decode new or edited images.
+    """
+
+    FILE_NAME = ".max_phash.json"
+    VERSION = 1
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> "PerceptualIndex":
+        """Reads the index from disk. Missing or corrupt means 'start fresh'."""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return self
+        if data.get("version") == self.VERSION:
+            self.entries = data.get("entries", {})
+        return self
+
+    def save(self) -> None:
+        payload = {"version": self.VERSION, "entries": self.entries}
+        atomic_write_bytes(self.path, json.dumps(payload).encode("utf-8"))
+
+    def lookup(self, key: str, st: os.stat_result, method: str) -> Optional[int]:
+        """The cached hash if the file is unchanged, else None (a miss)."""
+        entry = self.entries.get(key)
+        if (
+            entry
+            and entry["size"] == st.st_size
+            and entry["mtime_ns"] == st.st_mtime_ns
+            and method in entry
+        ):
+            self.hits += 1
+            return int(entry[method], 16)
+        self.misses += 1
+        return None
+
+    def update(
+        self,
+        key: str,
+        st: os.stat_result,
+        method: str,
+        value: int,
+        dims: List[int],
+    ) -> None:
+        entry = self.entries.get(key)
+        if (
+            not entry
+            or entry["size"] != st.st_size
+            or entry["mtime_ns"] != st.st_mtime_ns
+        ):
+            # New or edited file: hashes from other methods are stale too
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            self.entries[key] = entry
+        entry["dims"] = dims
+        entry[method] = f"{value:016x}"
+
+    def prune(self, root: Path, seen_keys: Iterable[str]) -> int:
+        """
+        Forgets entries whose files are gone. Keys outside this scan (e.g. a
+        non-recursive run) are kept as long as the file still exists.
+        Returns the number of entries removed.
+        """
+        seen = set(seen_keys)
+        stale = [
+            key
+            for key in self.entries
+            if key not in seen and not (root / key).is_file()
+        ]
+        for key in stale:
+            del self.entries[key]
+        return len(stale)
@@ -1,6 +1,15 @@
+import io
+import math
+import os
+import shutil
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any 
-from PIL import Image
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+from PIL import Image, ImageChops, ImageStat, UnidentifiedImageError
+
+from max_cli.common.exceptions import ImageTooLargeError
+from max_cli.common.timing import StageTimer
+from max_cli.common.utils import atomic_write_bytes, temp_sibling
 
 # Handle Pillow version differences for Resampling
 try:
@@ -10,6 +19,17 @@ try:
 except ImportError:
     LANCZOS = Image.LANCZOS  # type: ignore
 
+# Pillow's decompression-bomb check reads one process-wide limit, so it
+# can't be lifted per open without racing the worker threads. It is turned
+# off once here; open_image applies the explicit policy instead.
+Image.MAX_IMAGE_PIXELS = None
+
+# pHash: first 8 DCT-II basis rows over 32 samples (only the low frequencies
+# are ever used, so the full 32x32 transform is never computed)
+_DCT_ROWS = [
+    [math.cos(math.pi * (2 * x + 1) * u / 64) for x in range(32)] for u in range(8)
+]
+
 
 class ImageEngine:
     """
@@ -19,12 +39,439 @@ class ImageEngine:
 
     SUPPORTED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tiff"}
 
+    # How much larger than the target the decoder output must stay.
+    # JPEG draft mode decodes at 1/2, 1/4 or 1/8 scale; keeping 2x headroom
+    # (same as Pillow's thumbnail) means LANCZOS still does the final pass.
+    DRAFT_GAP = 2.0
+    # Integer pre-reduction for non-JPEG formats. At 3.0 Pillow's docs call
+    # the result indistinguishable from a full LANCZOS resample.
+    REDUCING_GAP = 3.0
+
+    # Target-size search bounds. Below MIN_TARGET_QUALITY JPEG/WebP artifacts get
+    # ugly, so we shrink dimensions instead (if allowed) down to MIN_TARGET_DIM.
+    TARGET_FORMATS = {"JPEG", "WEBP"}
+    MIN_TARGET_QUALITY = 10
+    MIN_TARGET_DIM = 64
+
+    # --auto-format quality floor: a lossy candidate (JPEG, WebP, quantized
+    # PNG) scoring below this PSNR against the image it encodes is passed
+    # over, however small. Around 32 dB is where blocking and palette
+    # banding start to show; lossless PNG always qualifies.
+    AUTO_MIN_PSNR = 32.0
+
+    # Decompression-bomb policy. Pillow's own check (warn above ~89 MP, refuse
+    # above twice that) is replaced by an explicit one:
+    #   warn  - process with a warning, refuse beyond 2x the limit (the default,
+    #           same as Pillow)
+    #   error - refuse anything over the limit
+    #   allow - never refuse (pair with --max-memory)
+    DEFAULT_MAX_PIXELS = 89_478_485
+
+    # Variant cascade: a variant is resized from the smallest image already in
+    # hand that is at least this many times wider, so each LANCZOS pass still
+    # has plenty of source pixels. Otherwise it comes from the decoded original.
+    CASCADE_GAP = 2.0
+    VARIANT_FORMATS = {"jpeg": ".jpg", "jpg": ".jpg", "webp": ".webp", "png": ".png"}
+    BOMB_POLICIES = ("warn", "error", "allow")
+
+    # Perceptual hashes are 64 bits: dHash compares neighbours on a 9x8
+    # thumbnail, pHash thresholds the low 8x8 DCT block of a 32x32 one.
+    HASH_METHODS = ("dhash", "phash")
+
     def get_size_str(self, size_bytes: int) -> str:
         """Helper to format bytes into KB/MB."""
         if size_bytes < 1024 * 1024:
             return f"{size_bytes / 1024:.2f} KB"
         return f"{size_bytes / (1024 * 1024):.2f} MB"
 
+    def open_image(
+        self,
+        input_path: Path,
+        max_pixels: Optional[int] = None,
+        bomb_policy: str = "warn",
+        source_bytes: Optional[bytes] = None,
+    ) -> Tuple[Image.Image, Optional[str]]:
+        """
+        Opens an image (header only, pixels load lazily) and applies the
+        pixel-limit policy. Returns the image and an optional warning.
+        With source_bytes (already read by a prefetcher) the disk isn't touched.
+        """
+        if bomb_policy not in self.BOMB_POLICIES:
+            raise ValueError(f"Unknown bomb policy '{bomb_policy}'.")
+
+        limit = max_pixels or self.DEFAULT_MAX_PIXELS
+
+        if source_bytes is not None:
+            try:
+                img = Image.open(io.BytesIO(source_bytes))
+            except UnidentifiedImageError:
+                # Name the file, not the in-memory buffer
+                raise UnidentifiedImageError(
+                    f"cannot identify image file '{input_path}'"
+                ) from None
+        else:
+            img = Image.open(input_path)
+
+        pixels = img.size[0] * img.size[1]
+        if pixels <= limit or bomb_policy == "allow":
+            return img, None
+
+        megapixels = f"{pixels / 1_000_000:.0f} MP"
+        if bomb_policy == "error" or pixels > 2 * limit:
+            img.close()
+            raise ImageTooLargeError(
+                f"{input_path.name} is {megapixels}, over the "
+                f"{limit / 1_000_000:.0f} MP pixel limit."
+            )
+        return img, f"{input_path.name} is very large ({megapixels})."
+
+    def perceptual_hash(
+        self, input_path: Path, method: str = "dhash"
+    ) -> Dict[str, Any]:
+        """
+        64-bit perceptual hash of an image, for near-duplicate detection.
+        Only a thumbnail is needed, so JPEGs decode at 1/8 scale and other
+        formats are integer-reduced before the final resample.
+        Returns {"hash": int, "dims": [w, h]} (dims of the original).
+        """
+        if method not in self.HASH_METHODS:
+            raise ValueError(f"Unknown hash method '{method}'.")
+        side = 32 if method == "phash" else 9
+
+        img, _ = self.open_image(input_path, bomb_policy="allow")
+        with img:
+            dims = list(img.size)
+            img.draft("L", (int(side * self.DRAFT_GAP), int(side * self.DRAFT_GAP)))
+            gray = img.convert("L")
+        small = gray.resize(
+            (side, side if method == "phash" else 8),
+            resample=LANCZOS,
+            reducing_gap=self.REDUCING_GAP,
+        )
+        pixels = small.tobytes()  # One byte per "L" pixel
+
+        bits = 0
+        if method == "dhash":
+            # Is each pixel brighter than its right-hand neighbour?
+            for row in range(8):
+                line = pixels[row * 9 : row * 9 + 9]
+                for x in range(8):
+                    bits = (bits << 1) | (line[x] > line[x + 1])
+        else:
+            # Separable DCT: 8 coefficients per row, then 8 down each column
+            rows = [
+                [
+                    sum(p * c for p, c in zip(pixels[y * 32 : y * 32 + 32], basis))
+                    for basis in _DCT_ROWS
+                ]
+                for y in range(32)
+            ]
+            block = [
+                sum(rows[y][u] * basis[y] for y in range(32))
+                for basis in _DCT_ROWS
+                for u in range(8)
+            ]
+            # The DC term is just overall brightness; keep it out of the median
+            median = sorted(block[1:])[len(block[1:]) // 2]
+            for value in block:
+                bits = (bits << 1) | (value > median)
+
+        return {"hash": bits, "dims": dims}
+
+    def capture_date(self, input_path: Path) -> Optional[datetime]:
+        """
+        When the photo was taken, from EXIF DateTimeOriginal (falling back
+        to the camera's DateTime). Only the header is parsed; no pixels are
+        decoded. None if the file has no usable date.
+        """
+        try:
+            with Image.open(input_path) as img:
+                exif = img.getexif()
+        except (OSError, UnidentifiedImageError, SyntaxError, ValueError):
+            return None
+        # 0x8769 = Exif sub-IFD, 0x9003 = DateTimeOriginal, 0x0132 = DateTime
+        value = exif.get_ifd(0x8769).get(0x9003) or exif.get(0x0132)
+        if not isinstance(value, str):
+            return None
+        try:
+            return datetime.strptime(value.strip("\x00 ")[:19], "%Y:%m:%d %H:%M:%S")
+        except ValueError:
+            return None  # Blank ("    :  :  ") or malformed
+
+    def read_header(self, input_path: Path) -> Optional[Tuple[int, int, str, str]]:
+        """(width, height, mode, format) from the header, or None if unreadable."""
+        try:
+            with Image.open(input_path) as img:
+                return img.size[0], img.size[1], img.mode, img.format
+        except Exception:
+            return None
+
+    def estimate_memory(
+        self,
+        input_path: Path,
+        scale: Optional[int] = None,
+        max_dim: Optional[int] = None,
+        fast_decode: bool = True,
+        header: Optional[Sequence] = None,
+    ) -> int:
+        """
+        Rough peak bytes needed to process an image, from its header alone
+        (or a 'header' from read_header cached earlier). Counts the decoded
+        bitmap (after JPEG draft scaling) plus the resized and converted
+        copies. Unreadable files cost 0; they fail fast anyway.
+        """
+        if header is None:
+            header = self.read_header(input_path)
+        if header is None:
+            return 0
+        width, height, mode, image_format = header
+
+        # Pillow stores 1/L/P in 1 byte, 16-bit modes in 2, everything else in 4
+        bytes_per_pixel = 1 if mode in ("1", "L", "P") else 2 if "16" in mode else 4
+        target = self.get_target_size((width, height), scale, max_dim)
+
+        decode_scale = 1
+        if target and fast_decode and image_format == "JPEG":
+            # Mirror draft(): largest 1/2^n reduction that keeps DRAFT_GAP headroom
+            while decode_scale < 8 and (
+                width // (decode_scale * 2) >= target[0] * self.DRAFT_GAP
+                and height // (decode_scale * 2) >= target[1] * self.DRAFT_GAP
+            ):
+                decode_scale *= 2
+
+        decoded = (width // decode_scale) * (height // decode_scale) * bytes_per_pixel
+        output = target[0] * target[1] * 4 if target else decoded
+        # Decoded bitmap + resized copy + one mode-converted/encoder copy
+        return decoded + 2 * output
+
+    def get_target_size(
+        self,
+        dims: Tuple[int, int],
+        scale: Optional[int] = None,
+        max_dim: Optional[int] = None,
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Works out the final (width, height) from the header dimensions alone.
+        Returns None when the image keeps its size.
+        """
+        width, height = dims
+        if scale:
+            # Resize by percentage
+            return (int(width * (scale / 100)), int(height * (scale / 100)))
+
+        if max_dim and max(width, height) > max_dim:
+            # Resize strictly by longest side, keeping the aspect ratio
+            ratio = max_dim / max(width, height)
+            return (max(1, round(width * ratio)), max(1, round(height * ratio)))
+
+        return None
+
+    def get_format(self, path: Path) -> str:
+        """Pillow format name for an output filename ('x.jpg' -> 'JPEG')."""
+        suffix = path.suffix.lower()
+        return Image.registered_extensions().get(suffix, suffix.upper().lstrip("."))
+
+    def encode_image(
+        self,
+        img: Image.Image,
+        output_format: str,
+        quality: int = 85,
+        quantize_png: bool = False,
+    ) -> bytes:
+        """
+        Encodes an already prepared image in memory with the right encoder
+        settings. Callers decide when (and how) the bytes hit the disk.
+        """
+        buffer = io.BytesIO()
+        if output_format == "JPEG":
+            img.save(buffer, "JPEG", quality=quality, optimize=True)
+
+        elif output_format == "WEBP":
+            img.save(buffer, "WEBP", quality=quality)
+
+        elif output_format == "PNG" and quantize_png:
+            # Lossy PNG
+            if img.mode not in ["RGB", "L"]:
+                img = img.convert("RGBA")
+            quantized = img.quantize(
+                colors=256, method=2, dither=Image.Dither.FLOYDSTEINBERG
+            )
+            quantized.save(buffer, "PNG", optimize=True)
+
+        else:
+            # Standard save
+            img.save(buffer, output_format, optimize=True)
+        return buffer.getvalue()
+
+    def has_alpha(self, img: Image.Image) -> bool:
+        """True if the image has transparency that actually shows."""
+        if img.mode == "P":
+            return "transparency" in img.info
+        if img.mode not in ("RGBA", "LA", "PA"):
+            return False
+        # An alpha band that is fully opaque everywhere doesn't count
+        return img.getchannel("A").getextrema()[0] < 255
+
+    def _auto_base(self, img: Image.Image) -> Image.Image:
+        # RGB, RGBA (only with real transparency) or L
+        alpha = self.has_alpha(img)
+        if img.mode not in ("RGB", "RGBA", "L"):
+            return img.convert("RGBA" if alpha else "RGB")
+        if img.mode == "RGBA" and not alpha:
+            return img.convert("RGB")
+        return img
+
+    def encode_candidates(
+        self, img: Image.Image, quality: int = 85
+    ) -> List[Tuple[str, bytes, bool]]:
+        """
+        Encodes the image in memory in every format worth trying.
+        Returns (suffix, bytes, lossy) triples; nothing is written to disk.
+        JPEG is only tried for opaque images; quantized PNG only for
+        transparent ones (where JPEG isn't an option).
+        """
+        img = self._auto_base(img)
+        alpha = img.mode == "RGBA"
+
+        candidates = []
+        if not alpha:
+            candidates.append((".jpg", self.encode_image(img, "JPEG", quality), True))
+        candidates.append((".webp", self.encode_image(img, "WEBP", quality), True))
+
+        candidates.append((".png", self.encode_image(img, "PNG"), False))
+        if alpha:
+            quantized = self.encode_image(img, "PNG", quantize_png=True)
+            candidates.append((".png", quantized, True))
+
+        return candidates
+
+    def psnr(self, img: Image.Image, data: bytes) -> float:
+        """Peak signal-to-noise ratio (dB) of encoded 'data' against 'img'."""
+        with Image.open(io.BytesIO(data)) as decoded:
+            decoded = decoded.convert(img.mode)
+        bands = ImageStat.Stat(ImageChops.difference(img, decoded)).rms
+        mse = sum(rms * rms for rms in bands) / len(bands)
+        return math.inf if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+    def pick_format(self, img: Image.Image, quality: int = 85) -> Tuple[str, bytes]:
+        """
+        The smallest candidate that meets the AUTO_MIN_PSNR floor, as
+        (suffix, bytes). Candidates are checked smallest first, so usually
+        only one is decoded again; lossless PNG is the fallback.
+        """
+        img = self._auto_base(img)
+        candidates = self.encode_candidates(img, quality)
+        return next(
+            (suffix, data)
+            for suffix, data, lossy in sorted(candidates, key=lambda c: len(c[1]))
+            if not lossy or self.psnr(img, data) >= self.AUTO_MIN_PSNR
+        )
+
+    def keep_original(self, input_path: Path, output_path: Path, link: bool) -> Path:
+        """
+        Puts the untouched source bytes at output_path (same suffix as the
+        source). Hardlinks when asked and possible, copies otherwise.
+        Either way the result appears atomically.
+        """
+        output_path = output_path.with_suffix(input_path.suffix)
+        tmp_path = temp_sibling(output_path)
+        try:
+            linked = False
+            if link:
+                try:
+                    os.link(input_path, tmp_path)
+                    linked = True
+                except OSError:
+                    pass  # Cross-device or unsupported: fall back to a copy
+            if not linked:
+                shutil.copyfile(input_path, tmp_path)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return output_path
+
+    def write_output(
+        self,
+        input_path: Path,
+        output_path: Path,
+        data: Optional[bytes],
+        link_original: bool = False,
+    ) -> Path:
+        """
+        Final write of an encoded image, atomically (temp file + rename).
+        data=None means 'keep the original' (see keep_original).
+        """
+        if data is None:
+            return self.keep_original(input_path, output_path, link_original)
+        atomic_write_bytes(output_path, data)
+        return output_path
+
+    def fit_to_size(
+        self,
+        img: Image.Image,
+        output_format: str,
+        target_bytes: int,
+        max_quality: int = 85,
+        allow_resize: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Finds the highest quality whose encoded size fits in 'target_bytes'.
+        Every trial encode goes to memory; the already decoded (and resized)
+        image is reused, so nothing is read or written to disk here.
+
+        If even the lowest quality is too big and allow_resize is set, the
+        dimensions are stepped down and the search repeats.
+        Returns the chosen bytes plus the quality, size and iteration count.
+        """
+        min_quality = min(self.MIN_TARGET_QUALITY, max_quality)
+        current = img
+        iterations = 0
+
+        while True:
+            # 1. Cheap exits first: the requested quality may already fit
+            data = self.encode_image(current, output_format, max_quality)
+            iterations += 1
+            best_quality, best_data = max_quality, data
+
+            if len(data) > target_bytes and max_quality > min_quality:
+                floor_data = self.encode_image(current, output_format, min_quality)
+                iterations += 1
+                best_quality, best_data = min_quality, floor_data
+
+                # 2. Binary search between the floor and the ceiling
+                if len(floor_data) <= target_bytes:
+                    low, high = min_quality + 1, max_quality - 1
+                    while low <= high:
+                        mid = (low + high) // 2
+                        trial = self.encode_image(current, output_format, mid)
+                        iterations += 1
+                        if len(trial) <= target_bytes:
+                            best_quality, best_data = mid, trial
+                            low = mid + 1
+                        else:
+                            high = mid - 1
+
+            met = len(best_data) <= target_bytes
+            if met or not allow_resize or min(current.size) <= self.MIN_TARGET_DIM:
+                return {
+                    "data": best_data,
+                    "quality": best_quality,
+                    "iterations": iterations,
+                    "dims": current.size,
+                    "target_met": met,
+                }
+
+            # 3. Step the dimensions down. Bytes scale roughly with pixel count,
+            # so aim for the area ratio, with a bit of headroom and sane limits.
+            ratio = (target_bytes / len(best_data)) ** 0.5 * 0.95
+            ratio = min(0.9, max(0.5, ratio))
+            new_size = (
+                max(1, int(current.size[0] * ratio)),
+                max(1, int(current.size[1] * ratio)),
+            )
+            current = img.resize(new_size, resample=LANCZOS)
+
     def process_single_image(
         self,
         input_path: Path,
@@ -34,70 +481,274 @@ class ImageEngine:
         quantize_png: bool = False,
         scale: Optional[int] = None,
         max_dim: Optional[int] = None,
+        fast_decode: bool = True,
+        target_bytes: Optional[int] = None,
+        shrink_to_fit: bool = False,
+        max_pixels: Optional[int] = None,
+        bomb_policy: str = "warn",
+        auto_format: bool = False,
+        link_original: bool = False,
+        source_bytes: Optional[bytes] = None,
+        defer_write: bool = False,
     ) -> Dict[str, Any]:
         """
         Compresses and/or resizes a single image.
+        With fast_decode, downscales decode at reduced resolution first
+        (JPEG DCT scaling, integer reduce elsewhere) before the LANCZOS pass.
+        With target_bytes, searches for the best JPEG/WebP quality that fits
+        (shrinking dimensions too if shrink_to_fit is set).
+        Images above max_pixels are handled according to bomb_policy.
+        With auto_format, the smallest of several in-memory encodes that meets
+        the AUTO_MIN_PSNR floor wins. Whenever the encode is no smaller than
+        the source (and no resize was asked for), the original bytes are
+        kept, so the output never grows.
+        Pipelined callers pass the file's bytes in (source_bytes) and, with
+        defer_write, get them back under stats["pending_write"] as
+        (output_path, data) to hand to write_output themselves.
         Returns a dictionary containing statistics about the operation.
         """
-        if not input_path.exists():
+        if source_bytes is None and not input_path.exists():
             raise FileNotFoundError(f"File not found: {input_path}")
 
-        # Open Image
-        with Image.open(input_path) as img:
+        kept_original = False
+        timer = StageTimer()
+
+        # Open Image (header only)
+        with timer.stage("open"):
+            img, warning = self.open_image(
+                input_path, max_pixels, bomb_policy, source_bytes
+            )
+        with img:
             original_dims = img.size
-            original_size = input_path.stat().st_size
+            if source_bytes is not None:
+                original_size = len(source_bytes)
+            else:
+                original_size = input_path.stat().st_size
 
             # --- 1. Resizing Logic ---
-            if scale:
-                # Resize by percentage
-                new_w = int(original_dims[0] * (scale / 100))
-                new_h = int(original_dims[1] * (scale / 100))
-                img = img.resize((new_w, new_h), resample=LANCZOS)
-            elif max_dim:
-                # Resize strictly by longest side
-                if max(original_dims) > max_dim:
-                    img.thumbnail((max_dim, max_dim), resample=LANCZOS)
+            # The target comes from the header, so the decoder can be told
+            # how much resolution we actually need before any pixels load.
+            target_size = self.get_target_size(original_dims, scale, max_dim)
+
+            with timer.stage("decode"):
+                if target_size and fast_decode:
+                    # No-op for non-JPEG formats
+                    img.draft(
+                        None,
+                        (
+                            int(target_size[0] * self.DRAFT_GAP),
+                            int(target_size[1] * self.DRAFT_GAP),
+                        ),
+                    )
+                img.load()
+
+            if target_size:
+                with timer.stage("resize"):
+                    img = img.resize(
+                        target_size,
+                        resample=LANCZOS,
+                        reducing_gap=self.REDUCING_GAP if fast_decode else None,
+                    )
 
             # --- 2. Format & Mode Logic ---
             # Determine target format based on output filename
-            output_format = output_path.suffix.upper().lstrip(".")
-            if output_format == "JPG":
-                output_format = "JPEG"
+            output_format = self.get_format(output_path)
 
-            # Force JPEG logic or format correction
-            if (force_jpeg or output_format == "JPEG") and img.mode in ["P", "RGBA"]:
-                img = img.convert("RGB")
-                # Ensure path ends in .jpg
+            # A byte budget needs a format with a quality knob
+            if target_bytes and output_format not in self.TARGET_FORMATS:
+                force_jpeg = True
                 output_path = output_path.with_suffix(".jpg")
                 output_format = "JPEG"
 
-            # --- 3. Saving Logic ---
-            if output_format == "JPEG":
-                img.save(output_path, "JPEG", quality=quality, optimize=True)
+            # Force JPEG logic or format correction
+            jpeg_output = force_jpeg or output_format == "JPEG"
+            with timer.stage("convert"):
+                if jpeg_output and img.mode in ["P", "RGBA"]:
+                    img = img.convert("RGB")
+                    # Ensure path ends in .jpg
+                    output_path = output_path.with_suffix(".jpg")
+                    output_format = "JPEG"
+
+                if target_bytes and output_format == "JPEG":
+                    if img.mode not in ["RGB", "L", "CMYK"]:
+                        img = img.convert("RGB")
 
-            elif output_format == "PNG" and quantize_png:
-                # Lossy PNG
-                if img.mode not in ["RGB", "L"]:
-                    img = img.convert("RGBA")
-                quantized = img.quantize(
-                    colors=256, method=2, dither=Image.Dither.FLOYDSTEINBERG
-                )
-                quantized.save(output_path, "PNG", optimize=True)
+            # --- 3. Encoding Logic (in memory) ---
+            fit: Optional[Dict[str, Any]] = None
+            data: Optional[bytes] = None
+            with timer.stage("encode"):
+                if auto_format:
+                    suffix, data = self.pick_format(img, quality)
+                    output_path = output_path.with_suffix(suffix)
 
-            else:
-                # Standard save
-                img.save(output_path, optimize=True)
+                elif target_bytes:
+                    fit = self.fit_to_size(
+                        img, output_format, target_bytes, quality, shrink_to_fit
+                    )
+                    data = fit["data"]
+
+                else:
+                    data = self.encode_image(img, output_format, quality, quantize_png)
+
+            final_dims = fit["dims"] if fit else img.size
+
+            # Never grow: without a resize, an encode no smaller than the
+            # source is shipped as the original bytes instead. Only when the
+            # format may change (auto) or stays the same: --jpeg asks for JPEG.
+            same_format = self.get_format(output_path) == self.get_format(input_path)
+            if (
+                data is not None
+                and len(data) >= original_size
+                and not target_size
+                and (auto_format or same_format)
+            ):
+                data = None
+
+        if data is None:
+            output_path = output_path.with_suffix(input_path.suffix)
+            kept_original = True
+            final_dims = original_dims
+            final_size = original_size
+        else:
+            final_size = len(data)
 
-        # Return stats
-        final_size = output_path.stat().st_size
+        # --- 4. Writing Logic: only the final bytes touch the disk ---
+        if not defer_write:
+            with timer.stage("write"):
+                self.write_output(input_path, output_path, data, link_original)
         reduction_bytes = original_size - final_size
         reduction_pct = (
             (reduction_bytes / original_size) * 100 if original_size > 0 else 0
         )
 
-        return {
+        stats = {
             "file_name": input_path.name,
+            "output_name": output_path.name,
             "original_size": self.get_size_str(original_size),
             "final_size": self.get_size_str(final_size),
             "reduction_pct": round(reduction_pct, 1),
+            # Numeric fields for reports and aggregation
+            "bytes_in": original_size,
+            "bytes_out": final_size,
+            "dims_in": list(original_dims),
+            "dims_out": list(final_dims),
+            "timings": timer.rounded(),
+        }
+        if warning:
+            stats["warning"] = warning
+        if auto_format:
+            stats["format"] = output_path.suffix.lstrip(".").upper()
+        stats["kept_original"] = kept_original
+        if fit:
+            stats["quality"] = fit["quality"]
+            stats["iterations"] = fit["iterations"]
+            stats["target_met"] = fit["target_met"]
+        if defer_write:
+            stats["pending_write"] = (output_path, data)
+        return stats
+
+    def generate_variants(
+        self,
+        input_path: Path,
+        output_dir: Path,
+        widths: List[int],
+        formats: Optional[List[str]] = None,
+        quality: int = 85,
+        quantize_png: bool = False,
+        fast_decode: bool = True,
+        max_pixels: Optional[int] = None,
+        bomb_policy: str = "warn",
+    ) -> Dict[str, Any]:
+        """
+        Decodes a source once and writes one downscaled copy per width,
+        named 'name@640w.jpg', optionally in several formats.
+        Widths at or above the source width are skipped (no upscaling).
+        Returns statistics like process_single_image, plus the output names.
+        """
+        if not input_path.exists():
+            raise FileNotFoundError(f"File not found: {input_path}")
+
+        if formats:
+            suffixes = [self.VARIANT_FORMATS[f.lower()] for f in formats]
+        else:
+            # Keep the source format
+            suffix = input_path.suffix.lower()
+            suffixes = [".jpg" if suffix == ".jpeg" else suffix]
+
+        timer = StageTimer()
+        with timer.stage("open"):
+            img, warning = self.open_image(input_path, max_pixels, bomb_policy)
+        with img:
+            original_size = input_path.stat().st_size
+            src_w, src_h = img.size
+            wanted = sorted({w for w in widths if 0 < w < src_w}, reverse=True)
+
+            # --- 1. One decode, only as large as the biggest variant needs ---
+            with timer.stage("decode"):
+                if wanted and fast_decode:
+                    top_h = max(1, round(src_h * wanted[0] / src_w))
+                    img.draft(
+                        None,
+                        (int(wanted[0] * self.DRAFT_GAP), int(top_h * self.DRAFT_GAP)),
+                    )
+                img.load()
+            decoded = img
+
+            # --- 2. Cascade: biggest first, each from a cheap larger parent ---
+            produced: List[Image.Image] = []
+            output_names: List[str] = []
+            total_bytes = 0
+
+            for width in wanted:
+                height = max(1, round(src_h * width / src_w))
+                parent = decoded
+                for candidate in produced:  # Sorted largest -> smallest
+                    if candidate.size[0] >= width * self.CASCADE_GAP:
+                        parent = candidate
+                with timer.stage("resize"):
+                    variant = parent.resize(
+                        (width, height),
+                        resample=LANCZOS,
+                        reducing_gap=self.REDUCING_GAP if fast_decode else None,
+                    )
+                produced.append(variant)
+
+                # --- 3. Encode every requested format ---
+                for suffix in suffixes:
+                    out_path = output_dir / f"{input_path.stem}@{width}w{suffix}"
+                    out_format = self.get_format(out_path)
+                    out_img = variant
+                    with timer.stage("convert"):
+                        if out_format == "JPEG" and out_img.mode not in ["RGB", "L"]:
+                            out_img = out_img.convert("RGB")
+                    with timer.stage("encode"):
+                        data = self.encode_image(
+                            out_img, out_format, quality, quantize_png
+                        )
+                    with timer.stage("write"):
+                        atomic_write_bytes(out_path, data)
+                    output_names.append(out_path.name)
+                    total_bytes += len(data)
+
+        reduction_pct = (
+            ((original_size - total_bytes) / original_size) * 100
+            if original_size > 0 and output_names
+            else 0
+        )
+        stats = {
+            "file_name": input_path.name,
+            "output_name": output_names[0] if output_names else "",
+            "output_names": output_names,
+            "variants": len(wanted),
+            "original_size": self.get_size_str(original_size),
+            "final_size": self.get_size_str(total_bytes),
+            "reduction_pct": round(reduction_pct, 1),
+            "bytes_in": original_size,
+            "bytes_out": total_bytes,
+            "dims_in": [src_w, src_h],
+            "dims_out": list(produced[0].size) if produced else [src_w, src_h],
+            "timings": timer.rounded(),
         }
+        if warning:
+            stats["warning"] = warning
+        return stats
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+
+class BuildManifest:
+    """
+    Remembers which source files produced which outputs, and with what settings.
+    Lets folder commands skip inputs that haven't changed since the last run.
+    """
+
+    FILE_NAME = ".max_manifest.json"
+    VERSION = 1
+
+    def __init__(self, output_dir: Path, use_hash: bool = False):
+        self.output_dir = output_dir
+        self.path = output_dir / self.FILE_NAME
+        self.use_hash = use_hash
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> "BuildManifest":
+        """Reads the manifest from disk. Missing or corrupt means 'start fresh'."""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return self
+
+        if data.get("version") == self.VERSION:
+            self.entries = data.get("entries", {})
+        return self
+
+    def save(self) -> None:
+        """Writes the manifest atomically so an interrupted run never corrupts it."""
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        payload = {"version": self.VERSION, "entries": self.entries}
+        tmp_path.write_text(json.dumps(payload, indent=1), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def file_hash(path: Path) -> str:
+        """SHA-256 of the file contents, read in 1 MB chunks."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def is_fresh(self, key: str, source: Path, params: Dict[str, Any]) -> bool:
+        """
+        True if 'source' was already built with the same params and its
+        output is still on disk. Counts the result as a hit or a miss.
+        """
+        fresh = self._check(key, source, params)
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return fresh
+
+    def _check(self, key: str, source: Path, params: Dict[str, Any]) -> bool:
+        entry = self.entries.get(key)
+        if not entry or entry.get("params") != params:
+            return False
+
+        # An empty list is a source that legitimately produced nothing
+        outputs = entry.get("outputs")
+        if outputs is None or not all((self.output_dir / o).is_file() for o in outputs):
+            return False
+
+        st = source.stat()
+        if st.st_size != entry["size"]:
+            return False
+        if st.st_mtime_ns == entry["mtime_ns"]:
+            return True
+
+        # mtime changed (e.g. a fresh CI checkout): fall back to the content hash
+        if self.use_hash and entry.get("hash"):
+            if self.file_hash(source) == entry["hash"]:
+                entry["mtime_ns"] = st.st_mtime_ns
+                return True
+        return False
+
+    def _live_outputs(self) -> Set[str]:
+        return {o for entry in self.entries.values() for o in entry.get("outputs", [])}
+
+    def _delete_outputs(self, names: Iterable[str]) -> List[str]:
+        """Deletes outputs that no remaining source still writes to."""
+        live = self._live_outputs()
+        removed = []
+        for name in names:
+            # Outputs are files; never touch the output folder or a subfolder
+            if not name or name in live or not (self.output_dir / name).is_file():
+                continue
+            try:
+                (self.output_dir / name).unlink()
+                removed.append(name)
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def record(
+        self, key: str, source: Path, output_names: List[str], params: Dict[str, Any]
+    ) -> None:
+        """Stores the state of a source file that was just built successfully."""
+        previous = self.entries.pop(key, {}).get("outputs", [])
+        # Settings changed the output names (e.g. --jpeg, --variants): drop
+        # the old files so they don't linger
+        self._delete_outputs(o for o in previous if o not in output_names)
+
+        st = source.stat()
+        self.entries[key] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "hash": self.file_hash(source) if self.use_hash else None,
+            "outputs": list(output_names),
+            "params": params,
+        }
+
+    def prune(
+        self, current_keys: Iterable[str], source_root: Optional[Path] = None
+    ) -> List[str]:
+        """
+        Forgets sources that no longer exist and deletes their outputs.
+        With source_root, a key outside this scan (narrower --include, no
+        -r...) is kept as long as its source file is still there.
+        Returns the list of removed output names.
+        """
+        current = set(current_keys)
+        stale = [
+            key
+            for key in self.entries
+            if key not in current
+            and not (source_root is not None and (source_root / key).is_file())
+        ]
+        stale_outputs = [o for key in stale for o in self.entries.pop(key)["outputs"]]
+        return self._delete_outputs(stale_outputs)
@@ -1,8 +1,49 @@
 import fitz  # PyMuPDF
+import hashlib
+import os
+import re
+import shutil
 from pathlib import Path
-from typing import List 
-from PIL import Image
+from typing import Any, Callable, Dict, List, Optional
+from PIL import Image, ImageChops, features
 import io
+import zlib
+
+from max_cli.common.parallel import run_tasks
+from max_cli.common.timing import StageTimer, peak_rss_mb
+from max_cli.common.utils import temp_sibling
+from max_cli.core.pdf_writer import ImagePDFWriter
+
+# Per-process handle for _render_range, so a worker opens each PDF once
+# rather than once per chunk
+_worker_doc: Dict[str, Any] = {}
+
+
+def _render_range(
+    input_path: str,
+    start: int,
+    stop: int,
+    dpi: int,
+    quality: int,
+    detect_gray: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Worker side of a parallel compress: renders and encodes pages
+    [start, stop) with this process's own fitz handle.
+    """
+    if _worker_doc.get("path") != input_path:
+        if _worker_doc.get("doc") is not None:
+            _worker_doc["doc"].close()
+        _worker_doc.update(path=input_path, doc=fitz.open(input_path))
+    doc = _worker_doc["doc"]
+
+    engine = PDFEngine()
+    pages = []
+    for page_index in range(start, stop):
+        page = doc.load_page(page_index)
+        pages.append(engine.encode_page(page, dpi, quality, detect_gray))
+        fitz.TOOLS.store_shrink(100)
+    return pages
 
 
 class PDFEngine:
@@ -10,73 +51,640 @@ class PDFEngine:
     Core logic for PDF manipulation using PyMuPDF and Pillow.
     """
 
-    def merge_pdfs(self, input_paths: List[Path], output_path: Path) -> None:
+    # Pages per work unit in a parallel compress: small enough to spread a
+    # short document over every worker and to keep out-of-order buffering low
+    CHUNK_PAGES = 8
+
+    # Merge: flush the growing document to disk after this many inputs (or
+    # bytes of input), so memory doesn't scale with the size of the merge
+    MERGE_FLUSH_FILES = 100
+    MERGE_FLUSH_BYTES = 256 * 1024 * 1024
+    DEDUPE_MAX_PASSES = 8
+    REF_PATTERN = re.compile(r"\b(\d+) 0 R\b")
+    # Resource kinds whose objects dedupe may share between pages
+    RESOURCE_KEYS = ("Font", "XObject", "ColorSpace")
+    # Never merged even if reached from a resource: each one is tied to its
+    # own page or place (annotations, widgets, outline items, tagged structure)
+    UNSHARED_PATTERN = re.compile(
+        r"/Type/(Page|Pages|Annot|StructElem|Outlines)\b"
+        r"|/Subtype/(Link|Widget)\b|/Title\b"
+    )
+
+    # raster: every page becomes a JPEG (best for scans)
+    # smart: only oversized embedded images are recompressed (mixed documents)
+    COMPRESS_MODES = ("raster", "smart")
+    # Smart mode leaves images alone unless they exceed the target DPI by this
+    # factor; a small overshoot isn't worth a lossy re-encode
+    SMART_DPI_MARGIN = 1.2
+    # Integer pre-reduction before the LANCZOS pass when downsampling an
+    # image (same value as ImageEngine.REDUCING_GAP)
+    REDUCING_GAP = 3.0
+
+    # Page colour analysis (raster mode). A page counts as gray when fewer
+    # than COLOR_FRACTION of its pixels have channels more than
+    # GRAY_TOLERANCE apart (scanners tint white paper a little). A gray page
+    # is bilevel when midtones stay under BILEVEL_MAX_MIDTONES of the page
+    # and under BILEVEL_EDGE_RATIO times the dark pixels: anti-aliased text
+    # edges qualify, a gray photo or shading doesn't.
+    GRAY_TOLERANCE = 24
+    COLOR_FRACTION = 0.001
+    BILEVEL_MAX_MIDTONES = 0.06
+    BILEVEL_EDGE_RATIO = 0.75
+
+    def merge_pdfs(
+        self,
+        input_paths: List[Path],
+        output_path: Path,
+        dedupe: bool = True,
+        bookmarks: bool = False,
+        on_file: Optional[Callable[[int, int], None]] = None,
+    ) -> Dict[str, Any]:
         """
         Combines multiple PDF files into one.
+
+        Large merges are flushed to a temp file every MERGE_FLUSH_FILES
+        inputs (or MERGE_FLUSH_BYTES of input) and reopened, so pages
+        already merged are read back lazily instead of piling up in memory.
+        With dedupe, identical streams (fonts, logos, ICC profiles) shared
+        by many inputs are stored once; see dedupe_objects.
+        With bookmarks, each input gets a top-level outline entry holding
+        its own outline.
+        Returns page/dedup counts plus per-phase seconds and peak RSS (MB).
+        """
+        timer = StageTimer()
+        peak_mb: Dict[str, Optional[float]] = {}
+        work_path = temp_sibling(output_path)
+        toc: List[list] = []
+        # The document currently open (None between close and reopen)
+        result: Optional["fitz.Document"] = fitz.open()
+        flushed = False
+        pending_bytes = pending_files = 0
+
+        try:
+            # --- 1. Insert, flushing to disk in batches ---
+            with timer.stage("insert"):
+                for number, path in enumerate(input_paths, start=1):
+                    if not path.exists():
+                        raise FileNotFoundError(f"File not found: {path}")
+
+                    with fitz.open(path) as src:
+                        if bookmarks:
+                            first_page = len(result) + 1
+                            toc.append([1, path.stem, first_page])
+                            toc.extend(
+                                [level + 1, title, page + first_page - 1]
+                                for level, title, page in src.get_toc(simple=True)
+                            )
+                        result.insert_pdf(src)
+
+                    pending_files += 1
+                    pending_bytes += path.stat().st_size
+                    if (
+                        pending_files >= self.MERGE_FLUSH_FILES
+                        or pending_bytes >= self.MERGE_FLUSH_BYTES
+                    ):
+                        if flushed:
+                            result.saveIncr()
+                        else:
+                            result.save(work_path)
+                            flushed = True
+                        result.close()
+                        result = None
+                        result = fitz.open(work_path)
+                        pending_files = pending_bytes = 0
+
+                    if on_file:
+                        on_file(number, len(input_paths))
+            peak_mb["insert"] = peak_rss_mb()
+
+            # --- 2. Dedupe identical streams ---
+            removed = {"objects": 0, "bytes": 0}
+            if dedupe:
+                with timer.stage("dedupe"):
+                    removed = self.dedupe_objects(result)
+                peak_mb["dedupe"] = peak_rss_mb()
+
+            # --- 3. Outline + final write ---
+            with timer.stage("save"):
+                if bookmarks:
+                    result.set_toc(toc)
+                # garbage=2 drops the now unreferenced duplicates and compacts
+                # the xref. Levels 3-4 would search for duplicates again,
+                # comparing objects pairwise, which is what makes them slow.
+                final_tmp = temp_sibling(work_path)
+                result.save(final_tmp, garbage=2 if dedupe else 4, deflate=True)
+                pages = len(result)
+                result.close()
+                result = None
+                os.replace(final_tmp, output_path)
+            peak_mb["save"] = peak_rss_mb()
+        except BaseException:
+            if result is not None:
+                result.close()
+            temp_sibling(work_path).unlink(missing_ok=True)
+            raise
+        finally:
+            work_path.unlink(missing_ok=True)
+
+        return {
+            "files": len(input_paths),
+            "pages": pages,
+            "objects_deduped": removed["objects"],
+            "bytes_deduped": removed["bytes"],
+            "timings": timer.rounded(),
+            "peak_rss_mb": peak_mb,
+        }
+
+    def _reachable(self, doc: "fitz.Document", roots: set) -> set:
+        """Every object reachable from 'roots', without walking into pages."""
+        seen = set()
+        stack = list(roots)
+        while stack:
+            xref = stack.pop()
+            if xref in seen or not 0 < xref < doc.xref_length():
+                continue
+            definition = doc.xref_object(xref, compressed=True)
+            if "/Type/Page" in definition:  # /Page and /Pages (e.g. an annot's /P)
+                continue
+            seen.add(xref)
+            stack.extend(int(ref) for ref in self.REF_PATTERN.findall(definition))
+        return seen
+
+    def _shareable_xrefs(self, doc: "fitz.Document") -> set:
+        """
+        The objects dedupe may merge: whatever hangs off a /Font, /XObject or
+        /ColorSpace resource (font programs and descriptors, images, ICC
+        streams and colour-space arrays), minus anything an annotation
+        reaches. Annotations, outline items and structure elements belong
+        to one spot in the document, so two identical ones stay two.
+        """
+        resources, annots = set(), set()
+        for xref in range(1, doc.xref_length()):
+            definition = doc.xref_object(xref, compressed=True)
+            if "/Annots" in definition:
+                _, value = doc.xref_get_key(xref, "Annots")
+                annots.update(int(ref) for ref in self.REF_PATTERN.findall(value))
+            for key in self.RESOURCE_KEYS:
+                if f"/{key}" not in definition:
+                    continue
+                for path in (key, f"Resources/{key}"):
+                    kind, value = doc.xref_get_key(xref, path)
+                    if kind in ("xref", "dict"):
+                        resources.update(
+                            int(ref) for ref in self.REF_PATTERN.findall(value)
+                        )
+        return self._reachable(doc, resources) - self._reachable(doc, annots)
+
+    def dedupe_objects(self, doc: "fitz.Document") -> Dict[str, int]:
+        """
+        Points every reference to a duplicate resource at one canonical copy.
+
+        Only resources are candidates (see _shareable_xrefs): merging two
+        identical link annotations would make one link sit on two pages.
+        Objects are keyed by a hash of their definition (plus the raw bytes
+        for streams), so each pass is linear; MuPDF's own garbage=3/4
+        compares objects pairwise. Merged inputs rarely share a font or
+        logo byte for byte at the top level: the image points at a color
+        space array, which points at an ICC stream, and each input has its
+        own copies. So passes repeat, and each one merges the next level
+        up, until nothing new merges.
+        The orphans are dropped by the next save(garbage>=1).
+        Returns how many objects and stream bytes were made redundant.
         """
-        result_pdf = fitz.open()
+        removed = {"objects": 0, "bytes": 0}
+        shareable = self._shareable_xrefs(doc)
+        dropped = set()
+
+        for _ in range(self.DEDUPE_MAX_PASSES):
+            canonical: Dict[bytes, int] = {}
+            remap: Dict[int, int] = {}
+            for xref in sorted(shareable - dropped):
+                definition = doc.xref_object(xref, compressed=True)
+                if self.UNSHARED_PATTERN.search(definition):
+                    continue
+                digest = hashlib.sha256(definition.encode())
+                raw = b""
+                if doc.xref_is_stream(xref):
+                    raw = doc.xref_stream_raw(xref)
+                    digest.update(raw)
+                first = canonical.setdefault(digest.digest(), xref)
+                if first != xref:
+                    remap[xref] = first
+                    removed["objects"] += 1
+                    removed["bytes"] += len(raw)
+            if not remap:
+                break
+            dropped.update(remap)
+
+            def swap(match: "re.Match[str]") -> str:
+                target = remap.get(int(match.group(1)))
+                return f"{target} 0 R" if target else match.group(0)
 
-        for path in input_paths:
-            if not path.exists():
-                raise FileNotFoundError(f"File not found: {path}")
+            for xref in range(1, doc.xref_length()):
+                if xref in dropped:
+                    continue
+                source = doc.xref_object(xref, compressed=True)
+                if self.REF_PATTERN.sub(swap, source) == source:
+                    continue
+                if not doc.xref_is_stream(xref):
+                    doc.update_object(xref, self.REF_PATTERN.sub(swap, source))
+                    continue
+                # update_object() would drop the data of a stream that
+                # lives in a file (i.e. after a flush), so patch key by key
+                for key in doc.xref_get_keys(xref):
+                    _, value = doc.xref_get_key(xref, key)
+                    updated = self.REF_PATTERN.sub(swap, value)
+                    if updated != value:
+                        doc.xref_set_key(xref, key, updated)
 
-            # Open source PDF
-            with fitz.open(path) as src:
-                result_pdf.insert_pdf(src)
+        return removed
+
+    def render_page(self, page: "fitz.Page", dpi: int) -> Image.Image:
+        """
+        Rasterizes a page and copies the pixmap's samples straight into a PIL
+        image (no PPM encode/decode round trip).
+        """
+        pix = page.get_pixmap(dpi=dpi, alpha=False)
+        return self._pixmap_to_pil(pix, "RGB")
+
+    @staticmethod
+    def _pixmap_to_pil(pix: "fitz.Pixmap", mode: str) -> Image.Image:
+        # One copy out of the pixmap, on purpose. A zero-copy image would have
+        # to keep the pixmap alive with it, and PyMuPDF can't free a pixmap
+        # while a view of its samples is exported (BufferError in __del__).
+        # This replaces the samples -> bytes -> frombytes double copy.
+        view = Image.frombuffer(
+            mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1
+        )
+        return view.copy()
+
+    def classify_page(self, img: Image.Image, gray: Image.Image) -> str:
+        """
+        Says whether a rendered page is 'color', 'gray' or 'bilevel'.
+        'gray' is the page already converted to L (the encoders need it too).
+        """
+        # Color shows up just as well at quarter size, for 1/16 of the work
+        small = img.reduce(4) if min(img.size) >= 64 else img
+        pixels = small.width * small.height
+        red, green, blue = small.split()
+        chroma = ImageChops.lighter(
+            ImageChops.difference(red, green), ImageChops.difference(green, blue)
+        )
+        colorful = sum(chroma.histogram()[self.GRAY_TOLERANCE :])
+        if colorful > pixels * self.COLOR_FRACTION:
+            return "color"
 
-        # Garbage=4 removes unused objects to keep file size small
-        result_pdf.save(output_path, garbage=4, deflate=True)
-        result_pdf.close()
+        # Midtones need full resolution: downscaling turns edges into gray
+        pixels = gray.width * gray.height
+        levels = gray.histogram()
+        dark, midtones = sum(levels[:64]), sum(levels[64:192])
+        if (
+            midtones <= pixels * self.BILEVEL_MAX_MIDTONES
+            and midtones <= dark * self.BILEVEL_EDGE_RATIO
+        ):
+            return "bilevel"
+        return "gray"
+
+    def encode_bilevel(self, gray: Image.Image) -> Dict[str, Any]:
+        """
+        Thresholds a gray page to 1 bit per pixel and compresses it with
+        CCITT G4 (when Pillow has libtiff) or Flate, whichever is smaller.
+        """
+        mono = gray.convert("1", dither=Image.Dither.NONE)
+        width, height = mono.size
+        best = {
+            "data": zlib.compress(mono.tobytes()),
+            "image_filter": "FlateDecode",
+            "decode_parms": "",
+        }
+
+        if features.check("libtiff"):
+            buffer = io.BytesIO()
+            # One strip, so the TIFF payload is a plain G4 stream
+            mono.save(buffer, "TIFF", compression="group4", tiffinfo={278: height})
+            with Image.open(buffer) as tiff:
+                offset, length = tiff.tag_v2[273][0], tiff.tag_v2[279][0]
+            g4 = buffer.getvalue()[offset : offset + length]
+            if len(g4) < len(best["data"]):
+                best = {
+                    "data": g4,
+                    "image_filter": "CCITTFaxDecode",
+                    "decode_parms": (
+                        f"/DecodeParms << /K -1 /Columns {width} /Rows {height} "
+                        f"/BlackIs1 true >> "
+                    ),
+                }
+
+        best.update(size_px=mono.size, colorspace="DeviceGray", bits=1)
+        return best
+
+    def encode_page(
+        self,
+        page: "fitz.Page",
+        dpi: int,
+        quality: int,
+        detect_gray: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Renders one page and encodes it in memory: color JPEG, 8-bit gray
+        JPEG or 1-bit, depending on what the page actually contains.
+        Returns the ImagePDFWriter.add_page arguments (minus dpi).
+        """
+        img = self.render_page(page, dpi)
+        kind = "color"
+        if detect_gray:
+            gray = img.convert("L")
+            kind = self.classify_page(img, gray)
+
+        if kind == "bilevel":
+            return self.encode_bilevel(gray)
+
+        colorspace = "DeviceRGB"
+        if kind == "gray":
+            img = gray
+            colorspace = "DeviceGray"
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=quality, optimize=True)
+        return {
+            "data": buffer.getvalue(),
+            "size_px": img.size,
+            "colorspace": colorspace,
+        }
 
     def compress_pdf(
-        self, input_path: Path, output_path: Path, dpi: int = 150, quality: int = 80
+        self,
+        input_path: Path,
+        output_path: Path,
+        dpi: int = 150,
+        quality: int = 80,
+        workers: int = 1,
+        on_page: Optional[Callable[[int, int], None]] = None,
+        mode: str = "raster",
+        detect_gray: bool = True,
     ) -> int:
         """
         Compresses a PDF by rasterizing pages to JPEG and rebuilding the PDF.
+        Pages are streamed: each one is rendered, encoded and written to the
+        output before the next is touched, so memory stays flat however
+        long the document is.
+        With workers > 1, page ranges are rendered by separate processes and
+        written back in order. on_page(done, total) is called per page.
+        With detect_gray, pages without real color are stored as gray JPEG,
+        and text-like pages as 1-bit images (see classify_page).
+        mode="smart" hands over to smart_compress_pdf (single process).
         Returns the number of pages processed.
         """
+        if mode not in self.COMPRESS_MODES:
+            raise ValueError(f"Unknown compress mode '{mode}'.")
+        if mode == "smart":
+            result = self.smart_compress_pdf(
+                input_path, output_path, dpi, quality, on_page=on_page
+            )
+            return result["pages"]
+
         if not input_path.exists():
             raise FileNotFoundError(f"File not found: {input_path}")
 
-        doc = fitz.open(input_path)
-        page_count = len(doc)
+        with fitz.open(input_path) as doc:
+            page_count = len(doc)
+            if page_count == 0:
+                raise ValueError("PDF was empty or could not be read.")
 
-        # We will store PIL Images in memory before saving
-        # WARNING: For massive PDFs (500+ pages), this approach consumes RAM.
-        # For a CLI tool, it's usually acceptable, but strictly scalable systems
-        # might write temp files to disk. We'll use memory for speed here.
-        img_list = []
+            with ImagePDFWriter(output_path) as writer:
 
-        for page_index in range(page_count):
-            page = doc.load_page(page_index)
+                def write(page: Dict[str, Any]) -> None:
+                    writer.add_page(dpi=dpi, **page)
+                    if on_page:
+                        on_page(len(writer.pages), page_count)
 
-            # 1. Render page to image (PixMap)
-            pix = page.get_pixmap(dpi=dpi)
+                if workers <= 1:
+                    for page in doc:
+                        write(self.encode_page(page, dpi, quality, detect_gray))
+                        # MuPDF caches every decoded page image (up to
+                        # 256 MB); each page is rendered once, so drop them
+                        fitz.TOOLS.store_shrink(100)
+                else:
+                    self._compress_parallel(
+                        input_path,
+                        page_count,
+                        dpi,
+                        quality,
+                        detect_gray,
+                        workers,
+                        write,
+                    )
 
-            # 2. Convert to PIL Image
-            img_data = pix.tobytes("ppm")
-            img = Image.open(io.BytesIO(img_data))
+        return page_count
 
-            # 3. Ensure RGB for JPEG
-            if img.mode != "RGB":
-                img = img.convert("RGB")
+    def _compress_parallel(
+        self,
+        input_path: Path,
+        page_count: int,
+        dpi: int,
+        quality: int,
+        detect_gray: bool,
+        workers: int,
+        write: Callable[[Dict[str, Any]], None],
+    ) -> None:
+        """
+        Fans page ranges out to a process pool. Chunks finish in any order;
+        they are held until every earlier chunk is written. run_tasks keeps
+        only a few chunks in flight, so that buffer stays small.
+        """
+        chunk = max(1, min(self.CHUNK_PAGES, -(-page_count // workers)))
+        ranges = (
+            {
+                "input_path": str(input_path),
+                "start": start,
+                "stop": min(start + chunk, page_count),
+                "dpi": dpi,
+                "quality": quality,
+                "detect_gray": detect_gray,
+            }
+            for start in range(0, page_count, chunk)
+        )
 
-            img_list.append(img)
+        ready: Dict[int, List[Dict[str, Any]]] = {}
+        next_chunk = 0
+        for index, pages, error in run_tasks(_render_range, ranges, workers=workers):
+            if error is not None:
+                raise error
+            ready[index] = pages
+            while next_chunk in ready:
+                for page in ready.pop(next_chunk):
+                    write(page)
+                next_chunk += 1
 
-        doc.close()
+    def _image_to_pil(self, doc: "fitz.Document", xref: int) -> Image.Image:
+        """Decodes an image XObject into a PIL image (gray or RGB)."""
+        pix = fitz.Pixmap(doc, xref)
+        if pix.alpha:
+            pix = fitz.Pixmap(pix, 0)  # Drop alpha; the soft mask stays separate
+        if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+            pix = fitz.Pixmap(fitz.csRGB, pix)  # CMYK, Lab, indexed...
+        return self._pixmap_to_pil(pix, "L" if pix.n == 1 else "RGB")
 
-        if not img_list:
-            raise ValueError("PDF was empty or could not be read.")
+    def smart_compress_pdf(
+        self,
+        input_path: Path,
+        output_path: Path,
+        dpi: int = 150,
+        quality: int = 80,
+        on_page: Optional[Callable[[int, int], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Compresses a PDF without flattening it.
+        Embedded images shown at more than 'dpi' are downsampled to it and
+        re-encoded as JPEG (only if that's smaller); text and vector content
+        are left alone, so the output stays sharp and searchable. Images with
+        a soft mask (transparency) are left alone too.
+        A page is rasterized only if it has no text and the raster is smaller
+        than what the page already stores.
+        Returns the page count plus how many images and pages were replaced.
+        """
+        if not input_path.exists():
+            raise FileNotFoundError(f"File not found: {input_path}")
 
-        # 4. Save first image and append the rest as a PDF
-        img_list[0].save(
-            output_path,
-            "PDF",
-            resolution=float(dpi),
-            save_all=True,
-            append_images=img_list[1:],
-            quality=quality,
-            optimize=True,
-        )
+        # Above this, downsampling is worth a re-encode
+        threshold_dpi = dpi * self.SMART_DPI_MARGIN
+        done_xrefs = set()
+        images_replaced = 0
+        rasterized = 0
 
-        return page_count
+        with fitz.open(input_path) as doc:
+            page_count = len(doc)
+            if page_count == 0:
+                raise ValueError("PDF was empty or could not be read.")
+
+            for page_index in range(page_count):
+                page = doc.load_page(page_index)
+
+                # --- 1. Recompress oversized images (each XObject once) ---
+                for info in page.get_images(full=True):
+                    xref, smask, width, _, bpc = info[:5]
+                    if xref in done_xrefs or bpc == 1 or smask:
+                        # Already handled, bilevel (JPEG won't help), or with
+                        # a soft mask, which replace_image() would drop
+                        continue
+                    done_xrefs.add(xref)
+
+                    rects = page.get_image_rects(xref)
+                    shown_inches = max((r.width for r in rects), default=0) / 72
+                    if shown_inches <= 0:
+                        continue
+                    effective_dpi = width / shown_inches
+                    if effective_dpi <= threshold_dpi:
+                        continue
+
+                    img = self._image_to_pil(doc, xref)
+                    ratio = dpi / effective_dpi
+                    img = img.resize(
+                        (
+                            max(1, round(img.width * ratio)),
+                            max(1, round(img.height * ratio)),
+                        ),
+                        resample=Image.LANCZOS,
+                        reducing_gap=self.REDUCING_GAP,
+                    )
+                    buffer = io.BytesIO()
+                    img.save(buffer, "JPEG", quality=quality, optimize=True)
+                    if buffer.tell() < len(doc.xref_stream_raw(xref)):
+                        page.replace_image(xref, stream=buffer.getvalue())
+                        images_replaced += 1
+
+                # --- 2. Textless pages: rasterize if that's smaller ---
+                if not page.get_text("text").strip():
+                    stored = len(page.read_contents()) + sum(
+                        len(doc.xref_stream_raw(info[0]))
+                        for info in page.get_images(full=True)
+                    )
+                    # Colour or gray JPEG only: insert_image() needs an image
+                    # file, and the bilevel encoding is a bare G4/Flate stream
+                    raster = self.encode_page(page, dpi, quality, detect_gray=False)
+                    # Needs a clear win: a near tie isn't worth replacing the page
+                    if len(raster["data"]) < stored * 0.9:
+                        rect = page.rect
+                        doc.delete_page(page_index)
+                        new_page = doc.new_page(page_index, rect.width, rect.height)
+                        new_page.insert_image(new_page.rect, stream=raster["data"])
+                        rasterized += 1
+
+                fitz.TOOLS.store_shrink(100)
+                if on_page:
+                    on_page(page_index + 1, page_count)
+
+            # garbage=3 drops the image streams that were replaced
+            tmp_path = temp_sibling(output_path)
+            try:
+                doc.save(tmp_path, garbage=3, deflate=True)
+                os.replace(tmp_path, output_path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+
+        return {
+            "pages": page_count,
+            "images_replaced": images_replaced,
+            "pages_rasterized": rasterized,
+        }
+
+    def compress_file(
+        self,
+        input_path: Path,
+        output_path: Path,
+        dpi: int = 150,
+        quality: int = 80,
+        mode: str = "raster",
+        detect_gray: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        One file of a folder compress (runs inside a worker process).
+        If the result isn't smaller than the source, the source is copied
+        instead, so a batch never makes a file bigger.
+        Returns per-file stats in the shape the results table expects.
+        """
+        timer = StageTimer()
+        with timer.stage("compress"):
+            if mode == "smart":
+                result = self.smart_compress_pdf(input_path, output_path, dpi, quality)
+                pages = result["pages"]
+            else:
+                pages = self.compress_pdf(
+                    input_path, output_path, dpi, quality, detect_gray=detect_gray
+                )
+
+        bytes_in = input_path.stat().st_size
+        bytes_out = output_path.stat().st_size
+        kept_original = bytes_out >= bytes_in
+        if kept_original:
+            tmp_path = temp_sibling(output_path)
+            try:
+                shutil.copyfile(input_path, tmp_path)
+                os.replace(tmp_path, output_path)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
+            bytes_out = bytes_in
+
+        reduction_pct = (bytes_in - bytes_out) / bytes_in * 100 if bytes_in else 0
+        return {
+            "file_name": input_path.name,
+            "pages": pages,
+            "bytes_in": bytes_in,
+            "bytes_out": bytes_out,
+            "reduction_pct": round(reduction_pct, 1),
+            "kept_original": kept_original,
+            "timings": timer.rounded(),
+        }
+
+    def extract_text(self, input_path: Path) -> List[str]:
+        """
+        Plain text of every page, in order (runs inside a worker process).
+        Image-only pages come back empty; there is no OCR.
+        """
+        with fitz.open(input_path) as doc:
+            if doc.needs_pass:
+                raise ValueError("PDF is password protected.")
+            pages = [page.get_text("text") for page in doc]
+        fitz.TOOLS.store_shrink(100)
+        return pages
@@ -0,0 +1,179 @@
+import os
+import re
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+# FTS rowids pack (file id, page): rowid = file_id << PAGE_BITS | page index.
+# A file's pages then form one rowid range, which deletes cheaply.
+PAGE_BITS = 20
+
+
+def to_match_query(text: str) -> str:
+    """
+    Turns what a user types into an FTS5 MATCH expression.
+    Quoted parts stay phrases, every other word must appear somewhere on the
+    page: 'net 30 "late fee"' -> '"net" "30" "late fee"'. Punctuation can't
+    break the query syntax because every term ends up quoted.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        term = (phrase or word).replace('"', "").strip()
+        if term:
+            terms.append(f'"{term}"')
+    return " ".join(terms)
+
+
+class PDFTextIndex:
+    """
+    Local full-text index over a folder of PDFs (SQLite FTS5, one row per
+    page). Files are keyed by path relative to the folder; a file is only
+    re-extracted when its size or mtime changes.
+    """
+
+    FILE_NAME = ".max_pdf_index.sqlite"
+    VERSION = 1
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version != self.VERSION:
+            # Unknown layout: start fresh rather than misread it
+            self.db.executescript(
+                "DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS pages;"
+            )
+        self.db.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                page_count INTEGER NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(
+                text, tokenize = 'unicode61 remove_diacritics 2'
+            );
+            PRAGMA user_version = {self.VERSION};
+            """
+        )
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> "PDFTextIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def known_files(self) -> Dict[str, Tuple[int, int, int]]:
+        """{relative path: (id, size, mtime_ns)} for every indexed file."""
+        return {
+            path: (file_id, size, mtime_ns)
+            for file_id, path, size, mtime_ns in self.db.execute(
+                "SELECT id, path, size, mtime_ns FROM files"
+            )
+        }
+
+    def _drop_pages(self, file_id: int) -> None:
+        self.db.execute(
+            "DELETE FROM pages WHERE rowid BETWEEN ? AND ?",
+            (file_id << PAGE_BITS, ((file_id + 1) << PAGE_BITS) - 1),
+        )
+
+    def store(self, key: str, st: os.stat_result, pages: List[str]) -> None:
+        """Replaces the text of one file (call commit() to persist)."""
+        if len(pages) >= 1 << PAGE_BITS:
+            raise ValueError(f"{key}: too many pages to index ({len(pages)}).")
+        row = self.db.execute("SELECT id FROM files WHERE path = ?", (key,)).fetchone()
+        if row:
+            file_id = row[0]
+            self._drop_pages(file_id)
+            self.db.execute(
+                "UPDATE files SET size = ?, mtime_ns = ?, page_count = ? "
+                "WHERE id = ?",
+                (st.st_size, st.st_mtime_ns, len(pages), file_id),
+            )
+        else:
+            file_id = self.db.execute(
+                "INSERT INTO files (path, size, mtime_ns, page_count) "
+                "VALUES (?, ?, ?, ?)",
+                (key, st.st_size, st.st_mtime_ns, len(pages)),
+            ).lastrowid
+        self.db.executemany(
+            "INSERT INTO pages (rowid, text) VALUES (?, ?)",
+            (
+                ((file_id << PAGE_BITS) | number, text)
+                for number, text in enumerate(pages)
+                if text.strip()
+            ),
+        )
+
+    def remove(self, keys: Iterable[str]) -> int:
+        """Forgets files that are gone. Returns how many were removed."""
+        removed = 0
+        for key in keys:
+            row = self.db.execute(
+                "SELECT id FROM files WHERE path = ?", (key,)
+            ).fetchone()
+            if row:
+                self._drop_pages(row[0])
+                self.db.execute("DELETE FROM files WHERE id = ?", (row[0],))
+                removed += 1
+        return removed
+
+    def commit(self) -> None:
+        self.db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        files, pages = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(page_count), 0) FROM files"
+        ).fetchone()
+        return {"files": files, "pages": pages}
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        raw: bool = False,
+        highlight: Tuple[str, str] = ("[", "]"),
+    ) -> List[Dict[str, object]]:
+        """
+        Best-matching pages first (BM25). Each hit has the file's relative
+        path, a 1-based page number, the score and a snippet with the
+        matches wrapped in 'highlight'. With raw, 'query' is passed to FTS5
+        as is (NEAR, OR, prefix*); otherwise see to_match_query.
+        """
+        match = query if raw else to_match_query(query)
+        if not match:
+            return []
+        rows = self.db.execute(
+            """
+            SELECT files.path, pages.rowid, bm25(pages),
+                   snippet(pages, 0, ?, ?, '…', 12)
+            FROM pages JOIN files ON files.id = pages.rowid >> ?
+            WHERE pages MATCH ?
+            ORDER BY bm25(pages)
+            LIMIT ?
+            """,
+            (*highlight, PAGE_BITS, match, limit),
+        )
+        return [
+            {
+                "file": path,
+                "page": (rowid & ((1 << PAGE_BITS) - 1)) + 1,
+                "score": round(-score, 3),
+                "snippet": " ".join(snippet.split()),
+            }
+            for path, rowid, score, snippet in rows
+        ]
+
+    def optimize(self) -> None:
+        """Merges FTS segments; worth it after a large (re)index."""
+        self.db.execute("INSERT INTO pages (pages) VALUES ('optimize')")
+        self.db.commit()
+
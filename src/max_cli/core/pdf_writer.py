@@ -0,0 +1,118 @@
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from max_cli.common.utils import temp_sibling
+
+
+class ImagePDFWriter:
+    """
+    Streams image-only pages straight into a PDF file.
+
+    Each page (an already encoded image stream plus a tiny content stream) is
+    written as soon as it is added, so memory holds one page at a time no
+    matter how long the document gets. Only the byte offsets are kept, for
+    the cross-reference table written on close(). The file is built under a
+    temp name and moved into place at the end, so a failed run leaves
+    nothing behind.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._tmp_path = temp_sibling(path)
+        self._file = open(self._tmp_path, "wb")
+        # offsets[n] = byte position of object n (0 is the free-list head)
+        self._offsets: List[int] = [0, 0, 0]
+        self.pages: List[int] = []
+
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        # 1 = catalog, 2 = page tree (written last, once all kids are known)
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    def _write_object(
+        self, number: int, body: bytes, stream: Optional[bytes] = None
+    ) -> None:
+        self._offsets[number] = self._file.tell()
+        self._file.write(f"{number} 0 obj\n".encode() + body)
+        if stream is not None:
+            self._file.write(b"\nstream\n")
+            self._file.write(stream)
+            self._file.write(b"\nendstream")
+        self._file.write(b"\nendobj\n")
+
+    def _reserve(self) -> int:
+        self._offsets.append(0)
+        return len(self._offsets) - 1
+
+    def add_page(
+        self,
+        data: bytes,
+        size_px: Tuple[int, int],
+        dpi: float,
+        colorspace: str = "DeviceRGB",
+        bits: int = 8,
+        image_filter: str = "DCTDecode",
+        decode_parms: str = "",
+    ) -> None:
+        """
+        Appends one page showing an encoded image, sized so the image lands
+        at 'dpi' (a 1275 px wide scan at 150 DPI makes an 8.5 inch page).
+        """
+        width_px, height_px = size_px
+        width_pt = width_px * 72.0 / dpi
+        height_pt = height_px * 72.0 / dpi
+
+        image_no, content_no, page_no = (self._reserve() for _ in range(3))
+        image_dict = (
+            f"<< /Type /XObject /Subtype /Image /Width {width_px} "
+            f"/Height {height_px} /ColorSpace /{colorspace} "
+            f"/BitsPerComponent {bits} /Filter /{image_filter} "
+            f"{decode_parms}/Length {len(data)} >>"
+        )
+        self._write_object(image_no, image_dict.encode(), data)
+
+        content = f"q {width_pt:.4f} 0 0 {height_pt:.4f} 0 0 cm /Im0 Do Q".encode()
+        length = f"<< /Length {len(content)} >>".encode()
+        self._write_object(content_no, length, content)
+
+        page = (
+            f"<< /Type /Page /Parent 2 0 R "
+            f"/MediaBox [0 0 {width_pt:.4f} {height_pt:.4f}] "
+            f"/Resources << /XObject << /Im0 {image_no} 0 R >> >> "
+            f"/Contents {content_no} 0 R >>"
+        )
+        self._write_object(page_no, page.encode())
+        self.pages.append(page_no)
+
+    def close(self) -> int:
+        """Writes the page tree and xref, then moves the file into place."""
+        kids = " ".join(f"{n} 0 R" for n in self.pages)
+        self._write_object(
+            2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode()
+        )
+
+        xref_at = self._file.tell()
+        lines = [f"xref\n0 {len(self._offsets)}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{offset:010d} 00000 n \n" for offset in self._offsets[1:])
+        lines.append(
+            f"trailer\n<< /Size {len(self._offsets)} /Root 1 0 R >>\n"
+            f"startxref\n{xref_at}\n%%EOF\n"
+        )
+        self._file.write("".join(lines).encode())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        return len(self.pages)
+
+    def abort(self) -> None:
+        """Drops the partial file."""
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "ImagePDFWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,308 @@
+import json
+import os
+from pathlib import Path
+from typing import (
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from max_cli.common.exceptions import MaxError
+
+# (current name, new name) inside one folder
+RenameStep = Tuple[str, str]
+# Where a cycle parks its first file (plan_renames)
+TEMP_PREFIX = ".max_tmp_"
+
+
+class RenameAction(NamedTuple):
+    """
+    What happened to one step: 'renamed', 'failed' (with the error),
+    'already_done' (resume/undo) or 'planned' (dry run). A plain tuple
+    underneath, so millions of them can stream past cheaply.
+    """
+
+    src: str
+    dst: str
+    status: str
+    error: Optional[str] = None
+
+
+def unique_name(name: str, is_taken: Callable[[str], bool]) -> str:
+    """'3_a.txt' -> '3_a (2).txt', '3_a (3).txt'... whichever isn't taken."""
+    stem, dot, suffix = name.rpartition(".")
+    if not stem:
+        stem, dot, suffix = name, "", ""
+    copy = 2
+    while is_taken(f"{stem} ({copy}){dot}{suffix}"):
+        copy += 1
+    return f"{stem} ({copy}){dot}{suffix}"
+
+
+def plan_renames(
+    moves: Iterable[RenameStep], existing: Collection[str]
+) -> Tuple[List[RenameStep], Dict[str, int]]:
+    """
+    Orders a batch of renames inside one folder so none overwrites a file.
+
+    'existing' is every name currently in the folder. A target already held
+    by a file that isn't moving (or claimed by an earlier move) gets a
+    ' (2)' style suffix. A target held by a file that *is* moving waits for
+    that file to leave: each name has at most one move out and one move in,
+    so the moves form simple chains and cycles. Chains run from their free
+    end; a cycle parks one file under a temp name first. Every move is
+    looked at a constant number of times, so planning is O(n).
+
+    Returns the ordered steps (temp hops included) and counts of the
+    conflicts and cycles that were resolved.
+    """
+    moves = [move for move in moves if move[0] != move[1]]
+    # Every source, in order; each gets its final target below and is
+    # popped once its step is planned (so "in targets" means "still to go")
+    targets: Dict[str, str] = dict.fromkeys(src for src, _ in moves)
+    # Which source moves onto a given name (targets are unique)
+    moving_in: Dict[str, str] = {}
+
+    def is_taken(name: str) -> bool:
+        return name in moving_in or (name in existing and name not in targets)
+
+    # --- 1. Final targets, unique and never onto a file that stays ---
+    conflicts = 0
+    for src, dst in moves:
+        if is_taken(dst):
+            dst = unique_name(dst, is_taken)
+            conflicts += 1
+        targets[src] = dst
+        moving_in[dst] = src
+    del moves
+
+    # --- 2. Order: each step runs once its target has been vacated ---
+    steps: List[RenameStep] = []
+    cycles = 0
+
+    def unwind(node: Optional[str]) -> None:
+        # Walks back along the files waiting for 'node' to move
+        while node is not None and node in targets:
+            steps.append((node, targets.pop(node)))
+            node = moving_in.get(node)
+
+    for start in list(targets):
+        if start not in targets:
+            continue
+        # Follow the chain forward to a free target, or back round to
+        # 'start'. With one move in per name, a chain can only loop back
+        # to where it began.
+        node = start
+        while targets[node] in targets:
+            node = targets[node]
+            if node == start:
+                break
+
+        if node != start or targets[start] not in targets:
+            unwind(node)
+            continue
+
+        # Cycle (a -> b -> a): park 'start', shift the rest, then land it
+        cycles += 1
+        temp = f"{TEMP_PREFIX}{os.getpid()}_{cycles}"
+        while temp in moving_in or temp in existing:
+            temp += "_"
+        final = targets.pop(start)
+        steps.append((start, temp))
+        unwind(moving_in[start])
+        steps.append((temp, final))
+
+    return steps, {"conflicts": conflicts, "cycles": cycles}
+
+
+class RenameJournal:
+    """
+    On-disk log of a planned rename batch, written (and fsynced) before the
+    first file moves. One JSON line per step after a header; a final
+    {"done": true} line marks a run that finished.
+
+    Whether a step ran is read off the folder itself (source gone, target
+    present), so nothing is logged per rename and a run killed at any point
+    can be resumed or undone from the journal alone. The one exception is
+    putting a parked file back: its temp name is just as absent before the
+    cycle starts, so a {"landing": temp} line is logged right before that
+    rename (see completed_steps).
+    """
+
+    FILE_NAME = ".max_rename_journal.jsonl"
+    VERSION = 1
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+        self.path = folder / self.FILE_NAME
+        # Temp names whose file was about to be put back (filled by load)
+        self.landings: Set[str] = set()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def write(self, steps: List[RenameStep]) -> None:
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"version": self.VERSION, "steps": len(steps)}) + "\n")
+            for step in steps:
+                f.write(json.dumps(step, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def mark_done(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"done": true}\n')
+
+    def mark_landing(self, temp: str) -> None:
+        # On disk before the rename it announces: one fsync per cycle
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"landing": temp}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.landings.add(temp)
+
+    def load(self) -> Tuple[List[RenameStep], bool]:
+        """The logged steps and whether that run finished."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                if header.get("version") != self.VERSION:
+                    raise MaxError(f"Unsupported rename journal: {self.path}")
+                steps: List[RenameStep] = []
+                finished = False
+                for line in f:
+                    record = json.loads(line)
+                    if isinstance(record, dict):
+                        if "landing" in record:
+                            self.landings.add(record["landing"])
+                        else:
+                            finished = bool(record.get("done"))
+                    else:
+                        steps.append((record[0], record[1]))
+        except FileNotFoundError:
+            raise MaxError(f"No rename journal in '{self.folder}'.")
+        except ValueError:
+            raise MaxError(f"Rename journal is damaged: {self.path}")
+        return steps, finished
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def completed_steps(
+    steps: Sequence[RenameStep],
+    exists: Callable[[str], bool],
+    landings: Collection[str] = (),
+) -> int:
+    """
+    How many leading steps of a journaled run already ran.
+
+    Later steps reuse names (chains, swaps through a temp name), so a
+    step's own names can't say whether it ran. The last step whose source
+    is gone and target present is where the run stopped: everything up to
+    it ran, nothing after it did. A step out of a temp name only counts
+    once its landing was logged: before the cycle starts, the temp name is
+    absent and the target present too.
+    """
+    for i in range(len(steps) - 1, -1, -1):
+        src, dst = steps[i]
+        if src.startswith(TEMP_PREFIX) and src not in landings:
+            continue
+        if not exists(src) and exists(dst):
+            return i + 1
+    return 0
+
+
+def iter_renames(
+    folder: Path,
+    steps: Iterable[RenameStep],
+    mode: str = "run",
+    journal: Optional[RenameJournal] = None,
+) -> Iterator[RenameAction]:
+    """
+    Runs planned steps in order, yielding one RenameAction per step as it
+    happens. Names are resolved against an open handle on the folder
+    (renameat), so no step re-walks the full path. Nothing is kept per
+    step, so memory doesn't grow with the batch.
+
+    A failed step leaves its source in place, so any later step targeting
+    that name is skipped rather than allowed to overwrite it.
+    - run: a fresh plan; every step is attempted.
+    - resume: runs only the steps after where the interrupted run stopped
+      (completed_steps); one whose target exists is refused.
+    - undo: for reversed steps; only those whose source is present and
+      target free run (the rest never happened in the original run).
+    With a journal, each landing out of a temp name is logged first.
+    """
+    dir_fd = os.open(folder, os.O_RDONLY)
+    blocked = set()
+
+    def exists(name: str) -> bool:
+        try:
+            os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+            return True
+        except FileNotFoundError:
+            return False
+
+    try:
+        if mode == "resume":
+            steps = list(steps)
+            landings = journal.landings if journal is not None else ()
+            ran = completed_steps(steps, exists, landings)
+            for src, dst in steps[:ran]:
+                yield RenameAction(src, dst, "already_done")
+            steps = steps[ran:]
+
+        for src, dst in steps:
+            error: Optional[OSError] = None
+            if dst in blocked:
+                error = FileExistsError(f"'{dst}' is still in place (earlier failure)")
+            elif mode == "resume" and exists(dst):
+                error = FileExistsError(f"'{dst}' already exists")
+            elif mode == "undo" and (exists(dst) or not exists(src)):
+                yield RenameAction(src, dst, "already_done")
+                continue
+
+            if error is None:
+                try:
+                    if journal is not None and src.startswith(TEMP_PREFIX):
+                        journal.mark_landing(src)
+                    os.rename(src, dst, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+                except OSError as e:
+                    error = e
+            if error is None:
+                yield RenameAction(src, dst, "renamed")
+            else:
+                blocked.add(src)
+                yield RenameAction(src, dst, "failed", str(error))
+    finally:
+        os.close(dir_fd)
+
+
+def execute_renames(
+    folder: Path,
+    steps: Iterable[RenameStep],
+    mode: str = "run",
+    on_step: Optional[Callable[[RenameAction], None]] = None,
+    journal: Optional[RenameJournal] = None,
+) -> Dict[str, int]:
+    """
+    Runs iter_renames to the end and counts the outcomes.
+    on_step(action) is called for each step that was attempted.
+    """
+    counts = {"renamed": 0, "already_done": 0, "failed": 0}
+    for action in iter_renames(folder, steps, mode, journal):
+        counts[action.status] += 1
+        if on_step and action.status != "already_done":
+            on_step(action)
+    return counts
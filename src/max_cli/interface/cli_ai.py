@@ -8,11 +8,6 @@ from max_cli.core.ai_engine import AIEngine
 from max_cli.common.logger import console, log_error
 
 app = typer.Typer()
-engine = AIEngine()
-
-# We need a reference to the main Typer app to generate docs.
-# We will set this in main.py
-MAIN_APP_REF = None
 
 
 @app.command("ask")
@@ -21,15 +16,16 @@ def ask_ai(prompt: str = typer.Argument(..., help="What do you want to do?")):
     Natural Language Interface.
     Example: max ai ask "Compress all PDFs in Documents folder"
     """
-    if MAIN_APP_REF is None:
-        log_error("Internal Error: Main App reference not linked.")
-        raise typer.Exit(1)
+    # Only a question needs every group imported (for the AI's tool list)
+    # and an OpenAI client built
+    from max_cli.main import build_full_app
 
+    engine = AIEngine()
     console.print(f"[dim]Analyzing request: '{prompt}'...[/dim]")
 
     with console.status("[bold cyan]Consulting AI...[/bold cyan]"):
         try:
-            result = engine.interpret_intent(prompt, MAIN_APP_REF)
+            result = engine.interpret_intent(prompt, build_full_app())
         except Exception as e:
             log_error(str(e))
             raise typer.Exit(1)
@@ -0,0 +1,125 @@
+import tempfile
+import typer
+from pathlib import Path
+from typing import List, Optional
+from rich.table import Table
+from rich import box
+
+from max_cli.core.benchmark import BenchmarkRunner
+from max_cli.common.logger import console, log_error, log_success
+from max_cli.common.exceptions import ValidationError
+
+app = typer.Typer()
+runner = BenchmarkRunner()
+
+
+def _print_comparison(rows: List[dict], threshold: float) -> int:
+    """Renders a baseline-vs-current table. Returns the number of regressions."""
+    table = Table(title=f"Comparison (threshold {threshold}%)", box=box.ROUNDED)
+    table.add_column("Case", style="cyan", overflow="fold")
+    table.add_column("Baseline p50", style="magenta")
+    table.add_column("Current p50", style="green")
+    table.add_column("Change", style="bold white")
+
+    for row in rows:
+        change = f"{row['change_pct']:+.1f}%"
+        if row["regressed"]:
+            change = f"[red]{change}[/red]"
+        table.add_row(
+            row["case"],
+            f"{row['baseline_ms']:.1f} ms",
+            f"{row['current_ms']:.1f} ms",
+            change,
+        )
+
+    console.print(table)
+    return sum(1 for row in rows if row["regressed"])
+
+
+@app.command("run")
+def run_benchmarks(
+    corpus: Optional[Path] = typer.Option(
+        None, "--corpus", help="Corpus folder (built if empty). Defaults to a temp dir."
+    ),
+    sizes: str = typer.Option(
+        "small,medium", "--sizes", help="Image sizes: small, medium, large."
+    ),
+    repeat: int = typer.Option(5, "--repeat", help="Timed runs per case."),
+    only: Optional[str] = typer.Option(
+        None, "--only", help="Only run cases whose name contains this text."
+    ),
+    save: Optional[Path] = typer.Option(None, "--save", help="Write results JSON."),
+    baseline: Optional[Path] = typer.Option(
+        None, "--compare", help="Baseline JSON to compare against."
+    ),
+    threshold: float = typer.Option(
+        10.0, "--threshold", help="Allowed p50 slowdown in percent."
+    ),
+):
+    """
+    Time ImageEngine and PDFEngine on a synthetic, reproducible corpus.
+    """
+    size_names = [s.strip() for s in sizes.split(",") if s.strip()]
+    unknown = set(size_names) - set(runner.IMAGE_SIZES)
+    if unknown:
+        raise ValidationError(f"Unknown size(s): {', '.join(sorted(unknown))}")
+    if repeat < 1:
+        raise ValidationError("--repeat must be at least 1.")
+
+    with tempfile.TemporaryDirectory(prefix="max_bench_") as tmp:
+        corpus_dir = corpus or Path(tmp) / "corpus"
+        if not corpus_dir.exists() or not any(corpus_dir.iterdir()):
+            with console.status("[bold cyan]Generating corpus...[/bold cyan]"):
+                runner.build_corpus(corpus_dir, size_names)
+
+        table = Table(title="Benchmark Results", box=box.ROUNDED)
+        table.add_column("Case", style="cyan", overflow="fold")
+        table.add_column("p50", style="green")
+        table.add_column("p95", style="magenta")
+        table.add_column("Throughput", style="bold white")
+        table.add_column("Peak RSS", style="yellow")
+
+        def on_case(name: str, result: dict):
+            console.print(f"  [dim]{name}: {result['p50_ms']:.1f} ms[/dim]")
+            rss = result["peak_rss_mb"]
+            table.add_row(
+                name,
+                f"{result['p50_ms']:.1f} ms",
+                f"{result['p95_ms']:.1f} ms",
+                f"{result['throughput']:.2f} {result['unit']}",
+                f"{rss:.0f} MB" if rss is not None else "n/a",
+            )
+
+        report = runner.run(
+            corpus_dir, Path(tmp) / "out", repeat=repeat, only=only, on_case=on_case
+        )
+
+    console.print(table)
+
+    if save:
+        runner.save(report, save)
+        log_success(f"Results saved to: [bold]{save}[/bold]")
+
+    if baseline:
+        rows = runner.compare(runner.load(baseline), report, threshold)
+        regressions = _print_comparison(rows, threshold)
+        if regressions:
+            log_error(f"{regressions} case(s) regressed more than {threshold}%.")
+            raise typer.Exit(code=1)
+
+
+@app.command("compare")
+def compare_results(
+    baseline: Path = typer.Argument(..., help="Baseline results JSON."),
+    current: Path = typer.Argument(..., help="New results JSON."),
+    threshold: float = typer.Option(
+        10.0, "--threshold", help="Allowed p50 slowdown in percent."
+    ),
+):
+    """
+    Compare two saved benchmark runs. Exits with code 1 on regressions.
+    """
+    rows = runner.compare(runner.load(baseline), runner.load(current), threshold)
+    if _print_comparison(rows, threshold):
+        raise typer.Exit(code=1)
+    log_success("No regressions.")
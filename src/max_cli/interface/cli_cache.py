@@ -0,0 +1,54 @@
+import time
+import typer
+from rich.prompt import Confirm
+
+from max_cli.common.dir_cache import DirCache, cache_dir
+from max_cli.common.logger import console, log_success
+from max_cli.config import settings
+
+app = typer.Typer()
+
+
+def _open_cache() -> DirCache:
+    path = cache_dir() / DirCache.FILE_NAME
+    if not path.exists():
+        console.print(f"[yellow]No folder cache yet ({path}).[/yellow]")
+        raise typer.Exit()
+    return DirCache(path, settings.CACHE_MAX_MB * 1024 * 1024)
+
+
+@app.command("stats")
+def cache_stats():
+    """
+    Show what the folder cache holds and how big it is.
+    """
+    state = "on" if settings.DIR_CACHE else "off (set DIR_CACHE=true to enable)"
+    console.print(f"Folder cache: [bold]{state}[/bold]")
+    with _open_cache() as cache:
+        stats = cache.stats()
+    console.print(f"  File:    {stats['path']}")
+    console.print(
+        f"  Size:    {stats['bytes'] / 1024 / 1024:.1f} MB "
+        f"(cap {settings.CACHE_MAX_MB} MB, least recently used folders go first)"
+    )
+    console.print(
+        f"  Holds:   {stats['dirs']:,} folders, {stats['entries']:,} entries, "
+        f"{stats['facts']:,} with image/PDF facts"
+    )
+    if stats["oldest_use"]:
+        days = (time.time() - stats["oldest_use"]) / 86400
+        console.print(f"  Oldest:  last used {days:.0f} days ago")
+
+
+@app.command("clear")
+def cache_clear(
+    force: bool = typer.Option(False, "-f", "--force", help="Skip confirmation."),
+):
+    """
+    Empty the folder cache. The next scan of each folder lists it afresh.
+    """
+    with _open_cache() as cache:
+        if not force and not Confirm.ask(f"Clear {cache.path}?"):
+            raise typer.Abort()
+        cache.clear()
+    log_success("Folder cache cleared.")
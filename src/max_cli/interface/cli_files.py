@@ -1,10 +1,21 @@
+import json
+import sys
+import time
 import typer
 from pathlib import Path
+from typing import Optional
+from rich import box
+from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn
 from rich.prompt import Confirm
+from rich.table import Table
 from rich.panel import Panel
 from rich.text import Text
 
+from max_cli.core.file_hashes import FileHashCache
 from max_cli.core.file_organizer import FileOrganizer
+from max_cli.common.exceptions import ResourceNotFoundError, ValidationError
+from max_cli.common.parallel import resolve_workers
+from max_cli.common.utils import parse_size
 from max_cli.common.logger import console, log_error, log_success
 
 app = typer.Typer()
@@ -23,24 +34,53 @@ def order_files(
     start: int = typer.Option(
         1, "--start", help="Number to start counting from (default 1)."
     ),
+    resume: bool = typer.Option(
+        False, "--resume", help="Finish an interrupted run from its journal."
+    ),
+    undo: bool = typer.Option(
+        False, "--undo", help="Revert the last run (finished or interrupted)."
+    ),
+    log_path: Optional[Path] = typer.Option(
+        None, "--log", help="Write every action to this file (NDJSON, streamed)."
+    ),
 ):
     """
     Rename all files in a folder with a number prefix (e.g. 1_file.txt).
-    Skips files that are already numbered.
+    Skips files that are already numbered. Never overwrites: clashing names
+    get a ' (2)' suffix. Each run is journaled, so it can be resumed or undone.
     """
 
     if not folder.is_dir():
         log_error(f"'{folder}' is not a directory.")
         raise typer.Exit(code=1)
 
-    # 1. Get stats first to show the user what will happen
+    if resume or undo:
+        if resume and undo:
+            raise ValidationError("Use either --resume or --undo, not both.")
+        began = time.perf_counter()
+        if resume:
+            counts = organizer.resume_order(folder)
+        else:
+            counts = organizer.undo_order(folder)
+        elapsed = time.perf_counter() - began
+        console.print(
+            f"  Renamed: {counts['renamed']}  Already done: {counts['already_done']}"
+            f"  Failed: {counts['failed']}  ({elapsed:.2f}s)"
+        )
+        if counts["failed"]:
+            log_error("Some files could not be renamed; the journal was kept.")
+            raise typer.Exit(code=1)
+        log_success("Undo complete!" if undo else "Resume complete!")
+        return
+
+    # 1. Plan first to show the user what will happen
     try:
-        files = organizer.scan_directory(folder)
+        plan = organizer.plan_order(folder, start_index=start)
     except Exception as e:
         log_error(str(e))
         raise typer.Exit(code=1)
 
-    if not files:
+    if not plan["total_files"]:
         console.print("[yellow]Folder is empty. Nothing to do.[/yellow]")
         return
 
@@ -48,7 +88,10 @@ def order_files(
     if not dry_run and not force:
         console.print(
             Panel(
-                Text(f"Target: {folder}\nFiles found: {len(files)}", justify="center"),
+                Text(
+                    f"Target: {folder}\nFiles found: {plan['total_files']}",
+                    justify="center",
+                ),
                 title="[bold yellow]⚠ Bulk Rename Warning[/bold yellow]",
                 border_style="yellow",
             )
@@ -57,28 +100,84 @@ def order_files(
             console.print("[red]Aborted.[/red]")
             raise typer.Exit()
 
-    # 3. Execute
+    # 3. Execute, streaming: actions are shown/logged as they happen and
+    # never collected, so memory doesn't grow with the folder
     console.print(
         f"[bold cyan]Processing files starting at index {start}...[/bold cyan]"
     )
+    shown = []  # The first few actions, echoed after the progress bar
+    failed = 0
+    renamed = plan["moves"] if dry_run else 0
+    log_file = open(log_path, "w", encoding="utf-8") if log_path else None
 
-    results = organizer.order_files(folder, dry_run=dry_run, start_index=start)
+    began = time.perf_counter()
+    try:
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TextColumn("{task.completed:,}/{task.total:,}"),
+            TextColumn("[cyan]{task.fields[rate]}"),
+            console=console,
+        ) as progress:
+            task = progress.add_task(
+                "[green]Renaming...", total=len(plan["steps"]), rate=""
+            )
+            for done, action in enumerate(
+                organizer.iter_order(folder, plan, dry_run=dry_run), start=1
+            ):
+                if action.status == "failed":
+                    failed += 1
+                elif action.status == "renamed":
+                    if action.src not in plan["temp_names"]:
+                        renamed += 1  # Temp hops move a file twice; count it once
+                if log_file:
+                    log_file.write(json.dumps(action._asdict()) + "\n")
+                if len(shown) < 10 or (action.status == "failed" and failed <= 10):
+                    shown.append(action)
+                # Redrawing per file would cost more than the rename itself
+                if done % 500 == 0 or done == len(plan["steps"]):
+                    elapsed = time.perf_counter() - began
+                    progress.update(
+                        task,
+                        completed=done,
+                        rate=f"{done / elapsed:,.0f} files/s" if elapsed else "",
+                    )
+    finally:
+        if log_file:
+            log_file.close()
+    elapsed = time.perf_counter() - began
 
     # 4. Report
-    # Print the log of actions (limited to last 10 if too many, to avoid spam)
-    actions = results["actions"]
-    if len(actions) > 20:
-        for action in actions[:10]:
-            console.print(f"  {action}")
-        console.print(f"  ... and {len(actions)-10} more.")
-    else:
-        for action in actions:
-            console.print(f"  {action}")
+    for action in shown:
+        if action.status == "planned":
+            console.print(f"  [DRY RUN] Would rename '{action.src}' -> '{action.dst}'")
+        elif action.status == "failed":
+            console.print(
+                f"  [red][Error] Could not rename '{action.src}': {action.error}[/red]"
+            )
+        else:
+            console.print(f"  Renamed '{action.src}' -> '{action.dst}'")
+    if len(plan["steps"]) > len(shown):
+        more = f"  ... and {len(plan['steps']) - len(shown):,} more"
+        console.print(f"{more} (full log: {log_path})." if log_path else f"{more}.")
 
     summary_color = "green" if not dry_run else "yellow"
     console.print(f"\n[{summary_color}]Summary:[/ {summary_color}]")
-    console.print(f"  Files Processed: {results['renamed']}")
-    console.print(f"  Files Skipped:   {results['skipped']}")
+    console.print(f"  Files Processed: {renamed}")
+    console.print(f"  Files Skipped:   {plan['skipped']}")
+    if failed:
+        console.print(f"  [red]Failed:          {failed}[/red]")
+    if plan["conflicts"] or plan["cycles"]:
+        console.print(
+            f"  Name clashes:    {plan['conflicts']} renamed with a suffix, "
+            f"{plan['cycles']} cycles via temp names"
+        )
+    if not dry_run and elapsed > 0:
+        console.print(
+            f"  Throughput:      {renamed / elapsed:,.0f} files/s "
+            f"({elapsed:.2f}s)"
+        )
 
     if dry_run:
         console.print(
@@ -86,3 +185,288 @@ def order_files(
         )
     else:
         log_success("File ordering complete!")
+
+
+def _size_str(size_bytes: int) -> str:
+    """Formats bytes as KB/MB/GB."""
+    if size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.2f} KB"
+    if size_bytes < 1024**3:
+        return f"{size_bytes / 1024**2:.2f} MB"
+    return f"{size_bytes / 1024**3:.2f} GB"
+
+
+@app.command("dedupe")
+def dedupe_files(
+    ctx: typer.Context,
+    folder: Path = typer.Argument(Path("."), help="Folder to search."),
+    recursive: bool = typer.Option(
+        False, "-r", "--recursive", help="Include files in sub-folders."
+    ),
+    action: str = typer.Option(
+        "report",
+        "--action",
+        help="report, delete, hardlink, or reflink (copy-on-write clone).",
+    ),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Show what --action would do without doing it."
+    ),
+    force: bool = typer.Option(
+        False, "-f", "--force", help="Skip confirmation prompt."
+    ),
+    min_size: str = typer.Option(
+        "1", "--min-size", help="Ignore files smaller than this, e.g. 1MB."
+    ),
+    cache_path: Optional[Path] = typer.Option(
+        None,
+        "--cache-file",
+        help="Hash cache file (default: .max_fhash.json in folder).",
+    ),
+    use_cache: bool = typer.Option(
+        True, "--cache/--no-cache", help="Reuse hashes of unchanged files."
+    ),
+    json_output: bool = typer.Option(
+        False, "--json", help="Print one JSON record per group instead of a table."
+    ),
+    workers: str = typer.Option(
+        "8",
+        "-j",
+        "--workers",
+        "--jobs",
+        help="Threads hashing files (a number or 'auto').",
+    ),
+):
+    """
+    Find files with identical contents. Only same-size files are read, and
+    only their first/last KB unless those match too. The oldest copy is kept.
+    """
+    if not folder.is_dir():
+        raise ResourceNotFoundError(f"Folder '{folder}' not found.")
+    if action not in organizer.DEDUPE_ACTIONS:
+        raise ValidationError(
+            f"--action must be one of: {', '.join(organizer.DEDUPE_ACTIONS)}."
+        )
+    if json_output:
+        console.quiet = True
+        ctx.call_on_close(lambda: setattr(console, "quiet", False))
+
+    cache = None
+    if use_cache:
+        cache = FileHashCache(cache_path or folder / FileHashCache.FILE_NAME).load()
+
+    # 1. Find
+    began = time.perf_counter()
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("{task.completed}/{task.total}"),
+        console=console,
+        disable=json_output,
+    ) as progress:
+        task = progress.add_task("[green]Scanning...", total=None)
+
+        def on_progress(phase: str, done: int, total: int) -> None:
+            label = "Hashing ends..." if phase == "partial" else "Hashing in full..."
+            progress.update(
+                task, description=f"[green]{label}", completed=done, total=total
+            )
+
+        result = organizer.find_duplicates(
+            folder,
+            recursive=recursive,
+            min_size=parse_size(min_size),
+            workers=resolve_workers(workers),
+            cache=cache,
+            on_progress=on_progress,
+        )
+    elapsed = time.perf_counter() - began
+    if cache is not None:
+        # Drop entries for files that were deleted or replaced since
+        cache.save(result["live_keys"])
+
+    groups = result["groups"]
+    share = result["bytes_read"] / result["bytes_total"] if result["bytes_total"] else 0
+    console.print(
+        f"[bold cyan]Scanned {result['files']} files "
+        f"({_size_str(result['bytes_total'])}) in {elapsed:.2f}s:[/bold cyan] "
+        f"read {_size_str(result['bytes_read'])} ({share:.2%})"
+        + (f", {cache.hits} cached hashes." if cache is not None else ".")
+    )
+
+    # 2. Report
+    if json_output:
+        for group in groups:
+            sys.stdout.write(json.dumps(group) + "\n")
+    elif groups:
+        table = Table(title="Duplicate Files", box=box.ROUNDED)
+        table.add_column("Keep", style="green", overflow="fold")
+        table.add_column("Duplicates", style="magenta", overflow="fold")
+        table.add_column("Size", justify="right")
+        display_limit = 20
+        for group in groups[:display_limit]:
+            keep, *extras = group["files"]
+            table.add_row(keep, "\n".join(extras), _size_str(group["size"]))
+        if len(groups) > display_limit:
+            table.add_row(f"{len(groups) - display_limit} more groups...", "", "")
+        console.print(table)
+
+    extra_count = sum(len(group["files"]) - 1 for group in groups)
+    console.print(
+        f"[bold cyan]{len(groups)} groups, {extra_count} duplicates, "
+        f"{_size_str(result['reclaimable'])} reclaimable.[/bold cyan]"
+    )
+    if action == "report" or not groups:
+        return
+
+    # 3. Act on the extras (and any other names hardlinked to them)
+    if not dry_run and not force:
+        if not Confirm.ask(f"{action.capitalize()} {extra_count} duplicate files?"):
+            console.print("[red]Aborted.[/red]")
+            raise typer.Exit()
+
+    done = freed = 0
+    for group in groups:
+        keep, *extras = group["files"]
+        for extra in extras:
+            names = [extra] + group["links"].get(extra, [])
+            if dry_run:
+                for name in names:
+                    console.print(
+                        f"  [DRY RUN] Would {action} '{name}' (keep '{keep}')"
+                    )
+                done += 1
+                continue
+            try:
+                for name in names:
+                    organizer.replace_duplicate(folder / keep, folder / name, action)
+            except OSError as e:
+                console.print(f"[red]Could not {action} '{name}': {e}[/red]")
+                continue
+            done += 1
+            freed += group["size"]
+
+    if dry_run:
+        console.print(
+            "[bold yellow]This was a Dry Run. No files were changed.[/bold yellow]"
+        )
+    else:
+        log_success(f"{done} duplicates handled, {_size_str(freed)} freed.")
+
+
+@app.command("organize")
+def organize_files(
+    source: Path = typer.Argument(..., help="Folder to sort."),
+    dest: Optional[Path] = typer.Option(
+        None, "--to", help="Where the sorted tree goes (default: sort in place)."
+    ),
+    recursive: bool = typer.Option(
+        False, "-r", "--recursive", help="Include files in sub-folders."
+    ),
+    layout: str = typer.Option(
+        "{type}/{year}/{month}",
+        "--layout",
+        help="Target folders from {type}, {year}, {month}, {day}, {ext}.",
+    ),
+    use_exif: bool = typer.Option(
+        True, "--exif/--no-exif", help="Date photos by EXIF capture time."
+    ),
+    checksum: bool = typer.Option(
+        False,
+        "--checksum",
+        help="Across devices, compare full hashes before deleting the source.",
+    ),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Show the plan without moving anything."
+    ),
+    force: bool = typer.Option(
+        False, "-f", "--force", help="Skip confirmation prompt."
+    ),
+    workers: str = typer.Option(
+        "4",
+        "-j",
+        "--workers",
+        "--jobs",
+        help="Threads for EXIF reads and cross-device copies (a number or 'auto').",
+    ),
+):
+    """
+    Sort files into type/YYYY/MM folders (photos by EXIF date, others by
+    modification time). The whole plan is computed before anything moves.
+    """
+    dest = dest or source
+    worker_count = resolve_workers(workers)
+
+    # 1. Plan
+    began = time.perf_counter()
+    with console.status("[cyan]Planning...[/cyan]"):
+        plan = organizer.plan_organize(
+            source,
+            dest,
+            recursive=recursive,
+            layout=layout,
+            use_exif=use_exif,
+            workers=worker_count,
+        )
+    moves = plan["moves"]
+    across = [move for move in moves if move[3]]
+    console.print(
+        f"[bold cyan]{len(moves)} files to move[/bold cyan] into "
+        f"{len(plan['folders'])} folders ({plan['in_place']} already in place; "
+        f"{len(across)} across devices, {_size_str(sum(m[2] for m in across))}). "
+        f"[dim]Planned in {time.perf_counter() - began:.2f}s.[/dim]"
+    )
+    if not moves:
+        log_success("Nothing to do.")
+        return
+
+    if dry_run:
+        for src, dst, _, cross in moves[:20]:
+            note = " (copy)" if cross else ""
+            console.print(f"  [DRY RUN] '{src}' -> '{dst}'{note}")
+        if len(moves) > 20:
+            console.print(f"  ... and {len(moves) - 20} more.")
+        console.print(
+            "\n[bold yellow]This was a Dry Run. No files were changed.[/bold yellow]"
+        )
+        return
+
+    if not force and not Confirm.ask(f"Move {len(moves)} files into '{dest}'?"):
+        console.print("[red]Aborted.[/red]")
+        raise typer.Exit()
+
+    # 2. Execute
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("{task.completed}/{task.total} files"),
+        console=console,
+    ) as progress:
+        task = progress.add_task("[green]Moving...", total=len(moves))
+        result = organizer.execute_moves(
+            plan,
+            workers=worker_count,
+            checksum=checksum,
+            on_move=lambda move, error: progress.advance(task),
+        )
+
+    for src, error in result["failures"][:20]:
+        console.print(f"[red]Failed '{src}': {error}[/red]")
+    if len(result["failures"]) > 20:
+        console.print(f"[red]... and {len(result['failures']) - 20} more.[/red]")
+
+    seconds = max(result["seconds"], 1e-9)
+    moved = result["renamed"] + result["copied"]
+    methods = ", ".join(f"{n} via {m}" for m, n in result["methods"].items())
+    console.print(
+        f"  Renamed: {result['renamed']}  Copied: {result['copied']}"
+        f"{f' ({methods})' if methods else ''}  Failed: {len(result['failures'])}"
+    )
+    console.print(
+        f"  Throughput: {moved / seconds:,.0f} files/s, "
+        f"{_size_str(int(result['bytes'] / seconds))}/s ({seconds:.2f}s)"
+    )
+    if result["failures"]:
+        raise typer.Exit(code=1)
+    log_success(f"Organized {moved} files into: [bold]{dest}[/bold]")
@@ -1,13 +1,32 @@
+import json
+import os
+import sys
+import time
+from collections import Counter
 import typer
 from pathlib import Path
-from typing import Optional, List
+from typing import Dict, Iterator, List, Optional, Tuple
+from rich.prompt import Confirm
 from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn
 from rich.table import Table
 from rich import box
 
 # Import our custom modules
 from max_cli.core.image_processor import ImageEngine
+from max_cli.core.image_index import (
+    PerceptualIndex,
+    find_groups,
+    hamming,
+    split_by_keeper,
+)
+from max_cli.core.manifest import BuildManifest
+from max_cli.common.dir_cache import shared_dir_cache
 from max_cli.common.logger import console, log_success
+from max_cli.common.parallel import resolve_workers, run_tasks
+from max_cli.common.pipeline import AsyncWriter, PipelineStats, prefetch
+from max_cli.common.report import RunReport
+from max_cli.common.scanner import scan_files
+from max_cli.common.utils import parse_size, temp_sibling
 from max_cli.config import settings
 from max_cli.common.exceptions import ResourceNotFoundError, ValidationError
 
@@ -15,8 +34,30 @@ app = typer.Typer()
 engine = ImageEngine()
 
 
+def _parse_variants(
+    variants: str, formats: Optional[str], force_jpeg: bool
+) -> Tuple[List[int], Optional[List[str]]]:
+    """Turns '--variants 320,640 --formats jpeg,webp' into widths and formats."""
+    try:
+        widths = sorted({int(w) for w in variants.split(",") if w.strip()})
+    except ValueError:
+        raise ValidationError(f"Invalid --variants '{variants}'. Use e.g. 320,640.")
+
+    variant_formats = None
+    if formats:
+        variant_formats = [f.strip().lower() for f in formats.split(",") if f.strip()]
+    elif force_jpeg:
+        variant_formats = ["jpeg"]
+
+    unknown = set(variant_formats or []) - set(engine.VARIANT_FORMATS)
+    if unknown:
+        raise ValidationError(f"Unsupported format(s): {', '.join(sorted(unknown))}")
+    return widths, variant_formats
+
+
 @app.command("compress")
 def compress_command(
+    ctx: typer.Context,
     # CHANGE: Make target optional, default to current directory "."
     target: Path = typer.Argument(
         Path("."), help="Path to a file or a folder. Defaults to current folder."
@@ -32,6 +73,97 @@ def compress_command(
     quantize: bool = typer.Option(
         False, "--quantize", help="Use lossy PNG compression."
     ),
+    target_size: Optional[str] = typer.Option(
+        None,
+        "--target-size",
+        help="Byte budget per image, e.g. 200KB. Searches JPEG/WebP quality.",
+    ),
+    shrink_to_fit: bool = typer.Option(
+        False,
+        "--shrink-to-fit",
+        help="With --target-size, also step down dimensions if quality alone fails.",
+    ),
+    variants: Optional[str] = typer.Option(
+        None,
+        "--variants",
+        help="Responsive widths from one decode, e.g. 320,640,1280 (name@640w.jpg).",
+    ),
+    formats: Optional[str] = typer.Option(
+        None, "--formats", help="Formats for --variants, e.g. jpeg,webp."
+    ),
+    auto_format: bool = typer.Option(
+        False,
+        "--auto-format",
+        help="Keep the smallest of JPEG/WebP/PNG above a quality floor.",
+    ),
+    link: bool = typer.Option(
+        False,
+        "--link",
+        help="With --auto-format, hardlink originals that can't be beaten.",
+    ),
+    fast_decode: bool = typer.Option(
+        True,
+        "--fast-decode/--full-decode",
+        help="Decode at reduced size when downscaling (--full-decode to compare).",
+    ),
+    rebuild: bool = typer.Option(
+        False, "--rebuild", help="Ignore the manifest and re-encode every image."
+    ),
+    use_hash: bool = typer.Option(
+        False,
+        "--hash",
+        help="Also compare content hashes (survives mtime resets, e.g. CI checkouts).",
+    ),
+    recursive: bool = typer.Option(
+        False, "-r", "--recursive", help="Include images in sub-folders."
+    ),
+    include: Optional[List[str]] = typer.Option(
+        None, "--include", help="Only process files matching this glob (repeatable)."
+    ),
+    exclude: Optional[List[str]] = typer.Option(
+        None, "--exclude", help="Skip files/folders matching this glob (repeatable)."
+    ),
+    max_depth: Optional[int] = typer.Option(
+        None, "--max-depth", help="How many sub-folder levels to descend with -r."
+    ),
+    max_memory: Optional[str] = typer.Option(
+        None,
+        "--max-memory",
+        help="Memory budget for images in flight, e.g. 2G. Huge images run alone.",
+    ),
+    max_megapixels: Optional[float] = typer.Option(
+        None,
+        "--max-megapixels",
+        help="Pixel limit per image (default ~89 MP, Pillow's bomb threshold).",
+    ),
+    bomb_policy: str = typer.Option(
+        "warn",
+        "--bomb-policy",
+        help="Over the pixel limit: warn (refuse past 2x), error, or allow.",
+    ),
+    report: Optional[Path] = typer.Option(
+        None,
+        "--report",
+        help="Stream one JSON record per file (NDJSON) plus a summary to this file.",
+    ),
+    json_output: bool = typer.Option(
+        False, "--json", help="Stream the NDJSON records to stdout instead of tables."
+    ),
+    pipeline: bool = typer.Option(
+        False,
+        "--pipeline",
+        help="Overlap reads, encoding and writes (helps on network drives).",
+    ),
+    queue_depth: int = typer.Option(
+        8, "--queue-depth", help="Files buffered ahead of and behind the encoder."
+    ),
+    workers: str = typer.Option(
+        "1",
+        "-j",
+        "--workers",
+        "--jobs",
+        help="Parallel processes for folder mode (a number or 'auto').",
+    ),
 ):
     """
     Compress images. Smartly handles a single file OR an entire folder.
@@ -44,16 +176,57 @@ def compress_command(
     if not target.exists():
         raise ResourceNotFoundError(f"The path '{target}' does not exist.")
 
+    target_bytes = parse_size(target_size) if target_size else None
+
+    if auto_format and (force_jpeg or target_bytes or variants):
+        raise ValidationError(
+            "--auto-format picks the format; drop --jpeg/--target-size/--variants."
+        )
+
+    widths: List[int] = []
+    variant_formats: Optional[List[str]] = None
+    if variants:
+        if scale or max_dim or target_bytes:
+            raise ValidationError(
+                "--variants sets the sizes; drop --scale/--max-dim/--target-size."
+            )
+        widths, variant_formats = _parse_variants(variants, formats, force_jpeg)
+    memory_budget = parse_size(max_memory) if max_memory else None
+    max_pixels = int(max_megapixels * 1_000_000) if max_megapixels else None
+    if bomb_policy not in engine.BOMB_POLICIES:
+        raise ValidationError(
+            f"--bomb-policy must be one of: {', '.join(engine.BOMB_POLICIES)}."
+        )
+
+    if pipeline and widths:
+        raise ValidationError("--pipeline doesn't support --variants yet.")
+    if queue_depth < 1:
+        raise ValidationError("--queue-depth must be at least 1.")
+
+    if report and json_output:
+        raise ValidationError("Use either --report or --json, not both.")
+
+    # Machine-readable output: one record per file as it finishes
+    run_report: Optional[RunReport] = None
+    if json_output:
+        run_report = RunReport(stream=sys.stdout)
+        # Keep stdout pure NDJSON for the length of this command
+        console.quiet = True
+        ctx.call_on_close(lambda: setattr(console, "quiet", False))
+    elif report:
+        run_report = RunReport(path=report)
+
     # 2. Preparation (Single File vs Folder)
-    files_to_process: List[Path] = []
+    sources: Iterator[Path]
     output_dir: Path
+    manifest: Optional[BuildManifest] = None
 
     if target.is_file():
         # Single file mode
         if target.suffix.lower() not in engine.SUPPORTED_EXTENSIONS:
             raise ValidationError(f"File type {target.suffix} not supported.")
 
-        files_to_process = [target]
+        sources = iter([target])
         # For single file, save in same folder with suffix
         output_dir = target.parent
 
@@ -62,65 +235,272 @@ def compress_command(
         output_dir = target.parent / f"{target.name}_compressed"
         output_dir.mkdir(exist_ok=True)
 
-        # Scan folder
-        files_to_process = [
-            f
-            for f in target.iterdir()
-            if f.is_file() and f.suffix.lower() in engine.SUPPORTED_EXTENSIONS
-        ]
+        # Stream the scan: work starts before a big tree is fully listed
+        sources = (
+            Path(entry.path)
+            for entry in scan_files(
+                target,
+                recursive=recursive,
+                extensions=engine.SUPPORTED_EXTENSIONS,
+                include=include or (),
+                exclude=exclude or (),
+                max_depth=max_depth,
+                cache=shared_dir_cache(),
+            )
+        )
 
-        if not files_to_process:
-            raise ResourceNotFoundError("No valid images found in folder.")
+        # Incremental mode: skip sources the manifest says are unchanged
+        manifest = BuildManifest(output_dir, use_hash=use_hash)
+        if not rebuild:
+            manifest.load()
 
-    console.print(
-        f"[bold cyan]Found {len(files_to_process)} images to process...[/bold cyan]"
-    )
+    params = {
+        "quality": quality,
+        "scale": scale,
+        "max_dim": max_dim,
+        "jpeg": force_jpeg,
+        "quantize": quantize,
+        "fast_decode": fast_decode,
+        "target_bytes": target_bytes,
+        "shrink_to_fit": shrink_to_fit,
+        "variants": widths,
+        "formats": variant_formats,
+        "auto_format": auto_format,
+    }
+
+    console.print(f"[bold cyan]Scanning '{target}' for images...[/bold cyan]")
+
+    worker_count = resolve_workers(workers) if manifest is not None else 1
+    if worker_count > 1:
+        console.print(f"[dim]Using {worker_count} worker processes.[/dim]")
 
     # 3. Processing Loop with Rich Progress Bar
-    stats_list = []
+    # 'tasks' fills up as the scan goes. Results are slotted by index so the
+    # table order never depends on which worker finished first.
+    tasks: List[dict] = []
+    seen_keys: List[str] = []
+    results: Dict[int, dict] = {}
+    failures = []
+    oversized: List[str] = []
+    pipe_stats = PipelineStats() if pipeline else None
 
     with Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
         BarColumn(),
-        TextColumn("{task.percentage:>3.0f}%"),
+        TextColumn("{task.completed}/{task.total}"),
+        console=console,
+        disable=json_output,
     ) as progress:
 
-        task = progress.add_task("[green]Compressing...", total=len(files_to_process))
+        task = progress.add_task("[green]Compressing...", total=None)
+
+        def iter_tasks() -> Iterator[dict]:
+            for input_path in sources:
+                # Determine output filename
+                if manifest is None:
+                    # Single file logic: input.jpg -> input_compressed.jpg
+                    ext = ".jpg" if force_jpeg else input_path.suffix
+                    rel_out = Path(f"{input_path.stem}_compressed{ext}")
+                else:
+                    # Folder logic: mirror sub-folders, keep the name unless
+                    # forcing jpeg
+                    rel_out = input_path.relative_to(target)
+                    if force_jpeg:
+                        rel_out = rel_out.with_suffix(".jpg")
+
+                    key = input_path.relative_to(target).as_posix()
+                    seen_keys.append(key)
+                    if manifest.is_fresh(key, input_path, params):
+                        continue
+                    (output_dir / rel_out).parent.mkdir(parents=True, exist_ok=True)
+
+                if widths:
+                    task_kwargs = {
+                        "input_path": input_path,
+                        "output_dir": (output_dir / rel_out).parent,
+                        "widths": widths,
+                        "formats": variant_formats,
+                        "quality": quality,
+                        "quantize_png": quantize,
+                        "fast_decode": fast_decode,
+                        "max_pixels": max_pixels,
+                        "bomb_policy": bomb_policy,
+                    }
+                    tasks.append(task_kwargs)
+                    progress.update(task, total=len(tasks))
+                    yield task_kwargs
+                    continue
 
-        for input_path in files_to_process:
-            # Determine output filename
-            if target.is_file():
-                # Single file logic: input.jpg -> input_compressed.jpg
-                stem = input_path.stem
-                ext = ".jpg" if force_jpeg else input_path.suffix
-                out_name = f"{stem}_compressed{ext}"
-                output_path = output_dir / out_name
+                task_kwargs = {
+                    "input_path": input_path,
+                    "output_path": output_dir / rel_out,
+                    "fast_decode": fast_decode,
+                    "quality": quality,
+                    "scale": scale,
+                    "max_dim": max_dim,
+                    "force_jpeg": force_jpeg,
+                    "quantize_png": quantize,
+                    "target_bytes": target_bytes,
+                    "shrink_to_fit": shrink_to_fit,
+                    "max_pixels": max_pixels,
+                    "bomb_policy": bomb_policy,
+                    "auto_format": auto_format,
+                    "link_original": link,
+                    "defer_write": pipeline,
+                }
+                tasks.append(task_kwargs)
+                progress.update(task, total=len(tasks))
+                yield task_kwargs
+
+        dir_cache = shared_dir_cache()
+
+        def memory_cost(task_kwargs: dict) -> int:
+            # Header-only estimate; images bigger than the budget run alone.
+            # With the folder cache on, headers read once are kept there.
+            source = str(task_kwargs["input_path"])
+            header = dir_cache.get_fact(source, "image") if dir_cache else None
+            if header is None:
+                header = engine.read_header(task_kwargs["input_path"])
+                if dir_cache and header:
+                    dir_cache.put_fact(source, "image", header)
+            estimate = engine.estimate_memory(
+                task_kwargs["input_path"], scale, max_dim, fast_decode, header=header
+            )
+            if memory_budget and estimate > memory_budget:
+                oversized.append(task_kwargs["input_path"].name)
+            return estimate
+
+        def record(index: int, stats: Optional[dict], error) -> None:
+            if error is not None:
+                failures.append((index, error))
             else:
-                # Folder logic: keep same name unless forcing jpeg
-                out_name = (
-                    input_path.with_suffix(".jpg").name
-                    if force_jpeg
-                    else input_path.name
-                )
-                output_path = output_dir / out_name
+                results[index] = stats
+            if run_report is not None:
+                source = tasks[index]["input_path"]
+                label = source.name if manifest is None else source.relative_to(target)
+                run_report.add(Path(label).as_posix(), stats, error)
+
+        # Pipelined mode: threads read upcoming files into memory while the
+        # encoder works, and a writer thread lands finished outputs on disk.
+        task_source: Iterator[dict] = iter_tasks()
+        writer: Optional[AsyncWriter] = None
+        if pipeline:
 
+            def read_source(task_kwargs: dict) -> dict:
+                try:
+                    task_kwargs["source_bytes"] = task_kwargs["input_path"].read_bytes()
+                except OSError:
+                    pass  # The engine reports it when it tries the path itself
+                return task_kwargs
+
+            task_source = prefetch(
+                task_source,
+                read_source,
+                depth=queue_depth,
+                threads=min(queue_depth, 4),
+                stats=pipe_stats,
+            )
+            writer = AsyncWriter(queue_depth, pipe_stats)
+
+        def finish_write(index: int, stats: dict) -> None:
+            # Runs on the writer thread
+            out_path, data = stats.pop("pending_write")
+            start = time.perf_counter()
             try:
-                # CALL THE CORE LOGIC
-                stats = engine.process_single_image(
-                    input_path=input_path,
-                    output_path=output_path,
-                    quality=quality,
-                    scale=scale,
-                    max_dim=max_dim,
-                    force_jpeg=force_jpeg,
-                    quantize_png=quantize,
-                )
-                stats_list.append(stats)
+                engine.write_output(tasks[index]["input_path"], out_path, data, link)
             except Exception as e:
-                console.print(f"[red]Failed {input_path.name}: {e}[/red]")
+                record(index, None, e)
+                return
+            stats["timings"]["write"] = round(time.perf_counter() - start, 6)
+            record(index, stats, None)
 
-            progress.advance(task)
+        try:
+            # CALL THE CORE LOGIC (inline for 1 worker, process pool otherwise)
+            for index, stats, error in run_tasks(
+                engine.generate_variants if widths else engine.process_single_image,
+                task_source,
+                workers=worker_count,
+                cost=memory_cost if memory_budget else None,
+                budget=memory_budget,
+            ):
+                # Free the prefetched bytes; 'tasks' lives for the whole run
+                tasks[index].pop("source_bytes", None)
+                if writer is not None and error is None:
+                    writer.submit(index, finish_write, index, stats)
+                else:
+                    record(index, stats, error)
+                progress.advance(task)
+        finally:
+            if writer is not None:
+                writer.close()
+                for index, error in writer.errors:
+                    record(index, None, error)
+
+    for index, error in sorted(failures, key=lambda item: item[0]):
+        console.print(f"[red]Failed {tasks[index]['input_path'].name}: {error}[/red]")
+
+    for index in sorted(results):
+        if "warning" in results[index]:
+            console.print(f"[yellow]⚠ {results[index]['warning']}[/yellow]")
+
+    if oversized:
+        console.print(
+            f"[yellow]{len(oversized)} image(s) exceeded the memory budget on their "
+            f"own and were processed alone.[/yellow]"
+        )
+
+    if pipe_stats is not None:
+        console.print(
+            f"[dim]Pipeline stalls: encoder waited {pipe_stats.read_stall_s:.2f}s "
+            f"on reads, {pipe_stats.write_stall_s:.2f}s on the write queue; "
+            f"writer busy {pipe_stats.writer_busy_s:.2f}s.[/dim]"
+        )
+
+    if run_report is not None:
+        summary = run_report.close(
+            {"pipeline_s": pipe_stats.as_dict()} if pipe_stats else None
+        )
+        if report:
+            console.print(
+                f"[dim]Report: {report} ({summary['files']} files, "
+                f"p95 {summary['latency_s'].get('p95', 0) * 1000:.0f} ms/file)[/dim]"
+            )
+
+    if manifest is not None:
+        if not seen_keys:
+            raise ResourceNotFoundError("No valid images found in folder.")
+
+        # Failed files are left out so the next run retries them
+        for index, stats in results.items():
+            source = tasks[index]["input_path"]
+            out_folder = tasks[index].get("output_dir")
+            if out_folder is None:
+                out_folder = tasks[index]["output_path"].parent
+            # Variants record their list even when empty (source narrower
+            # than every width), so the source isn't redone on every run
+            names = stats.get("output_names", [stats["output_name"]])
+            manifest.record(
+                source.relative_to(target).as_posix(),
+                source,
+                [(out_folder / n).relative_to(output_dir).as_posix() for n in names],
+                params,
+            )
+        # Sources filtered out of this run keep their outputs
+        removed = manifest.prune(seen_keys, target)
+        manifest.save()
+
+        console.print(
+            f"[bold cyan]Found {len(seen_keys)} images:[/bold cyan] "
+            f"{manifest.hits} unchanged, {manifest.misses} processed, "
+            f"{len(removed)} stale outputs removed."
+        )
+
+        if not tasks:
+            log_success(f"Nothing changed. Output at: [bold]{output_dir}[/bold]")
+            return
+
+    stats_list = [results[index] for index in sorted(results)]
 
     # 4. Summary Table
     table = Table(title="Compression Results", box=box.ROUNDED)
@@ -128,23 +508,273 @@ def compress_command(
     table.add_column("Original", style="magenta")
     table.add_column("Compressed", style="green")
     table.add_column("Saved", style="bold white")
+    if target_bytes:
+        table.add_column("Quality (tries)", style="yellow")
 
     # Show first 5 and last 5 if list is huge, otherwise show all
     display_limit = 10
     total_processed = len(stats_list)
 
     for stat in stats_list[:display_limit]:
-        table.add_row(
-            stat["file_name"],
+        name = stat["file_name"]
+        if "variants" in stat:
+            name += f" ({stat['variants']} variants)"
+        elif stat.get("kept_original"):
+            name += " (original kept)"
+        elif "format" in stat:
+            name += f" → {stat['format']}"
+        row = [
+            name,
             stat["original_size"],
             stat["final_size"],
             f"{stat['reduction_pct']}%",
-        )
+        ]
+        if target_bytes:
+            missed = "" if stat["target_met"] else " [red]over budget[/red]"
+            row.append(f"q{stat['quality']} ({stat['iterations']}){missed}")
+        table.add_row(*row)
 
     if total_processed > display_limit:
-        table.add_row("...", "...", "...", "...")
+        filler = ["..."] * len(table.columns)
+        table.add_row(*filler)
         # Add summary row
-        table.add_row(f"{total_processed - display_limit} more files...", "", "", "")
+        table.add_row(
+            f"{total_processed - display_limit} more files...",
+            *[""] * (len(table.columns) - 1),
+        )
 
     console.print(table)
     log_success(f"Operation complete. Output at: [bold]{output_dir}[/bold]")
+
+
+def _replace_with_link(keep: Path, extra: Path) -> None:
+    """Swaps 'extra' for a hardlink to 'keep', atomically."""
+    tmp_path = temp_sibling(extra)
+    try:
+        os.link(keep, tmp_path)
+        os.replace(tmp_path, extra)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+@app.command("dedupe")
+def dedupe_command(
+    ctx: typer.Context,
+    target: Path = typer.Argument(
+        Path("."), help="Folder to search. Defaults to current folder."
+    ),
+    recursive: bool = typer.Option(
+        False, "-r", "--recursive", help="Include images in sub-folders."
+    ),
+    method: str = typer.Option(
+        "dhash", "--method", help="Perceptual hash: dhash (fast) or phash (robust)."
+    ),
+    threshold: int = typer.Option(
+        6, "--threshold", help="Max differing bits (of 64) to count as a duplicate."
+    ),
+    action: str = typer.Option(
+        "report", "--action", help="report, delete, or link (hardlink to the keeper)."
+    ),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Show what --action would do without doing it."
+    ),
+    force: bool = typer.Option(
+        False, "-f", "--force", help="Skip confirmation prompt."
+    ),
+    index_path: Optional[Path] = typer.Option(
+        None, "--index", help="Hash index file (default: .max_phash.json in target)."
+    ),
+    json_output: bool = typer.Option(
+        False, "--json", help="Print one JSON record per group instead of a table."
+    ),
+    workers: str = typer.Option(
+        "auto",
+        "-j",
+        "--workers",
+        "--jobs",
+        help="Parallel processes for hashing (a number or 'auto').",
+    ),
+):
+    """
+    Find near-duplicate images (resized copies, re-encodes) by perceptual hash.
+    The highest-resolution, largest copy in each group is kept.
+    """
+    # 1. Validation
+    if not target.is_dir():
+        raise ResourceNotFoundError(f"Folder '{target}' not found.")
+    if method not in engine.HASH_METHODS:
+        raise ValidationError(
+            f"--method must be one of: {', '.join(engine.HASH_METHODS)}."
+        )
+    if not 0 <= threshold <= 64:
+        raise ValidationError("--threshold must be between 0 and 64.")
+    if action not in ("report", "delete", "link"):
+        raise ValidationError("--action must be report, delete or link.")
+
+    if json_output:
+        console.quiet = True
+        ctx.call_on_close(lambda: setattr(console, "quiet", False))
+
+    index = PerceptualIndex(index_path or target / PerceptualIndex.FILE_NAME).load()
+    worker_count = resolve_workers(workers)
+
+    # 2. Hash: cached entries are reused, the rest are decoded in parallel
+    hashes: Dict[str, int] = {}
+    stats_by_key: Dict[str, os.stat_result] = {}
+    pending: List[str] = []
+    failures = []
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("{task.completed}/{task.total}"),
+        console=console,
+        disable=json_output,
+    ) as progress:
+        task = progress.add_task("[green]Hashing...", total=None)
+
+        def iter_tasks() -> Iterator[dict]:
+            for entry in scan_files(
+                target, recursive=recursive, extensions=engine.SUPPORTED_EXTENSIONS
+            ):
+                key = Path(os.path.relpath(entry.path, target)).as_posix()
+                st = entry.stat()
+                stats_by_key[key] = st
+                cached = index.lookup(key, st, method)
+                if cached is not None:
+                    hashes[key] = cached
+                    continue
+                pending.append(key)
+                progress.update(task, total=len(pending))
+                yield {"input_path": Path(entry.path), "method": method}
+
+        for i, result, error in run_tasks(
+            engine.perceptual_hash, iter_tasks(), workers=worker_count
+        ):
+            key = pending[i]
+            if error is not None:
+                failures.append((key, error))
+            else:
+                hashes[key] = result["hash"]
+                st = stats_by_key[key]
+                index.update(key, st, method, result["hash"], result["dims"])
+            progress.advance(task)
+
+    index.prune(target, stats_by_key)
+    index.save()
+
+    for key, error in failures:
+        console.print(f"[red]Failed {key}: {error}[/red]")
+    console.print(
+        f"[bold cyan]Hashed {len(hashes)} images:[/bold cyan] "
+        f"{index.hits} cached, {index.misses - len(failures)} new."
+    )
+
+    # 3. Group, best copy first: most pixels, then most bytes, then shortest name
+    def rank(key: str):
+        dims = index.entries[key].get("dims") or [0, 0]
+        return (-dims[0] * dims[1], -stats_by_key[key].st_size, len(key), key)
+
+    groups = [sorted(group, key=rank) for group in find_groups(hashes, threshold)]
+
+    # 4. Report
+    if json_output:
+        for keep, *extras in groups:
+            record = {
+                "keep": keep,
+                "duplicates": [
+                    {"file": e, "distance": hamming(hashes[keep], hashes[e])}
+                    for e in extras
+                ],
+            }
+            sys.stdout.write(json.dumps(record) + "\n")
+    else:
+        table = Table(title="Near-duplicate Groups", box=box.ROUNDED)
+        table.add_column("Keep", style="green", overflow="fold")
+        table.add_column("Duplicates (bits apart)", style="magenta", overflow="fold")
+
+        display_limit = 20
+        for keep, *extras in groups[:display_limit]:
+            table.add_row(
+                keep,
+                "\n".join(
+                    f"{e} ({hamming(hashes[keep], hashes[e])})" for e in extras
+                ),
+            )
+        if len(groups) > display_limit:
+            table.add_row(f"{len(groups) - display_limit} more groups...", "")
+        if groups:
+            console.print(table)
+
+    extra_count = sum(len(group) - 1 for group in groups)
+    console.print(
+        f"[bold cyan]{len(groups)} groups, {extra_count} duplicates.[/bold cyan]"
+    )
+    if action == "report" or not groups:
+        return
+
+    # 5. Act on the extras close enough to their keeper
+    pairs: List[Tuple[str, str]] = []
+    too_far = 0
+    for group in groups:
+        near, far = split_by_keeper(group, hashes, threshold)
+        pairs.extend((group[0], extra) for extra in near)
+        too_far += len(far)
+    if too_far:
+        console.print(
+            f"[yellow]{too_far} left alone: more than {threshold} bits from the "
+            f"copy kept (only similar through others in the group).[/yellow]"
+        )
+    if not pairs:
+        return
+
+    if not dry_run and not force:
+        verb = "Delete" if action == "delete" else "Hardlink"
+        if not Confirm.ask(f"{verb} {len(pairs)} duplicate files?"):
+            console.print("[red]Aborted.[/red]")
+            raise typer.Exit()
+
+    done = skipped = 0
+    freed = 0
+    # Names removed per inode: space comes back only with the last link
+    unlinked: Counter = Counter()
+    for keep, extra in pairs:
+        extra_path = target / extra
+        st = stats_by_key[extra]
+        inode = (st.st_dev, st.st_ino)
+        keep_st = stats_by_key[keep]
+        same_type = Path(extra).suffix.lower() == Path(keep).suffix.lower()
+        if action == "link" and not same_type:
+            # A hardlink would put (say) JPEG bytes behind a .png name
+            skipped += 1
+            continue
+        if action == "link" and inode == (keep_st.st_dev, keep_st.st_ino):
+            done += 1  # Already a hardlink of the keeper
+            continue
+        if dry_run:
+            console.print(f"  [DRY RUN] Would {action} '{extra}' (keep '{keep}')")
+            done += 1
+            continue
+        try:
+            if action == "delete":
+                extra_path.unlink()
+            else:
+                _replace_with_link(target / keep, extra_path)
+        except OSError as e:
+            console.print(f"[red]Could not {action} '{extra}': {e}[/red]")
+            continue
+        done += 1
+        unlinked[inode] += 1
+        if unlinked[inode] == st.st_nlink:
+            freed += st.st_size
+
+    if skipped:
+        console.print(f"[yellow]{skipped} not linked: different file type.[/yellow]")
+    if dry_run:
+        console.print(
+            "[bold yellow]This was a Dry Run. No files were changed.[/bold yellow]"
+        )
+    else:
+        log_success(f"{done} duplicates handled, {engine.get_size_str(freed)} freed.")
@@ -1,10 +1,25 @@
+import json
+import os
+import sqlite3
+import sys
+import time
 import typer
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
+from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn
+from rich.markup import escape
+from rich.table import Table
+from rich import box
 
+from max_cli.core.manifest import BuildManifest
 from max_cli.core.pdf_engine import PDFEngine
+from max_cli.core.pdf_index import PDFTextIndex
 from max_cli.common.logger import console, log_error, log_success
-from max_cli.common.utils import natural_sort_key  # We need to create this helper
+from max_cli.common.dir_cache import shared_dir_cache
+from max_cli.common.exceptions import ResourceNotFoundError, ValidationError
+from max_cli.common.parallel import resolve_workers, run_tasks
+from max_cli.common.scanner import scan_files
+from max_cli.common.utils import natural_sort_key, parse_size
 
 app = typer.Typer()
 engine = PDFEngine()
@@ -16,6 +31,17 @@ def merge_pdfs(
     output: Optional[Path] = typer.Option(
         None, "-o", "--output", help="Output filename."
     ),
+    recursive: bool = typer.Option(
+        False, "-r", "--recursive", help="Include PDFs in sub-folders (folder mode)."
+    ),
+    bookmarks: bool = typer.Option(
+        False, "--bookmarks", help="One bookmark per input (nesting its own outline)."
+    ),
+    dedupe: bool = typer.Option(
+        True,
+        "--dedupe/--no-dedupe",
+        help="Store fonts/images shared by many inputs only once.",
+    ),
 ):
     """
     Combine multiple PDFs into one.
@@ -28,9 +54,21 @@ def merge_pdfs(
         # Folder Mode
         folder = inputs[0]
         console.print(f"[cyan]Scanning folder: {folder}[/cyan]")
-        raw_files = [f for f in folder.iterdir() if f.suffix.lower() == ".pdf"]
-        # Sort naturally so "10_doc" comes after "2_doc"
-        files_to_merge = sorted(raw_files, key=lambda f: natural_sort_key(f.name))
+        raw_files = [
+            Path(entry.path)
+            for entry in scan_files(
+                folder,
+                recursive=recursive,
+                extensions={".pdf"},
+                cache=shared_dir_cache(),
+            )
+        ]
+        # Sort naturally so "10_doc" comes after "2_doc" (by relative path,
+        # so sub-folders stay grouped)
+        files_to_merge = sorted(
+            raw_files,
+            key=lambda f: natural_sort_key(f.relative_to(folder).as_posix()),
+        )
 
         # Default output name if none provided
         if not output:
@@ -49,52 +87,455 @@ def merge_pdfs(
 
     # 2. Execution
     console.print(f"Merging [bold]{len(files_to_merge)}[/bold] files...")
-    for f in files_to_merge:
-        console.print(f"  + {f.name}")
+    # Listing thousands of names helps no one
+    if len(files_to_merge) <= 20:
+        for f in files_to_merge:
+            console.print(f"  + {f.name}")
 
     try:
-        engine.merge_pdfs(files_to_merge, output)
-        log_success(f"Merged PDF saved to: [bold]{output}[/bold]")
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TextColumn("{task.completed}/{task.total} files"),
+            console=console,
+        ) as progress:
+            task = progress.add_task("[green]Merging...", total=len(files_to_merge))
+            result = engine.merge_pdfs(
+                files_to_merge,
+                output,
+                dedupe=dedupe,
+                bookmarks=bookmarks,
+                on_file=lambda done, total: progress.update(task, completed=done),
+            )
+
+        for phase, seconds in result["timings"].items():
+            rss = result["peak_rss_mb"].get(phase)
+            console.print(
+                f"[dim]  {phase:<7} {seconds:6.2f}s"
+                f"{f'  (peak {rss:.0f} MB)' if rss is not None else ''}[/dim]"
+            )
+        if result["objects_deduped"]:
+            console.print(
+                f"[dim]  {result['objects_deduped']} duplicate objects merged "
+                f"({result['bytes_deduped'] / 1024 / 1024:.1f} MB of streams).[/dim]"
+            )
+        log_success(f"Merged {result['pages']} pages into: [bold]{output}[/bold]")
     except Exception as e:
         log_error(f"Merge failed: {e}")
 
 
 @app.command("compress")
 def compress_pdf(
-    target: Path = typer.Argument(..., help="PDF file to compress."),
+    target: Path = typer.Argument(..., help="PDF file, or a folder of PDFs."),
     output: Optional[Path] = typer.Option(None, "-o", "--output", help="Output path."),
     dpi: int = typer.Option(150, help="DPI resolution (Lower = smaller file)."),
     quality: int = typer.Option(80, help="JPEG Quality (Lower = smaller file)."),
+    mode: str = typer.Option(
+        "raster",
+        "--mode",
+        help="raster: every page to JPEG. smart: shrink big images, keep text.",
+    ),
+    keep_color: bool = typer.Option(
+        False,
+        "--keep-color",
+        help="Store every page as color JPEG (skip gray/black-and-white detection).",
+    ),
+    workers: str = typer.Option(
+        "1",
+        "-j",
+        "--workers",
+        "--jobs",
+        help="Processes in parallel: pages of one file, or files of a folder.",
+    ),
+    recursive: bool = typer.Option(
+        False, "-r", "--recursive", help="Include PDFs in sub-folders (folder mode)."
+    ),
+    min_size: str = typer.Option(
+        "100KB",
+        "--min-size",
+        help="Folder mode: skip PDFs smaller than this (already small).",
+    ),
+    rebuild: bool = typer.Option(
+        False, "--rebuild", help="Ignore the manifest and recompress every PDF."
+    ),
 ):
     """
     Shrink a PDF by converting pages to images and back.
-    Great for scanned documents.
+    Great for scanned documents. Use --mode smart for mixed text/image PDFs.
+    Given a folder, compresses every PDF into '<folder>_compressed'.
     """
     if not target.exists():
         log_error("Target file not found.")
         raise typer.Exit(code=1)
 
+    if mode not in engine.COMPRESS_MODES:
+        raise ValidationError(
+            f"--mode must be one of: {', '.join(engine.COMPRESS_MODES)}."
+        )
+    worker_count = resolve_workers(workers)
+
+    if target.is_dir():
+        _compress_folder(
+            target,
+            output or target.parent / f"{target.name}_compressed",
+            dpi,
+            quality,
+            mode,
+            not keep_color,
+            worker_count,
+            recursive,
+            parse_size(min_size),
+            rebuild,
+        )
+        return
+
     if not output:
         output = target.parent / f"{target.stem}_compressed.pdf"
-
+    if mode == "smart" and worker_count > 1:
+        raise ValidationError("For a single file, --workers needs --mode raster.")
     console.print(
-        f"[cyan]Compressing '{target.name}' (DPI={dpi}, Q={quality})...[/cyan]"
+        f"[cyan]Compressing '{target.name}' ({mode}, DPI={dpi}, Q={quality}"
+        f"{f', {worker_count} workers' if worker_count > 1 else ''})...[/cyan]"
     )
 
-    # We use a simple spinner here because page processing can be fast or slow
-    with console.status("[bold green]Processing pages...[/bold green]"):
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("{task.completed}/{task.total} pages"),
+        console=console,
+    ) as progress:
+        task = progress.add_task("[green]Processing pages...", total=None)
+
+        def on_page(done: int, total: int) -> None:
+            progress.update(task, completed=done, total=total)
+
         try:
-            pages = engine.compress_pdf(target, output, dpi, quality)
+            if mode == "smart":
+                result = engine.smart_compress_pdf(
+                    target, output, dpi, quality, on_page=on_page
+                )
+                pages = result["pages"]
+            else:
+                pages = engine.compress_pdf(
+                    target,
+                    output,
+                    dpi,
+                    quality,
+                    workers=worker_count,
+                    on_page=on_page,
+                    detect_gray=not keep_color,
+                )
+        except Exception as e:
+            log_error(f"Compression failed: {e}")
+            raise typer.Exit(code=1)
 
-            # Calculate savings
-            orig_size = target.stat().st_size
-            new_size = output.stat().st_size
-            reduction = ((orig_size - new_size) / orig_size) * 100
+    # Calculate savings
+    orig_size = target.stat().st_size
+    new_size = output.stat().st_size
+    reduction = ((orig_size - new_size) / orig_size) * 100
 
-            log_success(f"Processed {pages} pages.")
-            console.print(
-                f"Size: {orig_size/1024/1024:.2f}MB -> [bold green]{new_size/1024/1024:.2f}MB[/bold green] (-{reduction:.1f}%)"
+    log_success(f"Processed {pages} pages.")
+    if mode == "smart":
+        console.print(
+            f"[dim]{result['images_replaced']} images downsampled, "
+            f"{result['pages_rasterized']} pages rasterized.[/dim]"
+        )
+    console.print(
+        f"Size: {orig_size/1024/1024:.2f}MB -> "
+        f"[bold green]{new_size/1024/1024:.2f}MB[/bold green] (-{reduction:.1f}%)"
+    )
+
+
+def _compress_folder(
+    folder: Path,
+    output_dir: Path,
+    dpi: int,
+    quality: int,
+    mode: str,
+    detect_gray: bool,
+    workers: int,
+    recursive: bool,
+    min_bytes: int,
+    rebuild: bool,
+) -> None:
+    """
+    Folder mode of 'compress': one process handles the whole batch, with a
+    pool of workers each compressing whole files. Sub-folders are mirrored
+    into output_dir. PDFs under min_bytes are skipped, and a manifest in
+    output_dir skips the ones already compressed with the same settings.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = BuildManifest(output_dir)
+    if not rebuild:
+        manifest.load()
+    params = {"dpi": dpi, "quality": quality, "mode": mode, "gray": detect_gray}
+
+    console.print(f"[cyan]Scanning folder: {folder}[/cyan]")
+    seen_keys: List[str] = []
+    too_small = 0
+    tasks: List[dict] = []
+    entries = scan_files(
+        folder, recursive=recursive, extensions={".pdf"}, cache=shared_dir_cache()
+    )
+    for entry in entries:
+        if entry.stat().st_size < min_bytes:
+            too_small += 1
+            continue
+        source = Path(entry.path)
+        key = source.relative_to(folder).as_posix()
+        seen_keys.append(key)
+        if manifest.is_fresh(key, source, params):
+            continue
+        (output_dir / key).parent.mkdir(parents=True, exist_ok=True)
+        tasks.append(
+            {
+                "input_path": source,
+                "output_path": output_dir / key,
+                "dpi": dpi,
+                "quality": quality,
+                "mode": mode,
+                "detect_gray": detect_gray,
+            }
+        )
+
+    console.print(
+        f"[bold cyan]Found {len(seen_keys) + too_small} PDFs:[/bold cyan] "
+        f"{too_small} under --min-size, {manifest.hits} unchanged, "
+        f"{len(tasks)} to compress"
+        f"{f' ({workers} workers)' if workers > 1 else ''}."
+    )
+
+    # Results are slotted by index so the table follows the scan order
+    results: Dict[int, dict] = {}
+    failures = []
+    saved = 0
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("{task.completed}/{task.total} files"),
+        TextColumn("[green]{task.fields[saved]}"),
+        console=console,
+    ) as progress:
+        task = progress.add_task(
+            "[green]Compressing...", total=len(tasks), saved="saved 0.0 MB"
+        )
+        for index, stats, error in run_tasks(
+            engine.compress_file, tasks, workers=workers
+        ):
+            if error is not None:
+                failures.append((index, error))
+            else:
+                results[index] = stats
+                saved += stats["bytes_in"] - stats["bytes_out"]
+            progress.update(
+                task, advance=1, saved=f"saved {saved / 1024 / 1024:.1f} MB"
             )
 
-        except Exception as e:
-            log_error(f"Compression failed: {e}")
+    for index, error in sorted(failures, key=lambda item: item[0]):
+        console.print(f"[red]Failed {tasks[index]['input_path'].name}: {error}[/red]")
+
+    # Failed files are left out so the next run retries them
+    dir_cache = shared_dir_cache()
+    for index in results:
+        source = tasks[index]["input_path"]
+        key = source.relative_to(folder).as_posix()
+        manifest.record(key, source, [key], params)
+        if dir_cache:
+            dir_cache.put_fact(str(source), "pages", results[index]["pages"])
+    # Only sources that are gone: one skipped for --min-size or left out
+    # without -r keeps the output it already has
+    removed = manifest.prune(seen_keys, folder)
+    manifest.save()
+    if removed:
+        console.print(f"[dim]{len(removed)} stale outputs removed.[/dim]")
+
+    if not results:
+        log_success(f"Nothing to compress. Output at: [bold]{output_dir}[/bold]")
+        return
+
+    stats_list = [results[index] for index in sorted(results)]
+    table = Table(title="Compression Results", box=box.ROUNDED)
+    table.add_column("File", style="cyan")
+    table.add_column("Pages", justify="right")
+    table.add_column("Original", style="magenta")
+    table.add_column("Compressed", style="green")
+    table.add_column("Saved", style="bold white")
+
+    display_limit = 10
+    for stat in stats_list[:display_limit]:
+        name = stat["file_name"]
+        if stat["kept_original"]:
+            name += " (original kept)"
+        table.add_row(
+            name,
+            str(stat["pages"]),
+            f"{stat['bytes_in'] / 1024 / 1024:.2f} MB",
+            f"{stat['bytes_out'] / 1024 / 1024:.2f} MB",
+            f"{stat['reduction_pct']}%",
+        )
+    if len(stats_list) > display_limit:
+        table.add_row("...", *[""] * (len(table.columns) - 1))
+        table.add_row(
+            f"{len(stats_list) - display_limit} more files...",
+            *[""] * (len(table.columns) - 1),
+        )
+    console.print(table)
+
+    total_in = sum(stat["bytes_in"] for stat in stats_list)
+    total_out = sum(stat["bytes_out"] for stat in stats_list)
+    console.print(
+        f"Total: {total_in / 1024 / 1024:.2f}MB -> "
+        f"[bold green]{total_out / 1024 / 1024:.2f}MB[/bold green] "
+        f"(-{(total_in - total_out) / total_in * 100 if total_in else 0:.1f}%)"
+    )
+    log_success(
+        f"Compressed {len(stats_list)} files. Output at: [bold]{output_dir}[/bold]"
+    )
+
+
+@app.command("index")
+def index_command(
+    folder: Path = typer.Argument(
+        Path("."), help="Folder of PDFs to index. Defaults to current folder."
+    ),
+    recursive: bool = typer.Option(
+        False, "-r", "--recursive", help="Include PDFs in sub-folders."
+    ),
+    index_path: Optional[Path] = typer.Option(
+        None, "--index", help="Index file (default: .max_pdf_index.sqlite in folder)."
+    ),
+    workers: str = typer.Option(
+        "auto",
+        "-j",
+        "--workers",
+        "--jobs",
+        help="Parallel processes extracting text (a number or 'auto').",
+    ),
+):
+    """
+    Build or refresh a local full-text index for 'max pdf search'.
+    Only new or changed PDFs are read again.
+    """
+    if not folder.is_dir():
+        raise ResourceNotFoundError(f"Folder '{folder}' not found.")
+    worker_count = resolve_workers(workers)
+    start = time.perf_counter()
+
+    with PDFTextIndex(index_path or folder / PDFTextIndex.FILE_NAME) as index:
+        known = index.known_files()
+        seen = set()
+        pending: List[tuple] = []
+        failures = []
+        unchanged = 0
+
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TextColumn("{task.completed}/{task.total} files"),
+            console=console,
+        ) as progress:
+            task = progress.add_task("[green]Extracting text...", total=None)
+
+            def iter_tasks() -> Iterator[dict]:
+                nonlocal unchanged
+                entries = scan_files(folder, recursive=recursive, extensions={".pdf"})
+                for entry in entries:
+                    key = Path(os.path.relpath(entry.path, folder)).as_posix()
+                    st = entry.stat()
+                    seen.add(key)
+                    cached = known.get(key)
+                    if cached and cached[1:] == (st.st_size, st.st_mtime_ns):
+                        unchanged += 1
+                        continue
+                    pending.append((key, st))
+                    progress.update(task, total=len(pending))
+                    yield {"input_path": Path(entry.path)}
+
+            for done, (i, pages, error) in enumerate(
+                run_tasks(engine.extract_text, iter_tasks(), workers=worker_count),
+                start=1,
+            ):
+                key, st = pending[i]
+                if error is not None:
+                    failures.append((key, error))
+                else:
+                    index.store(key, st, pages)
+                # Commit in batches: an interrupted run keeps what it did
+                if done % 100 == 0:
+                    index.commit()
+                progress.advance(task)
+
+        removed = index.remove(key for key in known if key not in seen)
+        index.commit()
+        if len(pending) > 100:
+            index.optimize()
+        totals = index.stats()
+
+    for key, error in failures:
+        console.print(f"[red]Failed {key}: {error}[/red]")
+    console.print(
+        f"[bold cyan]{len(seen)} PDFs:[/bold cyan] {unchanged} unchanged, "
+        f"{len(pending) - len(failures)} indexed, {removed} removed "
+        f"({time.perf_counter() - start:.1f}s)."
+    )
+    log_success(f"Index holds {totals['files']} files, {totals['pages']} pages.")
+
+
+@app.command("search")
+def search_command(
+    query: str = typer.Argument(
+        ..., help='Words to find; quote phrases, e.g. \'"late fee" invoice\'.'
+    ),
+    folder: Path = typer.Argument(
+        Path("."), help="Indexed folder. Defaults to current folder."
+    ),
+    index_path: Optional[Path] = typer.Option(
+        None, "--index", help="Index file (default: .max_pdf_index.sqlite in folder)."
+    ),
+    limit: int = typer.Option(20, "-n", "--limit", help="Maximum hits to show."),
+    raw: bool = typer.Option(
+        False, "--raw", help="Pass the query to SQLite FTS5 as is (NEAR, OR, pre*)."
+    ),
+    json_output: bool = typer.Option(
+        False, "--json", help="Print one JSON record per hit instead of a table."
+    ),
+):
+    """
+    Search the text of indexed PDFs (see 'max pdf index'). Best pages first.
+    """
+    path = index_path or folder / PDFTextIndex.FILE_NAME
+    if not path.is_file():
+        raise ResourceNotFoundError(
+            f"No index at '{path}'. Run 'max pdf index {folder}' first."
+        )
+
+    # Control characters mark the matches, so PDF text can't fake them
+    start = time.perf_counter()
+    with PDFTextIndex(path) as index:
+        try:
+            hits = index.search(query, limit, raw=raw, highlight=("\x02", "\x03"))
+        except sqlite3.OperationalError as e:
+            raise ValidationError(f"Invalid search query: {e}")
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if json_output:
+        for hit in hits:
+            hit["snippet"] = hit["snippet"].replace("\x02", "").replace("\x03", "")
+            sys.stdout.write(json.dumps(hit) + "\n")
+        return
+
+    if hits:
+        table = Table(title=f"Results for {query!r}", box=box.ROUNDED)
+        table.add_column("File", style="cyan", overflow="fold")
+        table.add_column("Page", justify="right")
+        table.add_column("Snippet")
+        for hit in hits:
+            snippet = escape(hit["snippet"])
+            snippet = snippet.replace("\x02", "[bold yellow]").replace("\x03", "[/]")
+            table.add_row(hit["file"], str(hit["page"]), snippet)
+        console.print(table)
+    console.print(f"[dim]{len(hits)} hits in {elapsed_ms:.1f} ms.[/dim]")
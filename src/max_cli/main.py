@@ -1,38 +1,119 @@
+import importlib
 import typer
 import sys
+from typing import Any, List, Optional
 from rich.console import Console
+from typer.core import TyperGroup
 
-# Import interfaces
-from max_cli.interface import cli_images, cli_files, cli_pdf, cli_ai
 from max_cli.common.exceptions import MaxError
 
 # Initialize Console directly here to ensure it's available for the crash handler
 console = Console()
 
+# --- 1. Command Groups (imported only when used) ---
+# name: (module, help, hidden). Each module exposes a Typer 'app'. We register
+# 'images' AND 'img' so users can type less. Importing a group pulls in its
+# engine (PyMuPDF, Pillow, the OpenAI SDK...), so 'max files order' or
+# 'max --help' never pay for the others.
+SUBCOMMANDS = {
+    "images": (
+        "max_cli.interface.cli_images",
+        "Compress, resize, and convert images.",
+        False,
+    ),
+    "img": ("max_cli.interface.cli_images", None, True),  # Hidden alias
+    "files": ("max_cli.interface.cli_files", "Organize and bulk-rename files.", False),
+    "file": ("max_cli.interface.cli_files", None, True),  # Hidden alias
+    "pdf": ("max_cli.interface.cli_pdf", "Merge and compress PDFs.", False),
+    "ai": ("max_cli.interface.cli_ai", "Ask AI to run commands.", False),
+    "cache": (
+        "max_cli.interface.cli_cache",
+        "Inspect or clear the folder cache.",
+        False,
+    ),
+    # Developer tool: not listed in --help (or shown to the AI)
+    "bench": ("max_cli.interface.cli_bench", None, True),
+}
+
+
+def _load_group(name: str) -> TyperGroup:
+    """Imports a group's module and builds it exactly as add_typer would."""
+    module_name, help_text, hidden = SUBCOMMANDS[name]
+    holder = typer.Typer()
+    holder.add_typer(
+        importlib.import_module(module_name).app,
+        name=name,
+        help=help_text,
+        hidden=hidden,
+    )
+    return typer.main.get_group(holder).commands[name]
+
+
+class LazyGroup(TyperGroup):
+    """
+    Root group that imports a sub-group only when it runs. While help or
+    completion is listing the groups, each one is a bare stand-in carrying
+    just its name, help and hidden flag.
+    """
+
+    _listing = False
+
+    def list_commands(self, ctx: Any) -> List[str]:
+        return [*super().list_commands(ctx), *SUBCOMMANDS]
+
+    def get_command(self, ctx: Any, cmd_name: str) -> Optional[Any]:
+        if cmd_name not in SUBCOMMANDS:
+            return super().get_command(ctx, cmd_name)
+        if self._listing:
+            _, help_text, hidden = SUBCOMMANDS[cmd_name]
+            return TyperGroup(name=cmd_name, help=help_text, hidden=hidden)
+        return _load_group(cmd_name)
+
+    def format_help(self, ctx: Any, formatter: Any) -> None:
+        self._listing = True
+        try:
+            super().format_help(ctx, formatter)
+        finally:
+            self._listing = False
+
+    def shell_complete(self, ctx: Any, incomplete: str) -> List[Any]:
+        self._listing = True
+        try:
+            return super().shell_complete(ctx, incomplete)
+        finally:
+            self._listing = False
+
+
 app = typer.Typer(
     name="max",
     help="MAX: The High-Performance CLI Utility.",
+    cls=LazyGroup,
     add_completion=True,
     no_args_is_help=True,
 )
 
-# --- 1. Register Commands with Aliases ---
-# We register 'images' AND 'img' so users can type less.
-app.add_typer(
-    cli_images.app, name="images", help="Compress, resize, and convert images."
-)
-app.add_typer(cli_images.app, name="img", hidden=True)  # Hidden alias
 
-app.add_typer(cli_files.app, name="files", help="Organize and bulk-rename files.")
-app.add_typer(cli_files.app, name="file", hidden=True)  # Hidden alias
+@app.callback()
+def root():
+    # Having a callback keeps 'max' a group while its sub-groups attach lazily
+    pass
 
-app.add_typer(cli_pdf.app, name="pdf", help="Merge and compress PDFs.")
 
-app.add_typer(cli_ai.app, name="ai", help="Ask AI to run commands.")
+def build_full_app() -> typer.Typer:
+    """
+    The whole command tree with every group imported. The AI reads its
+    docs from this, so it sees exactly what a user can run.
+    """
+    full_app = typer.Typer(name="max")
+    for name, (module_name, help_text, hidden) in SUBCOMMANDS.items():
+        full_app.add_typer(
+            importlib.import_module(module_name).app,
+            name=name,
+            help=help_text,
+            hidden=hidden,
+        )
+    return full_app
 
-# --- CRITICAL LINKING STEP ---
-# Give the AI module access to this app instance so it can read the docs
-cli_ai.MAIN_APP_REF = app
 
 def main():
     """
@@ -0,0 +1,93 @@
+import os
+
+from max_cli.common import dir_cache
+from max_cli.common.dir_cache import DirCache
+from max_cli.common.scanner import scan_files
+
+
+def _age(folder, seconds=60):
+    """Backdates a folder so its listing is old enough to be trusted."""
+    when = folder.stat().st_mtime - seconds
+    os.utime(folder, (when, when))
+
+
+def test_cached_listing_until_folder_changes(tmp_path):
+    """An unchanged folder is served from the cache; a new file re-lists it."""
+    folder = tmp_path / "photos"
+    folder.mkdir()
+    (folder / "a.jpg").write_bytes(b"12345")
+    _age(folder)
+
+    with DirCache(tmp_path / "cache.sqlite") as cache:
+        first = [(e.name, e.stat().st_size) for e in scan_files(folder, cache=cache)]
+        again = list(scan_files(folder, cache=cache))
+        assert first == [("a.jpg", 5)]
+        assert [(e.name, e.stat().st_size) for e in again] == first
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert again[0].path == os.path.join(str(folder), "a.jpg")
+
+        (folder / "b.jpg").write_bytes(b"x")
+        _age(folder)
+        assert [e.name for e in scan_files(folder, cache=cache)] == ["a.jpg", "b.jpg"]
+        assert cache.misses == 2
+
+
+def test_facts_survive_relisting_only_for_unchanged_files(tmp_path):
+    """A re-list keeps facts of untouched files and drops edited ones."""
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    for name in ("a.pdf", "b.pdf"):
+        (folder / name).write_bytes(b"%PDF")
+    _age(folder)
+
+    with DirCache(tmp_path / "cache.sqlite") as cache:
+        list(scan_files(folder, cache=cache))
+        cache.put_fact(str(folder / "a.pdf"), "pages", 3)
+        cache.put_fact(str(folder / "b.pdf"), "pages", 7)
+
+        (folder / "b.pdf").write_bytes(b"%PDF-1.7 longer")
+        (folder / "c.pdf").write_bytes(b"%PDF")
+        _age(folder)
+        list(scan_files(folder, cache=cache))
+        assert cache.get_fact(str(folder / "a.pdf"), "pages") == 3
+        assert cache.get_fact(str(folder / "b.pdf"), "pages") is None
+
+
+def test_evict_drops_least_recently_used_folders(tmp_path):
+    """Past the size cap, the folders used longest ago go first."""
+    root = tmp_path / "tree"
+    for d in range(30):
+        folder = root / f"d{d:02d}"
+        folder.mkdir(parents=True)
+        for f in range(40):
+            (folder / f"file_{f:03d}.txt").write_bytes(b"x")
+        _age(folder)
+
+    with DirCache(tmp_path / "cache.sqlite") as cache:
+        for d in range(30):
+            cache.listing(str(root / f"d{d:02d}"))
+            cache.db.execute(
+                "UPDATE dirs SET used = ? WHERE path = ?",
+                (d, os.path.abspath(root / f"d{d:02d}")),
+            )
+        full = cache._used_bytes()
+        assert cache.evict(full // 2) > 0
+        kept = [path for (path,) in cache.db.execute("SELECT path FROM dirs")]
+        assert kept and cache._used_bytes() <= full // 2
+        assert os.path.abspath(root / "d29") in kept
+        assert os.path.abspath(root / "d00") not in kept
+
+
+def test_cache_setting_read_like_pydantic_and_checked_once(tmp_path, monkeypatch):
+    """.env is parsed by dotenv; the answer is kept for the whole process."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(dir_cache, "_enabled", None)
+    (tmp_path / ".env").write_text(
+        'OPENAI_API_KEY="sk-test\n# DIR_CACHE=true"\n# DIR_CACHE=true\n'
+    )
+    assert not dir_cache._may_set("DIR_CACHE")
+    assert not dir_cache.cache_enabled()
+
+    (tmp_path / ".env").write_text("export dir_cache=true\n")
+    assert dir_cache._may_set("DIR_CACHE")
+    assert not dir_cache.cache_enabled()  # Memoized: not re-read
@@ -0,0 +1,69 @@
+import pytest
+from max_cli.common.exceptions import ValidationError
+from max_cli.common.parallel import resolve_workers, run_tasks
+
+
+def _square(n: int) -> int:
+    if n == 3:
+        raise ValueError("bad input")
+    return n * n
+
+
+def test_resolve_workers():
+    """'auto' maps to the CPU count, numbers pass through, junk is rejected."""
+    assert resolve_workers("4") == 4
+    assert resolve_workers("auto") >= 1
+    with pytest.raises(ValidationError):
+        resolve_workers("0")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_tasks_isolates_failures(workers):
+    """Every task reports back exactly once, failures included."""
+    tasks = [{"n": n} for n in range(6)]
+    outcomes = {i: (res, err) for i, res, err in run_tasks(_square, tasks, workers)}
+
+    assert sorted(outcomes) == list(range(6))
+    assert outcomes[5] == (25, None)
+    assert isinstance(outcomes[3][1], ValueError)
+
+
+def test_run_tasks_respects_memory_budget():
+    """In-flight cost stays under the budget; oversized tasks run alone."""
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    lock = threading.Lock()
+    state = {"in_flight": 0, "peak": 0, "alone": True}
+
+    def job(size: int) -> int:
+        with lock:
+            state["in_flight"] += size
+            if size > 10 and state["in_flight"] != size:
+                state["alone"] = False  # Joined tasks already running
+            elif size <= 10:
+                if state["in_flight"] > 10 + size:
+                    state["alone"] = False  # Joined the oversized task
+                state["peak"] = max(state["peak"], state["in_flight"])
+        time.sleep(0.01)
+        with lock:
+            state["in_flight"] -= size
+        return size
+
+    tasks = [{"size": s} for s in [4, 4, 4, 50, 4, 4]]
+    outcomes = list(
+        run_tasks(
+            job,
+            tasks,
+            workers=4,
+            executor_cls=ThreadPoolExecutor,
+            cost=lambda t: t["size"],
+            budget=10,
+        )
+    )
+
+    assert len(outcomes) == 6
+    assert state["alone"]
+    # Unbudgeted, three of the 4-unit tasks would run at once (12)
+    assert state["peak"] <= 10
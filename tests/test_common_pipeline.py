@@ -0,0 +1,56 @@
+import threading
+import time
+from max_cli.common.pipeline import AsyncWriter, PipelineStats, prefetch
+from max_cli.common.utils import atomic_write_bytes
+
+
+def test_prefetch_keeps_order_and_bounds_read_ahead():
+    """Results come back in input order, never more than 'depth' items ahead."""
+    in_flight = []
+    lock = threading.Lock()
+    started = 0
+
+    def read(n: int) -> int:
+        nonlocal started
+        with lock:
+            started += 1
+        time.sleep(0.001 * (n % 3))  # Finish out of order
+        return n * 10
+
+    consumed = 0
+    for value in prefetch(range(20), read, depth=3, threads=3):
+        assert value == consumed * 10
+        consumed += 1
+        in_flight.append(started - consumed)
+
+    assert consumed == 20
+    assert max(in_flight) <= 3
+
+
+def test_async_writer_collects_errors_and_stalls():
+    """Writes run in order on one thread; failures don't stop the queue."""
+    written = []
+    stats = PipelineStats()
+
+    def write(n: int) -> None:
+        if n == 2:
+            raise OSError("disk full")
+        written.append(n)
+
+    with AsyncWriter(depth=2, stats=stats) as writer:
+        for n in range(5):
+            writer.submit(n, write, n)
+
+    assert written == [0, 1, 3, 4]
+    assert [key for key, _ in writer.errors] == [2]
+    assert set(stats.as_dict()) == {"read_stall_s", "write_stall_s", "writer_busy_s"}
+
+
+def test_atomic_write_leaves_no_temp_files(tmp_path):
+    """The target is replaced whole and the temp file is gone."""
+    target = tmp_path / "out.jpg"
+    target.write_bytes(b"old")
+    atomic_write_bytes(target, b"new")
+
+    assert target.read_bytes() == b"new"
+    assert [p.name for p in tmp_path.iterdir()] == ["out.jpg"]
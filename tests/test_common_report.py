@@ -0,0 +1,23 @@
+import io
+import json
+from max_cli.common.report import RunReport
+
+
+def test_run_report_streams_records_and_summary():
+    """Each add() emits one NDJSON line; close() appends the summary."""
+    stream = io.StringIO()
+    report = RunReport(stream=stream)
+
+    report.add(
+        "a.jpg",
+        {"bytes_in": 1000, "bytes_out": 250, "timings": {"decode": 0.2, "encode": 0.1}},
+    )
+    report.add("b.jpg", None, error=ValueError("broken"))
+    summary = report.close()
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["type"] for line in lines] == ["file", "file", "summary"]
+    assert lines[1]["error"] == "broken"
+    assert summary["files"] == 1 and summary["failed"] == 1
+    assert summary["reduction_pct"] == 75.0
+    assert summary["stages_s"]["decode"]["p50"] == 0.2
@@ -0,0 +1,33 @@
+from pathlib import Path
+from max_cli.common.scanner import scan_files
+
+
+def _names(entries):
+    return [Path(e.path).name for e in entries]
+
+
+def test_scan_files_filters_and_recurses(tmp_path):
+    """Scanning respects extensions, globs, depth and natural ordering."""
+    for rel in ["b10.jpg", "b2.jpg", "notes.txt", "sub/c.png", "sub/deep/d.jpg"]:
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+
+    flat = _names(scan_files(tmp_path, extensions={".jpg", ".png"}))
+    assert flat == ["b2.jpg", "b10.jpg"]
+
+    deep = _names(scan_files(tmp_path, recursive=True, extensions={".jpg", ".png"}))
+    assert deep == ["b2.jpg", "b10.jpg", "c.png", "d.jpg"]
+
+    shallow = _names(scan_files(tmp_path, recursive=True, max_depth=1))
+    assert "d.jpg" not in shallow and "c.png" in shallow
+
+    assert _names(scan_files(tmp_path, recursive=True, exclude=["deep"])) == [
+        "b2.jpg",
+        "b10.jpg",
+        "notes.txt",
+        "c.png",
+    ]
+    assert _names(scan_files(tmp_path, recursive=True, include=["sub/*.png"])) == [
+        "c.png"
+    ]
@@ -0,0 +1,14 @@
+import os
+
+from max_cli.common.utils import copy_file_fast
+
+
+def test_copy_falls_back_when_the_kernel_copies_nothing(tmp_path, monkeypatch):
+    """copy_file_range returning 0 at offset 0 hands over to the next method."""
+    src, dst = tmp_path / "src.bin", tmp_path / "dst.bin"
+    data = os.urandom(100_000)
+    src.write_bytes(data)
+    monkeypatch.setattr(os, "copy_file_range", lambda *args: 0, raising=False)
+
+    assert copy_file_fast(src, dst) != "copy_file_range"
+    assert dst.read_bytes() == data
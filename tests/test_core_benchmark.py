@@ -0,0 +1,30 @@
+from max_cli.common.utils import percentile
+from max_cli.core.benchmark import BenchmarkRunner
+
+
+def test_percentile_nearest_rank():
+    samples = [5.0, 1.0, 3.0, 2.0, 4.0]
+    assert percentile(samples, 50) == 3.0
+    assert percentile(samples, 95) == 5.0
+
+
+def test_corpus_is_deterministic(tmp_path):
+    """Two builds with the same seed produce byte-identical images."""
+    runner = BenchmarkRunner()
+    first = runner.build_corpus(tmp_path / "a", ["small"])
+    second = runner.build_corpus(tmp_path / "b", ["small"])
+
+    images = sorted(p.name for p in first.glob("*_small.*"))
+    assert len(images) == 3
+    for name in images:
+        assert (first / name).read_bytes() == (second / name).read_bytes()
+
+
+def test_compare_flags_regressions():
+    baseline = {"cases": {"a": {"p50_ms": 100.0}, "b": {"p50_ms": 100.0}}}
+    current = {"cases": {"a": {"p50_ms": 105.0}, "b": {"p50_ms": 150.0}}}
+
+    rows = {r["case"]: r for r in BenchmarkRunner.compare(baseline, current, 10)}
+
+    assert not rows["a"]["regressed"]
+    assert rows["b"]["regressed"] and rows["b"]["change_pct"] == 50.0
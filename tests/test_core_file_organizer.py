@@ -0,0 +1,252 @@
+import os
+from datetime import datetime
+from pathlib import Path
+
+from max_cli.core.file_hashes import PARTIAL_BYTES, FileHashCache
+from max_cli.core.file_organizer import FileOrganizer
+from max_cli.core.rename_plan import RenameJournal, execute_renames, plan_renames
+
+
+def _apply(names, steps):
+    """Replays steps on a set of names, failing on any overwrite."""
+    names = set(names)
+    for src, dst in steps:
+        assert src in names and dst not in names
+        names.remove(src)
+        names.add(dst)
+    return names
+
+
+def test_plan_orders_chains_and_breaks_cycles():
+    """a->b->c runs from the free end; a swap goes through a temp name."""
+    steps, _ = plan_renames([("a", "b"), ("b", "c")], {"a", "b"})
+    assert steps == [("b", "c"), ("a", "b")]
+
+    folder = {"a", "b", "x", "y"}
+    steps, info = plan_renames([("a", "b"), ("b", "a"), ("x", "y")], folder)
+    assert info == {"conflicts": 1, "cycles": 1}
+    assert _apply(folder, steps) == {"a", "b", "y", "y (2)"}
+
+
+def test_order_never_overwrites_and_can_be_undone(tmp_path):
+    """A new '1_a.txt' can't clobber an existing one; --undo restores names."""
+    for name, body in [("a.txt", "new"), ("1_a.txt", "old"), ("b.txt", "b")]:
+        (tmp_path / name).write_text(body)
+
+    result = FileOrganizer().order_files(tmp_path)
+    assert (result["renamed"], result["skipped"], result["conflicts"]) == (2, 1, 1)
+    assert (tmp_path / "1_a.txt").read_text() == "old"
+    assert (tmp_path / "1_a (2).txt").read_text() == "new"
+
+    FileOrganizer().undo_order(tmp_path)
+    assert sorted(os.listdir(tmp_path)) == ["1_a.txt", "a.txt", "b.txt"]
+
+
+def test_order_leaves_other_commands_caches_alone(tmp_path):
+    """Hash indexes and PDF indexes in the folder are never renumbered."""
+    caches = [".max_fhash.json", ".max_phash.json", ".max_pdf_index.sqlite"]
+    for name in ["a.txt", *caches]:
+        (tmp_path / name).write_text(name)
+
+    FileOrganizer().order_files(tmp_path)
+    assert sorted(os.listdir(tmp_path)) == [
+        ".max_fhash.json",
+        ".max_pdf_index.sqlite",
+        ".max_phash.json",
+        ".max_rename_journal.jsonl",
+        "1_a.txt",
+    ]
+
+
+def test_interrupted_run_resumes_from_journal(tmp_path):
+    """Steps that already ran are recognised from the folder itself."""
+    for name in ["a", "b"]:
+        (tmp_path / name).write_text(name)
+    steps, _ = plan_renames([("a", "b"), ("b", "a")], {"a", "b"})
+    journal = RenameJournal(tmp_path)
+    journal.write(steps)
+    execute_renames(tmp_path, steps[:1])  # "Crash" after parking 'a'
+
+    counts = FileOrganizer().resume_order(tmp_path)
+    assert counts == {"renamed": 2, "already_done": 1, "failed": 0}
+    assert (tmp_path / "a").read_text() == "b"
+    assert (tmp_path / "b").read_text() == "a"
+    assert journal.load()[1] is True
+
+
+def test_resume_after_last_step_changes_nothing(tmp_path):
+    """Killed before the journal was closed: a finished swap or chain stays put."""
+    cases = {
+        "swap": ([("a", "b"), ("b", "a")], {"a": "b", "b": "a"}),
+        "chain": ([("a", "b"), ("b", "c")], {"b": "a", "c": "b"}),
+    }
+    for case, (renames, expected) in cases.items():
+        folder = tmp_path / case
+        folder.mkdir()
+        for name in ("a", "b"):
+            (folder / name).write_text(name)
+        steps, _ = plan_renames(renames, {"a", "b"})
+        journal = RenameJournal(folder)
+        journal.write(steps)
+        execute_renames(folder, steps, journal=journal)  # "Crash" before mark_done
+
+        counts = FileOrganizer().resume_order(folder)
+        assert counts == {"renamed": 0, "already_done": len(steps), "failed": 0}
+        names = [p.name for p in FileOrganizer().scan_directory(folder)]
+        assert {name: (folder / name).read_text() for name in names} == expected
+
+
+def test_cycle_interrupted_before_any_rename(tmp_path):
+    """Killed right after the journal was written: resume swaps, undo does nothing."""
+    steps, _ = plan_renames([("a", "b"), ("b", "a")], {"a", "b"})
+    for action in ("resume", "undo"):
+        folder = tmp_path / action
+        folder.mkdir()
+        for name in ("a", "b"):
+            (folder / name).write_text(name)
+        RenameJournal(folder).write(steps)  # "Crash" before the first rename
+
+        organizer = FileOrganizer()
+        if action == "resume":
+            counts = organizer.resume_order(folder)
+            assert counts == {"renamed": 3, "already_done": 0, "failed": 0}
+            assert (folder / "a").read_text() == "b"
+        else:
+            counts = organizer.undo_order(folder)
+            assert counts["renamed"] == 0
+            assert (folder / "a").read_text() == "a"
+
+
+def test_iter_order_streams_and_stopping_early_is_resumable(tmp_path):
+    """Actions arrive one by one; abandoning the generator acts as a crash."""
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_text(name)
+    organizer = FileOrganizer()
+    plan = organizer.plan_order(tmp_path)
+
+    dry = list(organizer.iter_order(tmp_path, plan, dry_run=True))
+    assert {a.status for a in dry} == {"planned"} and len(dry) == 3
+
+    actions = organizer.iter_order(tmp_path, plan)
+    first = next(actions)
+    assert (first.src, first.dst, first.status) == ("a.txt", "1_a.txt", "renamed")
+    actions.close()
+
+    counts = organizer.resume_order(tmp_path)
+    assert (counts["renamed"], counts["already_done"]) == (2, 1)
+    names = [p.name for p in organizer.scan_directory(tmp_path)]
+    assert names == ["1_a.txt", "2_b.txt", "3_c.txt"]
+
+
+def test_find_duplicates_reads_only_what_it_must(tmp_path):
+    """Same ends but a different middle isn't a duplicate; hardlinks are one file."""
+    blob = os.urandom(100_000)
+    (tmp_path / "a.bin").write_bytes(blob)
+    (tmp_path / "b.bin").write_bytes(blob)
+    (tmp_path / "c.bin").write_bytes(blob[:50_000] + b"!" + blob[50_001:])
+    os.link(tmp_path / "a.bin", tmp_path / "a_link.bin")
+    (tmp_path / "unique.bin").write_bytes(b"x" * 10)
+
+    cache = FileHashCache(tmp_path / FileHashCache.FILE_NAME)
+    result = FileOrganizer().find_duplicates(tmp_path, workers=2, cache=cache)
+    assert [sorted(g["files"]) for g in result["groups"]] == [["a.bin", "b.bin"]]
+    assert result["reclaimable"] == 100_000
+    # Three distinct 100 KB inodes: ends of all, full reads of all three
+    assert result["bytes_read"] == 3 * 2 * PARTIAL_BYTES + 3 * 100_000
+
+    again = FileOrganizer().find_duplicates(tmp_path, cache=cache)
+    assert again["bytes_read"] == 0 and len(again["groups"]) == 1
+
+
+def test_hash_cache_forgets_deleted_files(tmp_path):
+    """Saving with the scan's live keys drops entries for files now gone."""
+    blob = os.urandom(1000)
+    for name in ("a.bin", "b.bin", "c.bin"):
+        (tmp_path / name).write_bytes(blob)
+    cache = FileHashCache(tmp_path / FileHashCache.FILE_NAME)
+    FileOrganizer().find_duplicates(tmp_path, cache=cache)
+    assert len(cache.entries) == 3
+
+    (tmp_path / "c.bin").unlink()
+    result = FileOrganizer().find_duplicates(tmp_path, cache=cache)
+    cache.save(result["live_keys"])
+    assert len(FileHashCache(cache.path).load().entries) == 2
+
+
+def test_find_duplicates_ignores_symlinks(tmp_path):
+    """Two links to one file are not duplicates, nor are a link and its target."""
+    (tmp_path / "photo.jpg").write_bytes(os.urandom(50_000))
+    os.symlink("photo.jpg", tmp_path / "s1")
+    os.symlink("photo.jpg", tmp_path / "s2")
+
+    result = FileOrganizer().find_duplicates(tmp_path)
+    assert result["groups"] == [] and result["bytes_read"] == 0
+
+
+def test_replace_duplicate_with_hardlink(tmp_path):
+    """The extra becomes a link to the keeper; nothing is lost on the way."""
+    keep, extra = tmp_path / "keep.txt", tmp_path / "extra.txt"
+    keep.write_text("same")
+    extra.write_text("same")
+    FileOrganizer().replace_duplicate(keep, extra, "hardlink")
+    assert os.path.samefile(keep, extra)
+    assert sorted(os.listdir(tmp_path)) == ["extra.txt", "keep.txt"]
+
+
+def test_organize_sorts_by_type_and_date(tmp_path):
+    """Files land in type/YYYY/MM; a name already there gets a suffix."""
+    src, dest = tmp_path / "dump", tmp_path / "sorted"
+    src.mkdir()
+    when = datetime(2021, 3, 14, 12, 0).timestamp()
+    for name in ("a.jpg", "b.pdf"):
+        (src / name).write_text(name)
+        os.utime(src / name, (when, when))
+    (dest / "images" / "2021" / "03").mkdir(parents=True)
+    (dest / "images" / "2021" / "03" / "a.jpg").write_text("older")
+
+    organizer = FileOrganizer()
+    plan = organizer.plan_organize(src, dest)
+    result = organizer.execute_moves(plan)
+    assert result["renamed"] == 2 and not result["failures"]
+    assert (dest / "images" / "2021" / "03" / "a (2).jpg").read_text() == "a.jpg"
+    assert (dest / "documents" / "2021" / "03" / "b.pdf").exists()
+    assert os.listdir(src) == []
+
+
+def test_organize_in_place_leaves_sorted_files_alone(tmp_path, monkeypatch):
+    """Re-running with the folder spelled differently moves nothing."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "og").mkdir()
+    (tmp_path / "og" / "a.txt").write_text("a")
+    organizer = FileOrganizer()
+    organizer.execute_moves(organizer.plan_organize(Path("og"), Path("og")))
+
+    plan = organizer.plan_organize(Path("og"), tmp_path / "og", recursive=True)
+    assert plan["moves"] == [] and plan["in_place"] == 1
+
+
+def test_organize_never_overwrites_a_late_arrival(tmp_path):
+    """A file that takes a planned name before the move is kept, not replaced."""
+    src, dest = tmp_path / "dump", tmp_path / "sorted"
+    src.mkdir()
+    (src / "b.pdf").write_text("mine")
+    organizer = FileOrganizer()
+    plan = organizer.plan_organize(src, dest)
+    target = Path(plan["moves"][0][1])
+    target.parent.mkdir(parents=True)
+    target.write_text("theirs")
+
+    result = organizer.execute_moves(plan)
+    assert result["renamed"] == 0 and len(result["failures"]) == 1
+    assert target.read_text() == "theirs" and (src / "b.pdf").exists()
+
+
+def test_move_across_keeps_data_and_mtime(tmp_path):
+    """The cross-device path copies, verifies, renames and removes the source."""
+    src, dst = tmp_path / "in.bin", tmp_path / "out.bin"
+    src.write_bytes(os.urandom(300_000))
+    data = src.read_bytes()
+    os.utime(src, (1_600_000_000, 1_600_000_000))
+    FileOrganizer()._move_across(str(src), str(dst), checksum=True)
+    assert not src.exists() and dst.read_bytes() == data
+    assert int(dst.stat().st_mtime) == 1_600_000_000
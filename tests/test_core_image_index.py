@@ -0,0 +1,52 @@
+import random
+from max_cli.core.image_index import (
+    BKTree,
+    PerceptualIndex,
+    find_groups,
+    hamming,
+    split_by_keeper,
+)
+
+
+def test_bk_tree_matches_brute_force():
+    """Radius search returns exactly what a full scan would."""
+    rng = random.Random(7)
+    values = [rng.getrandbits(16) for _ in range(300)]
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+
+    query = values[0]
+    found = sorted(key for key, _ in tree.search(query, 3))
+    expected = [i for i, v in enumerate(values) if hamming(query, v) <= 3]
+    assert found == expected
+
+
+def test_find_groups_is_transitive():
+    """a~b and b~c end up in one group; far-away hashes stay alone."""
+    hashes = {"a": 0b0000, "b": 0b0011, "c": 0b1111, "d": 0xFFFF0000}
+    assert find_groups(hashes, threshold=2) == [["a", "b", "c"]]
+
+
+def test_only_extras_near_the_keeper_are_actionable():
+    """In a chain a~b~c, c is two thresholds from keeper a and is left alone."""
+    hashes = {"a": 0b0000, "b": 0b0011, "c": 0b1111}
+    group = find_groups(hashes, threshold=2)[0]
+    assert split_by_keeper(group, hashes, threshold=2) == (["b"], ["c"])
+
+
+def test_index_reuses_unchanged_files(tmp_path):
+    """Hashes survive a save/load and are dropped when the file changes."""
+    image = tmp_path / "a.jpg"
+    image.write_bytes(b"x")
+    index = PerceptualIndex(tmp_path / PerceptualIndex.FILE_NAME)
+    index.update("a.jpg", image.stat(), "dhash", 0xABC, [10, 10])
+    index.save()
+
+    reloaded = PerceptualIndex(index.path).load()
+    assert reloaded.lookup("a.jpg", image.stat(), "dhash") == 0xABC
+    assert reloaded.lookup("a.jpg", image.stat(), "phash") is None
+
+    image.write_bytes(b"changed")
+    assert reloaded.lookup("a.jpg", image.stat(), "dhash") is None
+    assert (reloaded.hits, reloaded.misses) == (1, 2)
@@ -39,3 +39,156 @@ def test_resize_image(dummy_image):
 
     with Image.open(output_path) as result:
         assert result.size == (50, 50)
+
+
+def test_fast_decode_matches_full_decode(tmp_path):
+    """Reduced-resolution decoding must land on the same output size."""
+    engine = ImageEngine()
+    src = tmp_path / "large.jpg"
+    Image.new("RGB", (1200, 800), color="blue").save(src)
+
+    for fast in (True, False):
+        out = tmp_path / f"out_{fast}.jpg"
+        engine.process_single_image(src, out, max_dim=200, fast_decode=fast)
+        with Image.open(out) as result:
+            assert result.size == (200, 133)
+
+
+def test_target_size_fits_budget(tmp_path):
+    """Quality is searched in memory until the output fits the byte budget."""
+    engine = ImageEngine()
+    src = tmp_path / "noisy.png"
+    Image.effect_noise((400, 400), 80).convert("RGB").save(src)
+    out = tmp_path / "noisy.png"  # Non-lossy suffix gets switched to JPEG
+
+    stats = engine.process_single_image(src, out, target_bytes=30 * 1024)
+
+    assert stats["output_name"] == "noisy.jpg"
+    assert stats["target_met"]
+    assert stats["iterations"] > 1
+    assert (tmp_path / "noisy.jpg").stat().st_size <= 30 * 1024
+
+
+def test_bomb_policy(tmp_path):
+    """Images over the pixel limit are refused or flagged per policy."""
+    from max_cli.common.exceptions import ImageTooLargeError
+
+    engine = ImageEngine()
+    src = tmp_path / "wide.png"
+    Image.new("RGB", (300, 200)).save(src)
+    out = tmp_path / "out.png"
+
+    with pytest.raises(ImageTooLargeError):
+        engine.process_single_image(src, out, max_pixels=50_000, bomb_policy="error")
+
+    stats = engine.process_single_image(src, out, max_pixels=50_000)
+    assert "warning" in stats
+
+    assert engine.estimate_memory(src) == 300 * 200 * 4 * 3
+
+
+def test_generate_variants(tmp_path):
+    """One decode yields every width (no upscaling) in every format."""
+    engine = ImageEngine()
+    src = tmp_path / "hero.png"
+    Image.new("RGBA", (1000, 500), color=(0, 128, 255, 200)).save(src)
+
+    stats = engine.generate_variants(
+        src, tmp_path, [200, 600, 4000], formats=["jpeg", "webp"]
+    )
+
+    assert stats["variants"] == 2
+    assert sorted(stats["output_names"]) == [
+        "hero@200w.jpg",
+        "hero@200w.webp",
+        "hero@600w.jpg",
+        "hero@600w.webp",
+    ]
+    with Image.open(tmp_path / "hero@200w.jpg") as result:
+        assert result.size == (200, 100)
+
+
+def test_auto_format_never_grows(tmp_path):
+    """If no candidate beats the source, the original bytes are kept."""
+    engine = ImageEngine()
+    src = tmp_path / "tiny.jpg"
+    Image.effect_noise((64, 64), 60).convert("RGB").save(src, quality=5)
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    stats = engine.process_single_image(
+        src, out_dir / "tiny.jpg", quality=100, auto_format=True, link_original=True
+    )
+
+    assert stats["kept_original"]
+    assert stats["reduction_pct"] == 0
+    assert (out_dir / "tiny.jpg").read_bytes() == src.read_bytes()
+
+
+def test_auto_format_respects_quality_floor(tmp_path):
+    """A lossy candidate below the PSNR floor loses to lossless PNG."""
+    engine = ImageEngine()
+    src = tmp_path / "photo.bmp"
+    Image.effect_noise((64, 64), 40).convert("RGB").save(src)
+
+    engine.AUTO_MIN_PSNR = 99.0  # No lossy encode can reach this
+    stats = engine.process_single_image(src, tmp_path / "out.bmp", auto_format=True)
+    assert stats["format"] == "PNG"
+
+    engine.AUTO_MIN_PSNR = 0.0
+    stats = engine.process_single_image(src, tmp_path / "out.bmp", auto_format=True)
+    assert stats["format"] in ("JPG", "WEBP")
+
+
+def test_default_run_never_grows(tmp_path):
+    """Re-encoding a heavily compressed JPEG at high quality keeps the source."""
+    engine = ImageEngine()
+    src = tmp_path / "tiny.jpg"
+    Image.effect_noise((64, 64), 60).convert("RGB").save(src, quality=5)
+
+    stats = engine.process_single_image(src, tmp_path / "out.jpg", quality=95)
+
+    assert stats["kept_original"] and stats["reduction_pct"] == 0
+    assert (tmp_path / "out.jpg").read_bytes() == src.read_bytes()
+
+
+def test_auto_format_picks_smallest(tmp_path):
+    """A flat PNG screenshot gets re-encoded to whatever is smallest."""
+    engine = ImageEngine()
+    src = tmp_path / "flat.bmp"
+    Image.new("RGB", (400, 300), color="white").save(src)
+
+    stats = engine.process_single_image(src, tmp_path / "out.bmp", auto_format=True)
+
+    assert not stats["kept_original"]
+    assert stats["reduction_pct"] > 90
+    assert stats["output_name"] != "out.bmp"
+
+
+def test_stats_are_numeric(dummy_image):
+    """Stats carry raw numbers and per-stage timings for reports."""
+    engine = ImageEngine()
+    stats = engine.process_single_image(
+        dummy_image, dummy_image.parent / "out.jpg", max_dim=50
+    )
+
+    assert stats["dims_in"] == [100, 100] and stats["dims_out"] == [50, 50]
+    assert stats["bytes_out"] == (dummy_image.parent / "out.jpg").stat().st_size
+    assert {"open", "decode", "resize", "encode", "write"} <= set(stats["timings"])
+
+
+@pytest.mark.parametrize("method", ImageEngine.HASH_METHODS)
+def test_perceptual_hash_survives_resize(tmp_path, method):
+    """A resized re-encode hashes close to the original; a mirror doesn't."""
+    engine = ImageEngine()
+    img = Image.effect_mandelbrot((800, 450), (-1.9, -0.9, 0.3, 0.4), 100)
+    img.convert("RGB").save(tmp_path / "a.jpg", quality=90)
+    img.resize((200, 112)).save(tmp_path / "b.png")
+    img.transpose(Image.Transpose.FLIP_LEFT_RIGHT).save(tmp_path / "c.png")
+
+    a, b, c = (
+        engine.perceptual_hash(tmp_path / name, method)["hash"]
+        for name in ("a.jpg", "b.png", "c.png")
+    )
+    assert bin(a ^ b).count("1") <= 6
+    assert bin(a ^ c).count("1") > 12
@@ -0,0 +1,87 @@
+import os
+from max_cli.core.manifest import BuildManifest
+
+PARAMS = {"quality": 80, "scale": None}
+
+
+def test_manifest_skips_unchanged_sources(tmp_path):
+    """A recorded source is fresh until its contents or params change."""
+    src = tmp_path / "a.jpg"
+    src.write_bytes(b"original")
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    (out_dir / "a.jpg").write_bytes(b"encoded")
+
+    manifest = BuildManifest(out_dir)
+    manifest.record("a.jpg", src, ["a.jpg"], PARAMS)
+    manifest.save()
+
+    reloaded = BuildManifest(out_dir).load()
+    assert reloaded.is_fresh("a.jpg", src, PARAMS)
+    assert not reloaded.is_fresh("a.jpg", src, {**PARAMS, "quality": 60})
+
+    src.write_bytes(b"changed!!")
+    assert not reloaded.is_fresh("a.jpg", src, PARAMS)
+    assert (reloaded.hits, reloaded.misses) == (1, 2)
+
+
+def test_manifest_hash_survives_mtime_reset(tmp_path):
+    """With hashing on, a touched-but-identical file is still a hit."""
+    src = tmp_path / "a.png"
+    src.write_bytes(b"pixels")
+    (tmp_path / "a_out.png").write_bytes(b"encoded")
+
+    manifest = BuildManifest(tmp_path, use_hash=True)
+    manifest.record("a.png", src, ["a_out.png"], PARAMS)
+    os.utime(src, ns=(0, 0))
+
+    assert manifest.is_fresh("a.png", src, PARAMS)
+
+
+def test_manifest_prune_removes_orphaned_outputs(tmp_path):
+    """Outputs whose sources disappeared are deleted."""
+    src = tmp_path / "gone.jpg"
+    src.write_bytes(b"x")
+    (tmp_path / "gone_out.jpg").write_bytes(b"y")
+
+    manifest = BuildManifest(tmp_path)
+    manifest.record("gone.jpg", src, ["gone_out.jpg"], PARAMS)
+
+    assert manifest.prune([]) == ["gone_out.jpg"]
+    assert not (tmp_path / "gone_out.jpg").exists()
+
+
+def test_manifest_handles_sources_without_outputs(tmp_path):
+    """A source that produced nothing stays fresh; pruning deletes no folders."""
+    src = tmp_path / "tiny.png"
+    src.write_bytes(b"x")
+    out_dir = tmp_path / "out"
+    (out_dir / "sub").mkdir(parents=True)
+
+    manifest = BuildManifest(out_dir)
+    manifest.record("tiny.png", src, [], PARAMS)
+    assert manifest.is_fresh("tiny.png", src, PARAMS)
+
+    manifest.record("old.png", src, ["", ".", "sub"], PARAMS)
+    assert not manifest.is_fresh("old.png", src, PARAMS)
+    assert manifest.prune([]) == []
+    assert (out_dir / "sub").is_dir()
+
+
+def test_manifest_prune_keeps_sources_outside_the_scan(tmp_path):
+    """Narrowing the filter between runs deletes nothing whose source exists."""
+    src_dir, out_dir = tmp_path / "src", tmp_path / "out"
+    (src_dir / "sub").mkdir(parents=True)
+    out_dir.mkdir()
+    for key in ("a.jpg", "sub/b.jpg", "c.png", "gone.jpg"):
+        (src_dir / key).write_bytes(b"x")
+        (out_dir / key.replace("/", "_")).write_bytes(b"y")
+    manifest = BuildManifest(out_dir)
+    for key in ("a.jpg", "sub/b.jpg", "c.png", "gone.jpg"):
+        manifest.record(key, src_dir / key, [key.replace("/", "_")], PARAMS)
+    (src_dir / "gone.jpg").unlink()
+
+    # Second run with --include '*.png': only c.png was scanned
+    assert manifest.prune(["c.png"], src_dir) == ["gone.jpg"]
+    assert sorted(manifest.entries) == ["a.jpg", "c.png", "sub/b.jpg"]
+    assert (out_dir / "a.jpg").exists() and (out_dir / "sub_b.jpg").exists()
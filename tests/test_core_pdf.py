@@ -0,0 +1,223 @@
+import fitz
+import pytest
+from max_cli.core.pdf_engine import PDFEngine
+from max_cli.core.pdf_writer import ImagePDFWriter
+
+
+@pytest.fixture
+def text_pdf(tmp_path):
+    """A 3-page A4 PDF with a line of text on each page."""
+    path = tmp_path / "doc.pdf"
+    doc = fitz.open()
+    for n in range(3):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 72), f"Page {n + 1}")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_compress_pdf_streams_every_page(text_pdf):
+    """Every page comes back as one JPEG, at the original page size."""
+    output = text_pdf.with_name("out.pdf")
+    pages = PDFEngine().compress_pdf(text_pdf, output, dpi=72, quality=60)
+
+    assert pages == 3
+    with fitz.open(output) as doc:
+        assert len(doc) == 3
+        assert tuple(doc[2].rect) == pytest.approx((0, 0, 595, 842), abs=1)
+        assert doc[0].get_images()[0][8] == "DCTDecode"
+
+
+def test_pdf_writer_leaves_nothing_on_failure(tmp_path):
+    """An exception mid-write removes the partial file."""
+    output = tmp_path / "out.pdf"
+    with pytest.raises(RuntimeError):
+        with ImagePDFWriter(output):
+            raise RuntimeError("render failed")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_parallel_compress_keeps_page_order(text_pdf):
+    """Workers render ranges out of order; the output is identical to serial."""
+    engine = PDFEngine()
+    engine.CHUNK_PAGES = 1
+    serial, parallel = text_pdf.with_name("a.pdf"), text_pdf.with_name("b.pdf")
+    seen = []
+
+    engine.compress_pdf(text_pdf, serial, dpi=72)
+    engine.compress_pdf(
+        text_pdf, parallel, dpi=72, workers=2, on_page=lambda d, t: seen.append(d)
+    )
+
+    assert seen == [1, 2, 3]
+    with fitz.open(serial) as a, fitz.open(parallel) as b:
+        for page_a, page_b in zip(a, b):
+            xref_a, xref_b = page_a.get_images()[0][0], page_b.get_images()[0][0]
+            assert a.xref_stream_raw(xref_a) == b.xref_stream_raw(xref_b)
+
+
+def test_smart_mode_downsamples_images_and_keeps_text(tmp_path):
+    """An 800 DPI photo is shrunk to ~100 DPI; the text stays searchable."""
+    source = tmp_path / "mixed.pdf"
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((72, 72), "Quarterly report")
+    photo = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 1600, 1200), False)
+    photo.clear_with(200)
+    page.insert_image(fitz.Rect(72, 100, 216, 208), pixmap=photo)  # 2 inches wide
+    doc.save(source)
+    doc.close()
+
+    output = tmp_path / "out.pdf"
+    result = PDFEngine().smart_compress_pdf(source, output, dpi=100)
+
+    assert result == {"pages": 1, "images_replaced": 1, "pages_rasterized": 0}
+    with fitz.open(output) as doc:
+        assert "Quarterly report" in doc[0].get_text()
+        assert doc[0].get_images()[0][2] == 200  # 2 inches at 100 DPI
+
+
+def test_smart_mode_keeps_transparent_images(tmp_path):
+    """An oversized image with a soft mask is left as is, mask and all."""
+    source = tmp_path / "logo.pdf"
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((72, 72), "Letterhead")
+    logo = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 1600, 1200), True)
+    logo.clear_with(120)
+    logo.set_alpha(bytes([0, 255]) * (1600 * 600))
+    page.insert_image(fitz.Rect(72, 100, 216, 208), pixmap=logo)
+    doc.save(source)
+    doc.close()
+
+    output = tmp_path / "out.pdf"
+    result = PDFEngine().smart_compress_pdf(source, output, dpi=100)
+
+    assert result["images_replaced"] == 0
+    with fitz.open(output) as doc:
+        images = doc[0].get_images(full=True)
+        assert len(images) == 1 and images[0][1] != 0
+
+
+def test_smart_mode_rasterizes_a_textless_bilevel_scan(tmp_path):
+    """A black-and-white scan without text is replaced by a JPEG page."""
+    scan = fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 1240, 1754), False)
+    scan.clear_with(255)
+    for y in range(100, 1700, 40):
+        scan.set_rect(fitz.IRect(100, y, 1140, y + 12), (0,))
+    source = tmp_path / "scan.pdf"
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_image(page.rect, stream=scan.tobytes("png"))
+    doc.save(source)
+    doc.close()
+
+    output = tmp_path / "out.pdf"
+    result = PDFEngine().smart_compress_pdf(source, output, dpi=72)
+
+    assert (result["pages"], result["pages_rasterized"]) == (1, 1)
+    with fitz.open(output) as doc:
+        assert len(doc) == 1 and len(doc[0].get_images()) == 1
+
+
+def test_pages_get_the_cheapest_color_mode(tmp_path):
+    """Text -> 1-bit, gray shading -> gray JPEG, real color -> RGB JPEG."""
+    source = tmp_path / "modes.pdf"
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Signed contract", fontsize=40)
+    doc.new_page().draw_rect(fitz.Rect(0, 0, 300, 400), fill=(0.5, 0.5, 0.5))
+    doc.new_page().draw_rect(fitz.Rect(0, 0, 300, 400), fill=(0.9, 0.1, 0.1))
+    doc.save(source)
+    doc.close()
+
+    output = tmp_path / "out.pdf"
+    PDFEngine().compress_pdf(source, output, dpi=72)
+
+    with fitz.open(output) as doc:
+        kinds = [(img[4], img[5]) for page in doc for img in page.get_images()]
+    assert kinds == [(1, "DeviceGray"), (8, "DeviceGray"), (8, "DeviceRGB")]
+
+
+def test_merge_dedupes_shared_resources_and_adds_bookmarks(tmp_path):
+    """The same logo in every input is stored once; each file gets a bookmark."""
+    logo = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 200, 100), False)
+    logo.clear_with(90)
+    inputs = []
+    for n in range(4):
+        path = tmp_path / f"invoice{n}.pdf"
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(72, 72, 272, 172), pixmap=logo)
+        page.insert_text((72, 200), f"Invoice {n}")
+        doc.set_toc([[1, "Total", 1]])
+        doc.save(path)
+        doc.close()
+        inputs.append(path)
+
+    engine = PDFEngine()
+    engine.MERGE_FLUSH_FILES = 2  # Exercise the flush-and-reopen path
+    output = tmp_path / "merged.pdf"
+    result = engine.merge_pdfs(inputs, output, bookmarks=True)
+
+    assert result["pages"] == 4 and result["objects_deduped"] > 0
+    assert set(result["timings"]) == {"insert", "dedupe", "save"}
+    with fitz.open(output) as doc:
+        assert len({img[0] for page in doc for img in page.get_images()}) == 1
+        toc = doc.get_toc()
+        assert toc[:3] == [[1, "invoice0", 1], [2, "Total", 1], [1, "invoice1", 2]]
+        assert "Invoice 3" in doc[3].get_text()
+
+
+def test_merge_keeps_annotations_per_page(tmp_path):
+    """Identical link annotations stay separate objects; the logo is shared."""
+    logo = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 200, 100), False)
+    logo.clear_with(90)
+    template = tmp_path / "template.pdf"
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(fitz.Rect(72, 72, 272, 172), pixmap=logo)
+    link = fitz.Rect(72, 72, 272, 172)
+    page.insert_link({"kind": fitz.LINK_URI, "uri": "https://max.dev", "from": link})
+    doc.save(template)
+    doc.close()
+
+    output = tmp_path / "merged.pdf"
+    PDFEngine().merge_pdfs([template, template], output)
+
+    with fitz.open(output) as doc:
+        assert len({img[0] for page in doc for img in page.get_images()}) == 1
+        annots = [doc.xref_get_key(page.xref, "Annots")[1] for page in doc]
+        assert annots[0] != annots[1]
+        doc[1].delete_link(doc[1].get_links()[0])
+        doc.save(tmp_path / "edited.pdf")
+    with fitz.open(tmp_path / "edited.pdf") as doc:
+        assert [len(page.get_links()) for page in doc] == [1, 0]
+
+
+def test_merge_failing_mid_flush_reports_the_real_error(text_pdf, monkeypatch):
+    """A reopen that fails after the flush surfaces its own error, not a close."""
+    engine = PDFEngine()
+    monkeypatch.setattr(engine, "MERGE_FLUSH_FILES", 1)
+    real_open = fitz.open
+
+    def failing_open(*args, **kwargs):
+        if args and str(args[0]).endswith(".tmp"):
+            raise RuntimeError("disk gone")
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(fitz, "open", failing_open)
+    output = text_pdf.with_name("merged.pdf")
+    with pytest.raises(RuntimeError, match="disk gone"):
+        engine.merge_pdfs([text_pdf, text_pdf], output)
+    assert sorted(p.name for p in text_pdf.parent.iterdir()) == ["doc.pdf"]
+
+
+def test_compress_file_never_grows_a_pdf(text_pdf):
+    """A text PDF rasterizes bigger than it is, so the source is kept."""
+    output = text_pdf.with_name("out.pdf")
+    stats = PDFEngine().compress_file(text_pdf, output, dpi=150)
+
+    assert stats["kept_original"] is True
+    assert stats["pages"] == 3
+    assert output.read_bytes() == text_pdf.read_bytes()
@@ -0,0 +1,37 @@
+import os
+
+from max_cli.core.pdf_index import PDFTextIndex, to_match_query
+
+
+def _stat(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return path.stat()
+
+
+def test_user_queries_become_quoted_terms():
+    """Phrases stay phrases; stray punctuation can't break FTS5 syntax."""
+    assert to_match_query('net 30 "late fee"') == '"net" "30" "late fee"'
+    assert to_match_query('NEAR( "') == '"NEAR("'
+    assert to_match_query("   ") == ""
+
+
+def test_search_ranks_pages_and_forgets_removed_files(tmp_path):
+    """Hits carry the 1-based page; re-storing or removing a file drops its text."""
+    with PDFTextIndex(tmp_path / PDFTextIndex.FILE_NAME) as index:
+        st = _stat(tmp_path, "a.pdf", "x")
+        index.store("a.pdf", st, ["cover", "the late fee applies", "late"])
+        index.store("b.pdf", _stat(tmp_path, "b.pdf", "y"), ["fee late"])
+        index.commit()
+
+        hits = index.search('"late fee"')
+        assert [(h["file"], h["page"]) for h in hits] == [("a.pdf", 2)]
+        assert hits[0]["snippet"] == "the [late fee] applies"
+        assert index.known_files()["a.pdf"][1:] == (st.st_size, st.st_mtime_ns)
+
+        index.store("a.pdf", st, ["nothing here"])
+        assert index.remove(["b.pdf", "missing.pdf"]) == 1
+        index.commit()
+        assert index.search("late") == []
+        assert index.stats() == {"files": 1, "pages": 1}
+    assert os.path.getsize(tmp_path / PDFTextIndex.FILE_NAME) > 0
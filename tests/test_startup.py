@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+# Engines that only their own command groups should load
+HEAVY_MODULES = ("fitz", "PIL", "openai", "pydantic_settings")
+# -X importtime budget for 'import max_cli.main' (typer + rich are most of it).
+# Set MAX_STARTUP_BUDGET_MS on slow runners.
+STARTUP_BUDGET_MS = int(os.environ.get("MAX_STARTUP_BUDGET_MS", "500"))
+
+
+def _run(code: str, *flags: str, cwd=None) -> subprocess.CompletedProcess:
+    # A fresh interpreter: this test process has imported everything already
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=cwd,
+    )
+
+
+def test_import_fits_startup_budget():
+    """'import max_cli.main' stays under the -X importtime budget."""
+    result = _run("import max_cli.main", "-X", "importtime")
+    line = next(
+        line for line in result.stderr.splitlines() if line.endswith("| max_cli.main")
+    )
+    cumulative_ms = int(line.split("|")[1]) / 1000
+    assert cumulative_ms < STARTUP_BUDGET_MS, result.stderr[-2000:]
+
+
+def test_help_and_files_order_skip_heavy_engines(tmp_path):
+    """'max --help' and 'max files order' never import the other engines."""
+    (tmp_path / "a.txt").write_text("a")
+    # The README's .env (API key only) mustn't pull in the settings loader
+    (tmp_path / ".env").write_text("OPENAI_API_KEY=sk-test\n")
+    code = f"""
+import sys
+from typer.testing import CliRunner
+from max_cli.main import app
+
+runner = CliRunner()
+help_result = runner.invoke(app, ["--help"])
+order_result = runner.invoke(app, ["files", "order", {str(tmp_path)!r}, "--dry-run"])
+assert help_result.exit_code == 0 and order_result.exit_code == 0
+assert "images" in help_result.output and "bench" not in help_result.output
+print(" ".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))
+"""
+    assert _run(code, cwd=tmp_path).stdout.strip() == ""